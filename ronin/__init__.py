@@ -24,26 +24,56 @@
 # OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from ronin.events import RoninEventHandler
+# Only what a single synchronization needs is imported here; watching,
+# snapshots and log files import their machinery when they are first used,
+# so that one-shot runs (e.g. from git hooks) start quickly.
+from ronin import metrics
+from ronin.profiling import CycleProfiler, DEFAULT_THRESHOLD_MS
 from ronin.strategies import StrategyFactory
-from logging import StreamHandler
-from logging.handlers import RotatingFileHandler
-from pprint import pprint
+from ronin.utils.latency import LatencyTracker
 import json
 import logging
 import os
 import sys
 import time
 
-#: Perform basic logging configuration
-logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S',
-                    level=logging.INFO)
+#: The format of logged messages.
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+#: The format of the time of logged messages.
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 #: Configure root level logger.
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-#logger.addHandler(StreamHandler(stream=sys.stdout))
+
+
+def init_console_logging():
+    """
+    Perform basic logging configuration, which logs messages to the console,
+    unless logging has been configured already. Like the log file, the
+    console is written to by a background thread, so that logging does not
+    wait for a slow terminal or pipe.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    from ronin.utils.logqueue import BackgroundHandler
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+    root.addHandler(BackgroundHandler([console]))
+    root.setLevel(logging.INFO)
+
+
+def get_async_runner():
+    """
+    Return the :class:`AsyncRonin` class, which is only available on Python
+    3.5 or later.
+    """
+    if sys.version_info < (3, 5):
+        raise RuntimeError("Watching with asyncio requires Python 3.5 or later.")
+    from ronin.aio import AsyncRonin
+    return AsyncRonin
 
 
 class Manifest(object):
@@ -64,7 +94,25 @@ class Manifest(object):
       "args": ["--verbose"],
       "exclude": [
         ".git"
-      ]
+      ],
+      "debounce_ms": 250,
+      "max_batch_wait_ms": 2000,
+      "incremental": true,
+      "full_sync_interval_ms": 300000,
+      "walker": "threaded",
+      "walker_threads": 8,
+      "poll_min_ms": 250,
+      "poll_max_ms": 5000,
+      "poll_duty_cycle": 0.1,
+      "incremental_scan": true,
+      "file_stat_interval": 1,
+      "snapshot": "standard",
+      "delete": false,
+      "workers": 8,
+      "hardlink": false,
+      "supersede_after_ms": 10000,
+      "settle_ms": 1000,
+      "latency_slo_ms": 2000
     }
 
     :param manifest_path: Optional. The path to the manifest file. If
@@ -88,15 +136,115 @@ class Manifest(object):
         #: from synchronization.
         self.exclude = None
 
-        #: The strategy to use for file syncrhonization, e.g. "rsync"
+        #: The strategy to use for file syncrhonization, e.g. "rsync",
+        #: "native", "link" or "tarstream".
         self.type = None
 
+        #: Whether strategies other than "rsync" should remove files from
+        #: the destination that no longer exist in the source. (The "rsync"
+        #: strategy follows its `--delete` arguments instead.)
+        self.delete = False
+
+        #: The number of files that the "native" and "link" strategies copy
+        #: in parallel.
+        self.workers = 8
+
+        #: Whether the "link" strategy should hard link files into the
+        #: destination, rather than clone or copy them, when it is on the
+        #: same file system as the source.
+        self.hardlink = False
+
+        #: The time, in milliseconds, after which a running synchronization
+        #: is cancelled and restarted if newer changes are waiting. If
+        #: `None`, synchronizations always run to completion and the
+        #: changes are synchronized afterwards.
+        self.supersede_after_ms = None
+
+        #: The time, in milliseconds, that a created or modified file must
+        #: not have been written to before it is synchronized, so that files
+        #: that are written in several steps are synchronized once they are
+        #: complete. If `None` or 0, files are synchronized immediately.
+        self.settle_ms = None
+
+        #: The time, in milliseconds, within which a change should reach
+        #: the destination; a warning is logged for synchronizations that
+        #: take changes longer. If `None`, latency is tracked but not
+        #: checked.
+        self.latency_slo_ms = None
+
+        #: The quiet window, in milliseconds, that must elapse without any
+        #: new file system events before a burst of events is synchronized.
+        self.debounce_ms = 250
+
+        #: The maximum time, in milliseconds, that a burst of events may be
+        #: held back before it is synchronized, even if events keep arriving.
+        self.max_batch_wait_ms = 2000
+
+        #: Whether only the paths that changed since the last synchronization
+        #: should be transferred, instead of the entire directory.
+        self.incremental = False
+
+        #: When synchronizing incrementally, the interval, in milliseconds,
+        #: after which the next synchronization transfers the entire
+        #: directory again as a safety net. A value of 0 disables periodic
+        #: full synchronizations.
+        self.full_sync_interval_ms = 300000
+
+        #: When polling, the walker used to traverse the source directory:
+        #: "scandir", "listdir" or "threaded". By default "scandir" is used
+        #: when it is available.
+        self.walker = None
+
+        #: The number of worker threads used by the "threaded" walker.
+        self.walker_threads = 8
+
+        #: When polling, the shortest interval between polls in milliseconds.
+        #: Setting any of the `poll_*` options switches from a fixed polling
+        #: interval to an adaptive one, which is shortest right after changes
+        #: and backs off while the directory is idle.
+        self.poll_min_ms = None
+
+        #: When polling adaptively, the longest interval between polls while
+        #: the directory is idle, in milliseconds.
+        self.poll_max_ms = None
+
+        #: When polling adaptively, the largest fraction of wall time that
+        #: may be spent scanning the directory, e.g. 0.1.
+        self.poll_duty_cycle = None
+
+        #: When polling, whether each poll should only relist the directories
+        #: whose modification time changed since the previous poll.
+        self.incremental_scan = False
+
+        #: When polling incrementally, the files of unchanged directories are
+        #: only stat'ed on every Nth poll. A value of 1 stats them every poll.
+        self.file_stat_interval = 1
+
+        #: When polling, how snapshots of the source directory are stored:
+        #: "standard", or "compact" for very large trees. Compact snapshots
+        #: cannot be taken incrementally.
+        self.snapshot = "standard"
+
         if manifest_path:
             self.parse(manifest_path)
 
     def __repr__(self):
         return "<Manifest(type='{0}', destination='{1}')>".format(self.type, self.dest)
 
+    @property
+    def snapshot_class(self):
+        """
+        Return the snapshot class that the manifest's `snapshot` option
+        selects.
+        """
+        if self.snapshot == "compact":
+            from ronin.utils.compactsnapshot import CompactDirectorySnapshot
+            return CompactDirectorySnapshot
+        elif self.snapshot in (None, "standard"):
+            from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+            return DiscriminatedDirectorySnapshot
+        raise ValueError("Unknown snapshot: {0}".format(self.snapshot))
+
     def apply(self, **kwargs):
         """
         Assign manifest properties from the passed keyword arguments.
@@ -105,12 +253,30 @@ class Manifest(object):
             manifest's properties::
 
             - args
+            - debounce_ms
+            - delete
             - elevate
             - exclude
+            - file_stat_interval
+            - full_sync_interval_ms
+            - hardlink
+            - incremental
+            - incremental_scan
+            - latency_slo_ms
+            - max_batch_wait_ms
             - path
+            - poll_duty_cycle
+            - poll_max_ms
+            - poll_min_ms
+            - settle_ms
+            - snapshot
+            - supersede_after_ms
             - type
+            - walker
+            - walker_threads
+            - workers
         """
-        for key, value in kwargs.iteritems():
+        for key, value in kwargs.items():
             if hasattr(self, key):
                 logger.debug("Setting manifest property: {0}={1}".format(key, value))
                 setattr(self, key, value)
@@ -149,11 +315,42 @@ class Ronin(object):
     :param loglevel: Optional. The level that messages should be logged at.
         Default: `logging.INFO`.
     :param logfile: Optional. The file that messages should be recorded to.
-        Default: `/var/log/ronin/ronin.log`
+        Default: `/var/log/ronin/ronin.log` if watching; a single
+        synchronization only records messages to a file if one is given.
     :param watch: Optional. Whether the `source` directory should be watched
         for changes. Default: `False`.
     :param poll: Optional. If watching a directory, whether polling should
         be used instead of events. Default: `False`.
+    :param hybrid: Optional. If watching a directory, whether events should
+        be used for the subtrees on local file systems and polling only for
+        those on network file systems or shared folders. Ignored if `poll`
+        is set. Default: `False`.
+    :param poll_min_ms: Optional. Overrides the manifest's `poll_min_ms`.
+    :param poll_max_ms: Optional. Overrides the manifest's `poll_max_ms`.
+    :param poll_duty_cycle: Optional. Overrides the manifest's
+        `poll_duty_cycle`.
+    :param statedir: Optional. The directory in which a snapshot of the
+        source directory is persisted between runs. If set, a watcher that
+        starts up only synchronizes what changed since it last ran.
+        Default: `None`.
+    :param use_asyncio: Optional. If watching a directory, whether it
+        should be watched from an asyncio event loop rather than from
+        observer and worker threads. Requires Python 3.5 or later.
+        Default: `False`.
+    :param sync_semaphore: Optional. A semaphore that is held while the
+        strategy runs, shared by several `ronin` instances to limit how many
+        synchronize at once. Default: `None`.
+    :param metrics_port: Optional. The local port on which metrics are
+        served in the Prometheus text format. Default: `None`.
+    :param metrics_file: Optional. The file that metrics are periodically
+        written to in the Prometheus text format. Default: `None`.
+    :param log_rate_limit: Optional. The number of debug messages per
+        second that each logging call may write; `0` disables the limit.
+        Default: `20`.
+    :param profile_dir: Optional. The directory that profiles of slow poll
+        and synchronization cycles are written to. Default: `None`.
+    :param profile_threshold_ms: Optional. The duration, in milliseconds,
+        above which a cycle's profile is kept. Default: `1000`.
     """
 
     #: The maximum number of bytes that a log file should be. (2MB)
@@ -164,8 +361,15 @@ class Ronin(object):
         #: logging.INFO.
         self.loglevel = logging.INFO
 
-        #: The file that persistent log messages should be recorded to.
-        self.logfile = self.default_logfile
+        #: The file that persistent log messages should be recorded to, or
+        #: `None` for the default log file if watching and no log file
+        #: otherwise.
+        self.logfile = None
+
+        #: The number of debug messages per second that each logging call
+        #: may write to the log file, or 0 if they are not limited. If
+        #: `None`, the default of 20 applies.
+        self.log_rate_limit = None
 
         #: If watching a directory for changes, this indicates whether or not
         #: ronin should be polling for this changes or relying on file system
@@ -177,19 +381,57 @@ class Ronin(object):
         #: the files.
         self.poll = False
 
+        #: If watching a directory for changes without polling, whether the
+        #: subtrees on file systems whose events are not reliable, such as
+        #: shared folders, should be polled while the rest of the directory
+        #: is observed with file system events.
+        self.hybrid = False
+
+        #: Settings for adaptive polling that take precedence over those in
+        #: the manifest.
+        self.poll_min_ms = None
+        self.poll_max_ms = None
+        self.poll_duty_cycle = None
+
         #: The source directory from which files will be copied during
         #: the synchronization.
         self.source = source
 
+        #: The directory in which the snapshot index of the source directory
+        #: is persisted, or `None` if snapshots should not be persisted.
+        self.statedir = None
+
         #: The strategy that will be invoked when running Ronin.
         self.strategy = None
 
+        #: Whether a watched directory is watched from an asyncio event
+        #: loop.
+        self.use_asyncio = False
+
+        #: The semaphore held while the strategy runs, or `None` if the
+        #: number of concurrent synchronizations is not limited.
+        self.sync_semaphore = None
+
+        #: The local port on which metrics are served, or `None`.
+        self.metrics_port = None
+
+        #: The file that metrics are periodically written to, or `None`.
+        self.metrics_file = None
+
+        #: The directory that profiles of slow cycles are written to, or
+        #: `None` if cycles are not profiled.
+        self.profile_dir = None
+
+        #: The duration, in milliseconds, above which a cycle's profile is
+        #: kept.
+        self.profile_threshold_ms = DEFAULT_THRESHOLD_MS
+
         #: Whether or not the source directory should be watched for changes.
         #: If the source directory is not being watched, ronin will run once
         #: and then exit.
         self.watch = False
 
-        for key, value in kwargs.iteritems():
+        for key, value in kwargs.items():
             if hasattr(self, key) and value is not None:
                 setattr(self, key, value)
 
@@ -199,10 +441,19 @@ class Ronin(object):
         #: Initialize
         self.init_logging()
 
+        #: The profiler of slow cycles, or `None` if cycles are not profiled.
+        self.profiler = None
+        if self.profile_dir:
+            self.profiler = CycleProfiler(self.profile_dir, self.profile_threshold_ms)
+
         manifest = self.read_manifest()
         factory = StrategyFactory()
         self.strategy = factory.get_strategy(self.source, manifest)
 
+        #: The tracker of the time changes take to reach the destination.
+        slo = manifest.latency_slo_ms / 1000.0 if manifest.latency_slo_ms else None
+        self.latency = LatencyTracker(self.source, slo=slo)
+
     def __repr__(self):
         return "<Ronin(source='{0}', watch='{1}', poll='{2}')>".format(self.source, self.watch, self.poll)
 
@@ -219,21 +470,45 @@ class Ronin(object):
     def init_logging(self):
         """
         Initialize logging for the application.
+
+        Messages are logged to the console and, if there is a log file, to
+        the file, each written by a background thread, so that logging does
+        not wait for the terminal or the disk. Debug messages written to the
+        log file are limited to :attr:`log_rate_limit` per second for each
+        logging call.
         """
-        path = os.path.dirname(self.logfile)
+        init_console_logging()
+        logger.setLevel(self.loglevel)
+        logfile = self.logfile
+        if logfile is None and self.watch:
+            logfile = self.default_logfile
+        if logfile is None:
+            return
+        logfile = os.path.abspath(logfile)
+        for handler in logger.handlers:
+            for target in getattr(handler, "handlers", (handler,)):
+                if getattr(target, "baseFilename", None) == logfile:
+                    # Another instance in this process already logs to the file.
+                    return
+
+        from logging.handlers import RotatingFileHandler
+        from ronin.utils.logqueue import BackgroundHandler, RateLimitFilter, DEFAULT_RATE
+        path = os.path.dirname(logfile)
         try:
             os.makedirs(path)
         except OSError:
             if not os.path.isdir(path):
                 raise
-        formatter = logging.Formatter(fmt="%(asctime)s - %(levelname)s - %(message)s",
-                                      datefmt="%Y-%m-%d %H:%M:%S")
-        rfh = RotatingFileHandler(filename=self.logfile,
+        formatter = logging.Formatter(fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        rfh = RotatingFileHandler(filename=logfile,
                                   maxBytes=Ronin.LOG_FILE_BYTE_SIZE,
                                   backupCount=10)
         rfh.setFormatter(formatter)
-        logger.addHandler(rfh)
-        logger.setLevel(self.loglevel)
+        handler = BackgroundHandler([rfh])
+        rate = DEFAULT_RATE if self.log_rate_limit is None else self.log_rate_limit
+        if rate:
+            handler.addFilter(RateLimitFilter(rate))
+        logger.addHandler(handler)
 
     def read_manifest(self):
         """
@@ -254,24 +529,228 @@ class Ronin(object):
         directory for changes, it will react to any changes within the
         file system.
         """
-        if self.watch:
-            self.run_watch()
-        else:
-            self.strategy.invoke()
+        metrics.start_exporters(self.metrics_port, self.metrics_file)
+        try:
+            if self.watch and self.use_asyncio:
+                self.run_async()
+            elif self.watch:
+                self.run_watch()
+            else:
+                self.invoke()
+        finally:
+            self.strategy.close()
+            metrics.stop_exporters()
         logger.info("Goodbye!")
 
-    def run_watch(self):
-        schedule_kwargs = {"recursive": True}
+    def run_async(self):
+        """
+        Watch the source directory from an asyncio event loop until
+        interrupted.
+        """
+        get_async_runner()([self]).run()
+
+    def invoke(self, changes=None):
+        """
+        Invoke the strategy, waiting for the synchronization semaphore first
+        if there is one.
+
+        :param changes: Optional. The :class:`ChangeSet` to synchronize.
+        """
+        if self.sync_semaphore is None:
+            return self._invoke_strategy(changes)
+        with self.sync_semaphore:
+            return self._invoke_strategy(changes)
+
+    def _invoke_strategy(self, changes):
+        strategy = self.strategy
+        started = time.time()
+        failed = True
+        try:
+            if self.profiler is None:
+                result = strategy.invoke(changes)
+            else:
+                result = self.profiler.run("sync", self.source, strategy.invoke, changes)
+            failed = bool(result)
+            return result
+        finally:
+            completed = time.time()
+            metrics.observe_sync(self.source, changes, completed - started, failed, strategy.cancelled,
+                                 strategy.full_sync)
+            if not failed and not strategy.cancelled and changes is not None:
+                self.latency.record(changes, completed)
+
+    @property
+    def snapshot_index(self):
+        """
+        Return the :class:`SnapshotIndex` for the source directory and its
+        manifest, or `None` if snapshots are not persisted.
+        """
+        if not self.statedir:
+            return None
+        from ronin.utils.snapshotindex import SnapshotIndex
+        return SnapshotIndex.for_manifest(self.statedir, self.source, self.strategy.manifest)
+
+    def get_poll_interval(self):
+        """
+        Return the :class:`AdaptivePollInterval` for the polling observer,
+        or `None` if it should poll at a fixed interval.
+        """
+        manifest = self.strategy.manifest
+        settings = []
+        for name in ("poll_min_ms", "poll_max_ms", "poll_duty_cycle"):
+            value = getattr(self, name)
+            settings.append(getattr(manifest, name) if value is None else value)
+        minimum, maximum, duty_cycle = settings
+        if minimum is None and maximum is None and duty_cycle is None:
+            return None
+        from ronin.observers.scheduling import AdaptivePollInterval
+        return AdaptivePollInterval(minimum=None if minimum is None else minimum / 1000.0,
+                                    maximum=None if maximum is None else maximum / 1000.0,
+                                    duty_cycle=duty_cycle)
+
+    def take_snapshot(self, previous=None, restat_files=True):
+        """
+        Return a snapshot of the source directory, taken the same way the
+        polling observer takes them.
+
+        :param previous: Optional. The previous snapshot, which an
+            incremental scan starts from.
+        :param restat_files: Optional. Whether an incremental scan should
+            stat the files of unchanged directories. Default: `True`.
+        """
+        manifest = self.strategy.manifest
+        started = time.time()
+        snapshot = manifest.snapshot_class(self.source, True,
+                                           matcher=self.strategy.exclude_matcher,
+                                           walker=manifest.walker,
+                                           workers=manifest.walker_threads,
+                                           incremental=manifest.incremental_scan,
+                                           previous=previous,
+                                           restat_files=restat_files)
+        metrics.observe_snapshot(self.source, snapshot, time.time() - started)
+        return snapshot
+
+    def catch_up(self, index):
+        """
+        Synchronize the changes made to the source directory since the
+        snapshot index was last saved, or the entire directory if there is
+        no index, and save a new index once the synchronization succeeds.
+        If the source directory is on another device than when the index
+        was saved, its entries are compared by path.
+
+        :param index: the :class:`SnapshotIndex` of the source directory.
+        :returns: the snapshot of the source directory.
+        """
+        from ronin.utils.changeset import ChangeSet
+        from ronin.utils.snapshotdiff import MergeSnapshotDiff
+        strategy = self.strategy
+        snapshot = self.take_snapshot()
+        loaded = index.load(strategy.manifest.snapshot_class)
+        if loaded is None:
+            logger.info("No snapshot index found for: '{0}', synchronizing all files".format(self.source))
+            result = self.invoke()
+        else:
+            previous, strategy.last_full_sync = loaded
+            if previous.stat_info(self.source).st_dev != snapshot.stat_info(self.source).st_dev:
+                # Shared folder and network mounts often get new device (and
+                # inode) numbers after a reboot, which would make every entry
+                # look replaced.
+                logger.info("The device of '{0}' changed since the last run, "
+                            "comparing files by path".format(self.source))
+                diff = MergeSnapshotDiff(previous, snapshot, by_path=True)
+            else:
+                diff = snapshot - previous
+            changes = ChangeSet.from_diff(diff)
+            logger.info("Synchronizing changes since the last run: {0}".format(changes))
+            result = self.invoke(changes) if changes else 0
+        if result:
+            logger.warning("Synchronization failed ({0}), the snapshot index was not saved".format(result))
+        else:
+            index.save(snapshot, strategy.last_full_sync)
+        return snapshot
+
+    def create_observer(self):
+        """
+        Return a new observer of the kind selected by :attr:`poll` and
+        :attr:`hybrid`.
+        """
         if self.poll:
             from ronin.observers.polling import DiscriminatedPollingObserver as Observer
-            schedule_kwargs["exclude_paths"] = self.strategy.exclude_paths
+        elif self.hybrid:
+            from ronin.observers.hybrid import HybridObserver as Observer
         else:
             from watchdog.observers import Observer
+        return Observer()
+
+    def get_schedule_kwargs(self, snapshot=None):
+        """
+        Return the keyword arguments for scheduling the source directory
+        with the observer.
+
+        :param snapshot: Optional. The snapshot of the source directory that
+            the polling observer should start from.
+        """
+        schedule_kwargs = {"recursive": True}
+        if self.poll or self.hybrid:
+            manifest = self.strategy.manifest
+            schedule_kwargs["matcher"] = self.strategy.exclude_matcher
+            schedule_kwargs["walker"] = manifest.walker
+            schedule_kwargs["walker_threads"] = manifest.walker_threads
+            schedule_kwargs["incremental_scan"] = manifest.incremental_scan
+            schedule_kwargs["file_stat_interval"] = manifest.file_stat_interval
+            schedule_kwargs["initial_snapshot"] = snapshot
+            schedule_kwargs["snapshot_class"] = manifest.snapshot_class
+            schedule_kwargs["poll_interval"] = self.get_poll_interval()
+            if self.profiler is not None:
+                schedule_kwargs["profiler"] = self.profiler
+        return schedule_kwargs
+
+    def start_watching(self, observer):
+        """
+        Catch up with changes made since the last run, if snapshots are
+        persisted, then schedule the source directory with the observer and
+        start synchronizing the events it reports.
+
+        :param observer: the observer, which may be shared with other
+            `ronin` instances.
+        :returns: the :class:`RoninEventHandler` for the source directory.
+        """
+        index = self.snapshot_index
+        snapshot = None
+        if index is not None:
+            snapshot = self.catch_up(index)
 
         logger.info("Starting file system observer for: {0}".format(self.source))
+        from ronin.events import RoninEventHandler
         event_handler = RoninEventHandler(self)
-        observer = Observer()
-        observer.schedule(event_handler, self.source, **schedule_kwargs)
+        observer.schedule(event_handler, self.source, **self.get_schedule_kwargs(snapshot))
+        event_handler.start()
+        return event_handler
+
+    def stop_watching(self, event_handler):
+        """
+        Synchronize any events that are still pending once the observer has
+        stopped and, if snapshots are persisted, save the snapshot index.
+
+        :param event_handler: the handler returned by :meth:`start_watching`.
+        """
+        #: The snapshot is taken before pending events are flushed, so that
+        #: changes made in between are synchronized again on the next run
+        #: rather than missed.
+        index = self.snapshot_index
+        if index is not None:
+            snapshot = self.take_snapshot()
+        event_handler.stop()
+        if index is not None:
+            if event_handler.failures:
+                logger.warning("Synchronization failed while watching, the snapshot index was not saved")
+            else:
+                index.save(snapshot, self.strategy.last_full_sync)
+        logger.info("Change latency for '{0}': {1}".format(self.source, self.latency.summary()))
+
+    def run_watch(self):
+        observer = self.create_observer()
+        event_handler = self.start_watching(observer)
         observer.start()
 
         try:
@@ -282,3 +761,4 @@ class Ronin(object):
             logger.info("Stopping watcher...")
             observer.stop()
         observer.join()
+        self.stop_watching(event_handler)
@@ -0,0 +1,458 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+:module: ronin.aio
+:synopsis: An asyncio event loop for watching and synchronizing.
+
+Requires Python 3.5 or later.
+
+Classes
+-------
+.. autoclass:: AsyncRonin
+   :members:
+   :show-inheritance:
+
+.. autoclass:: AsyncWatch
+   :members:
+   :show-inheritance:
+"""
+
+from ronin import metrics
+from ronin.events import SourceEventHandler
+from ronin.utils.changeset import ChangeSet
+from ronin.utils.settle import WriteSettler
+import asyncio
+import logging
+import signal
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The interval, in seconds, between polls if adaptive polling is not
+#: configured.
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class _LoopEventHandler(SourceEventHandler):
+    """
+    Hands the events that a watchdog observer reports on its own thread to
+    an :class:`AsyncWatch` on the event loop.
+    """
+
+    def __init__(self, watch):
+        super(_LoopEventHandler, self).__init__(watch.ronin)
+        self.watch = watch
+
+    def add_event(self, event):
+        self.watch.loop.call_soon_threadsafe(self.watch.add_event, event)
+
+
+class AsyncWatch(object):
+    """
+    Watches one source directory and synchronizes its changes, driven by an
+    event loop rather than by threads of its own.
+
+    In polling mode the directory is polled from a coroutine whose interval
+    is set by the :class:`AdaptivePollInterval`, if one is configured; the
+    walks themselves run on the loop's default executor. Otherwise a shared
+    watchdog observer reports events to the loop.
+
+    Changes are debounced with loop timers, as the :class:`EventCoalescer`
+    does, and files that are still being written are held back by a
+    :class:`WriteSettler`. Strategies that run a single process (e.g.
+    rsync) are run with :func:`asyncio.create_subprocess_exec`; others run
+    on the executor.
+
+    :param ronin: the :class:`Ronin` instance for the source directory.
+    :param loop: the event loop.
+    :param semaphore: Optional. An :class:`asyncio.Semaphore` that limits
+        the number of concurrent synchronizations.
+    """
+
+    def __init__(self, ronin, loop, semaphore=None):
+        #: The `ronin` instance for the source directory.
+        self.ronin = ronin
+
+        #: The event loop.
+        self.loop = loop
+
+        #: The semaphore held while synchronizing, or `None`.
+        self.semaphore = semaphore
+
+        #: The number of synchronizations that failed.
+        self.failures = 0
+
+        #: The latest snapshot of the source directory, when polling or
+        #: persisting snapshots.
+        self.snapshot = None
+
+        manifest = ronin.strategy.manifest
+        self.debounce = max(manifest.debounce_ms / 1000.0, 0)
+        self.max_wait = max(manifest.max_batch_wait_ms / 1000.0, self.debounce)
+        self.supersede_after = manifest.supersede_after_ms / 1000.0 if manifest.supersede_after_ms else None
+        self.settler = WriteSettler(manifest.settle_ms / 1000.0) if manifest.settle_ms else None
+
+        self._pending = ChangeSet()
+        self._pending_events = 0
+        self._first_change_time = None
+        self._last_change_time = None
+        self._wakeup = asyncio.Event()
+        self._sync_started = None
+        self._supersede_handle = None
+        self._process = None
+        self._sync_task = None
+        self._final_snapshot = None
+        self._recheck_handle = None
+        self._stopping = False
+        self._tasks = []
+
+    @property
+    def strategy(self):
+        return self.ronin.strategy
+
+    def add_event(self, event):
+        """
+        Add a file system event to the pending changes.
+        """
+        changes = ChangeSet()
+        changes.add_event(event)
+        self._pending_events += 1
+        self.add_changes(changes)
+
+    def add_changes(self, changes):
+        """
+        Add changes to the pending changes, which are synchronized once no
+        new change has arrived for the debounce window.
+
+        :param changes: the :class:`ChangeSet`.
+        """
+        if self.settler is not None and changes.closed:
+            self.settler.release_closed(changes)
+        if not changes:
+            return
+        now = self.loop.time()
+        if self._first_change_time is None:
+            self._first_change_time = now
+        self._last_change_time = now
+        self._pending.update(changes)
+        self._wakeup.set()
+        self._schedule_supersede()
+
+    def _take_pending(self):
+        changes = self._pending
+        self._pending = ChangeSet()
+        if self._pending_events > 1:
+            metrics.EVENTS_COALESCED.labels(self.ronin.source).inc(self._pending_events - 1)
+        self._pending_events = 0
+        self._first_change_time = None
+        self._last_change_time = None
+        if self.settler is not None and not self._stopping:
+            delay = self.settler.hold(changes)
+            if delay is not None:
+                self._recheck_handle = self.loop.call_later(delay, self._recheck)
+        return changes
+
+    def _recheck(self):
+        self._recheck_handle = None
+        self.add_changes(self.settler.release())
+
+    def _schedule_supersede(self):
+        if self.supersede_after is None or self._sync_started is None or self._supersede_handle is not None:
+            return
+        delay = max(self._sync_started + self.supersede_after - self.loop.time(), 0)
+        self._supersede_handle = self.loop.call_later(delay, self._supersede)
+
+    def _supersede(self):
+        self._supersede_handle = None
+        if self._sync_started is None or not self._pending:
+            return
+        logger.debug("Superseding the synchronization of: {0}".format(self.ronin.source))
+        self.strategy.cancel()
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+
+    async def start(self, observer=None):
+        """
+        Catch up with changes made since the last run, if snapshots are
+        persisted, and start watching.
+
+        :param observer: Optional. The watchdog observer to schedule the
+            source directory with, if not polling.
+        """
+        ronin = self.ronin
+        index = ronin.snapshot_index
+        if index is not None:
+            self.snapshot = await self._run_in_executor(ronin.catch_up, index)
+        if ronin.poll:
+            if self.snapshot is None:
+                self.snapshot = await self.loop.run_in_executor(None, ronin.take_snapshot)
+            self._tasks.append(self.loop.create_task(self.poll()))
+        else:
+            observer.schedule(_LoopEventHandler(self), ronin.source, **ronin.get_schedule_kwargs(self.snapshot))
+        metrics.QUEUE_DEPTH.labels(ronin.source).set_function(lambda: len(self._pending))
+        self._tasks.append(self.loop.create_task(self.dispatch()))
+        logger.info("Watching directory: '{0}' for changes (poll={1})".format(ronin.source, ronin.poll))
+
+    async def take_final_snapshot(self):
+        """
+        Take the snapshot that :meth:`stop` relies on, if one is needed. It
+        must be taken before the observer stops, so that the events for any
+        change it includes are still delivered.
+        """
+        ronin = self.ronin
+        if ronin.poll or ronin.snapshot_index is not None:
+            self._final_snapshot = await self.loop.run_in_executor(None, ronin.take_snapshot)
+
+    async def stop(self):
+        """
+        Stop watching, synchronize the pending changes and, if snapshots are
+        persisted, save the snapshot index.
+        """
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._sync_task is not None:
+            await self._sync_task
+            self._sync_task = None
+
+        if self._recheck_handle is not None:
+            self._recheck_handle.cancel()
+            self._recheck()
+
+        ronin = self.ronin
+        index = ronin.snapshot_index
+        snapshot = self._final_snapshot
+        if ronin.poll and snapshot is not None and self.snapshot is not None:
+            # Changes made since the last poll.
+            self.add_changes(ChangeSet.from_diff(snapshot - self.snapshot, time.time()))
+        if self._pending:
+            await self.synchronize(self._take_pending())
+        if index is not None:
+            if self.failures:
+                logger.warning("Synchronization failed while watching, the snapshot index was not saved")
+            else:
+                await self.loop.run_in_executor(None, index.save, snapshot, self.strategy.last_full_sync)
+        logger.info("Change latency for '{0}': {1}".format(ronin.source, ronin.latency.summary()))
+
+    async def poll(self):
+        """
+        Poll the source directory for changes until cancelled.
+        """
+        ronin = self.ronin
+        manifest = self.strategy.manifest
+        poll_interval = ronin.get_poll_interval()
+        file_stat_interval = max(manifest.file_stat_interval or 1, 1)
+        poll_count = 0
+        while True:
+            await asyncio.sleep(poll_interval.interval if poll_interval is not None else DEFAULT_POLL_INTERVAL)
+            started = time.time()
+            poll_count += 1
+            restat_files = poll_count % file_stat_interval == 0
+            if ronin.profiler is None:
+                snapshot, diff = await self.loop.run_in_executor(None, self._scan, restat_files)
+            else:
+                snapshot, diff = await self.loop.run_in_executor(None, ronin.profiler.run, "poll", ronin.source,
+                                                                 self._scan, restat_files)
+            changes = ChangeSet.from_diff(diff, started)
+            self.snapshot = snapshot
+            metrics.EVENTS_RECEIVED.labels(ronin.source).inc(len(changes))
+            self.add_changes(changes)
+            if poll_interval is not None:
+                interval = poll_interval.update(bool(changes), time.time() - started)
+                logger.debug("Next poll of {0} in {1:.3f}s".format(ronin.source, interval))
+
+    def _scan(self, restat_files):
+        snapshot = self.ronin.take_snapshot(self.snapshot, restat_files)
+        return snapshot, snapshot - self.snapshot
+
+    async def dispatch(self):
+        """
+        Synchronize pending changes once they have settled, until cancelled.
+        """
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                deadline = min(self._last_change_time + self.debounce, self._first_change_time + self.max_wait)
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    changes = self._take_pending()
+                    if changes:
+                        # Shielded, so that stopping lets the synchronization
+                        # in progress finish; see stop().
+                        self._sync_task = self.loop.create_task(self.synchronize(changes))
+                        await asyncio.shield(self._sync_task)
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    self._wakeup.clear()
+                except asyncio.TimeoutError:
+                    pass
+
+    async def synchronize(self, changes):
+        """
+        Synchronize a set of changes. If the synchronization is superseded
+        by newer changes, its changes are put back ahead of them.
+
+        :param changes: the :class:`ChangeSet` to synchronize.
+        """
+        if self.semaphore is not None:
+            async with self.semaphore:
+                return await self._synchronize(changes)
+        return await self._synchronize(changes)
+
+    async def _synchronize(self, changes):
+        strategy = self.strategy
+        strategy.cancelled = False
+        self._sync_started = self.loop.time()
+        if self._pending:
+            self._schedule_supersede()
+        logger.debug("Synchronizing: {0}".format(changes))
+        started = time.time()
+        failed = True
+        try:
+            if self.ronin.profiler is None and hasattr(strategy, "get_command"):
+                result = await self._run_command(changes)
+            elif self.ronin.profiler is None:
+                result = await self.loop.run_in_executor(None, strategy.invoke, changes)
+            else:
+                # Profiled synchronizations run the strategy on the executor,
+                # as the threaded watcher does, so that its work is profiled.
+                result = await self.loop.run_in_executor(None, self.ronin.profiler.run, "sync", self.ronin.source,
+                                                         strategy.invoke, changes)
+            failed = bool(result)
+            if not failed and not strategy.cancelled:
+                await self.loop.run_in_executor(None, self.ronin.latency.record, changes, time.time())
+            if strategy.cancelled:
+                logger.info("Synchronization was superseded by newer changes, restarting.")
+                changes.update(self._pending)
+                self._pending = changes
+                if self._first_change_time is None:
+                    self._first_change_time = self._last_change_time = self.loop.time()
+                self._wakeup.set()
+            elif result:
+                logger.error("Synchronization failed with exit status: {0}".format(result))
+                self.failures += 1
+        except Exception as err:
+            logger.error("An unexpected error occurred while synchronizing files: {0}".format(err))
+            logger.exception(err)
+            self.failures += 1
+        finally:
+            metrics.observe_sync(self.ronin.source, changes, time.time() - started, failed, strategy.cancelled,
+                                 strategy.full_sync)
+            self._sync_started = None
+            if self._supersede_handle is not None:
+                self._supersede_handle.cancel()
+                self._supersede_handle = None
+
+    async def _run_command(self, changes):
+        strategy = self.strategy
+        started = time.time()
+        # Building the command may rename moved paths at the destination.
+        command, input, full_sync = await self.loop.run_in_executor(None, strategy.get_command, changes)
+        strategy.full_sync = full_sync
+        if command is None:
+            return 0
+        logger.debug("Running command: {0}".format(" ".join(command)))
+        self._process = await asyncio.create_subprocess_exec(
+            *command, stdin=asyncio.subprocess.PIPE if input is not None else None)
+        try:
+            await self._process.communicate(input)
+        finally:
+            result = self._process.returncode
+            self._process = None
+        if full_sync and result == 0 and not strategy.cancelled:
+            strategy.last_full_sync = started
+        return result
+
+    async def _run_in_executor(self, function, *args):
+        if self.semaphore is not None:
+            async with self.semaphore:
+                return await self.loop.run_in_executor(None, function, *args)
+        return await self.loop.run_in_executor(None, function, *args)
+
+
+class AsyncRonin(object):
+    """
+    Watches one or more source directories from a single asyncio event loop
+    until interrupted (SIGINT) or terminated (SIGTERM).
+
+    :param instances: the :class:`Ronin` instances to watch.
+    :param max_concurrent_syncs: Optional. The largest number of source
+        directories that may synchronize at the same time. Default: `None`,
+        unlimited.
+    """
+
+    def __init__(self, instances, max_concurrent_syncs=None):
+        #: The `ronin` instances to watch.
+        self.instances = list(instances)
+
+        #: The largest number of concurrent synchronizations, or `None`.
+        self.max_concurrent_syncs = max_concurrent_syncs
+
+    def run(self):
+        """
+        Run the event loop until interrupted.
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.main(loop))
+        finally:
+            loop.close()
+
+    async def main(self, loop):
+        stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stopping.set)
+            except (NotImplementedError, RuntimeError):
+                # Not supported on this platform, or not the main thread.
+                pass
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_syncs) if self.max_concurrent_syncs else None
+        watches = [AsyncWatch(ronin, loop, semaphore) for ronin in self.instances]
+        observer = None
+        watched = [ronin for ronin in self.instances if not ronin.poll]
+        if watched:
+            observer = watched[0].create_observer()
+        await asyncio.gather(*(watch.start(observer) for watch in watches))
+        if observer is not None:
+            observer.start()
+
+        try:
+            await stopping.wait()
+            logger.info("Stopping watcher...")
+            await asyncio.gather(*(watch.take_final_snapshot() for watch in watches))
+        finally:
+            if observer is not None:
+                observer.stop()
+                await loop.run_in_executor(None, observer.join)
+            await asyncio.gather(*(watch.stop() for watch in watches))
@@ -0,0 +1,465 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import Manifest, Ronin, init_console_logging
+from ronin.strategies import StrategyFactory
+from ronin.utils.changeset import ChangeSet
+from ronin.utils.compactsnapshot import CompactDirectorySnapshot
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot, DEFAULT_WALKER_THREADS
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The shapes of the synthetic trees that can be generated.
+SHAPES = ("wide", "deep", "many-small", "few-large")
+
+#: The strategies whose synchronization can be measured.
+STRATEGIES = ("rsync", "native", "link", "tarstream")
+
+#: The snapshot implementations whose construction can be measured.
+SNAPSHOT_CLASSES = {
+    "discriminated": DiscriminatedDirectorySnapshot,
+    "compact": CompactDirectorySnapshot
+}
+
+#: The default number of files in a generated tree.
+DEFAULT_FILES = 5000
+
+#: The default size of each file in a "few-large" tree, in bytes. (16MB)
+DEFAULT_LARGE_SIZE = 16777216
+
+#: The default number of times each measurement is repeated.
+DEFAULT_REPEAT = 3
+
+#: The default number of changes whose latency is measured per pipeline.
+DEFAULT_LATENCY_SAMPLES = 10
+
+#: The number of nested directories in a "deep" tree.
+DEEP_DEPTH = 32
+
+#: The number of files per directory in a "many-small" tree.
+SMALL_FILES_PER_DIRECTORY = 100
+
+#: The fraction of the files that are changed between two measurements of
+#: an incremental operation.
+CHANGED_FRACTION = 0.01
+
+
+def generate_tree(root, shape, files=DEFAULT_FILES, large_size=DEFAULT_LARGE_SIZE):
+    """
+    Populate a directory with a synthetic tree of the given shape.
+
+    - "wide": as many directories directly under `root` as files in each.
+    - "deep": a chain of nested directories with the files spread along it.
+    - "many-small": directories of small files, two levels deep.
+    - "few-large": one file of `large_size` bytes per thousand `files`.
+
+    :param root: the directory to populate; it is created if necessary.
+    :param shape: one of :data:`SHAPES`.
+    :param files: Optional. The number of files to generate.
+    :param large_size: Optional. The size of each file in a "few-large" tree.
+    :returns: the paths of the generated files.
+    """
+    if shape == "wide":
+        directories = max(int(files ** 0.5), 1)
+        layout = [("d{0}".format(i % directories), 64) for i in range(files)]
+    elif shape == "deep":
+        levels = [os.path.join(*["l{0}".format(d) for d in range(depth + 1)]) for depth in range(DEEP_DEPTH)]
+        layout = [(levels[i % DEEP_DEPTH], 256) for i in range(files)]
+    elif shape == "many-small":
+        layout = [(os.path.join("g{0}".format(i // (SMALL_FILES_PER_DIRECTORY ** 2)),
+                                "s{0}".format(i // SMALL_FILES_PER_DIRECTORY)), 1024) for i in range(files)]
+    elif shape == "few-large":
+        layout = [("large", large_size) for i in range(max(files // 1000, 1))]
+    else:
+        raise ValueError("Unknown tree shape: {0}".format(shape))
+
+    paths = []
+    chunk = b"x" * 1048576
+    for i, (directory, size) in enumerate(layout):
+        directory = os.path.join(root, directory)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, "f{0}.dat".format(i))
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining > 0:
+                f.write(chunk[:remaining])
+                remaining -= len(chunk)
+        paths.append(path)
+    return paths
+
+
+def touch(paths, fraction=CHANGED_FRACTION):
+    """
+    Change a fraction of the given files, spread evenly across them, and
+    return the paths of those that changed.
+
+    :param paths: the paths of the files.
+    :param fraction: Optional. The fraction of the files to change.
+    """
+    step = max(int(1 / fraction), 1)
+    changed = paths[::step]
+    for path in changed:
+        with open(path, "ab") as f:
+            f.write(b"y")
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 1))
+    return changed
+
+
+def summarize(samples):
+    """
+    Return the minimum, median, mean and maximum of the timing samples.
+
+    :param samples: the durations, in seconds.
+    """
+    ordered = sorted(samples)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2.0
+    return {"min": ordered[0],
+            "median": median,
+            "mean": sum(ordered) / float(len(ordered)),
+            "max": ordered[-1],
+            "samples": len(ordered)}
+
+
+def timed(function, *args, **kwargs):
+    """
+    Call a function and return its duration, in seconds, and its result.
+    """
+    started = time.time()
+    result = function(*args, **kwargs)
+    return time.time() - started, result
+
+
+def bench_snapshots(root, paths, repeat=DEFAULT_REPEAT, workers=DEFAULT_WALKER_THREADS):
+    """
+    Measure the construction of full and incremental snapshots of a tree,
+    and the diff of two snapshots taken before and after a fraction of its
+    files changed, for each snapshot implementation.
+
+    :param root: the root of the tree.
+    :param paths: the paths of the files in the tree.
+    :param repeat: Optional. The number of times each measurement is taken.
+    :param workers: Optional. The number of threads that walk the tree.
+    :returns: a list of results.
+    """
+    results = []
+    for name, snapshot_class in sorted(SNAPSHOT_CLASSES.items()):
+        take = lambda previous=None: snapshot_class(root, True, workers=workers,
+                                                    incremental=previous is not None, previous=previous)
+        full, rescan, diff = [], [], []
+        entries = 0
+        for i in range(repeat):
+            duration, snapshot = timed(take)
+            full.append(duration)
+            entries = len(snapshot.paths)
+            rescan.append(timed(take, snapshot)[0])
+            touch(paths)
+            changed = take()
+            diff.append(timed(lambda: changed - snapshot)[0])
+        results.append({"benchmark": "snapshot", "snapshot": name, "entries": entries, "seconds": summarize(full)})
+        results.append({"benchmark": "rescan", "snapshot": name, "entries": entries, "seconds": summarize(rescan)})
+        results.append({"benchmark": "diff", "snapshot": name, "entries": entries, "seconds": summarize(diff)})
+    return results
+
+
+def create_strategy(source, target, strategy_type, **options):
+    """
+    Write a manifest for a source directory and return the strategy it
+    describes.
+
+    :param source: the source directory.
+    :param target: the directory to synchronize to.
+    :param strategy_type: one of :data:`STRATEGIES`.
+    :param options: Optional. Additional manifest properties.
+    """
+    manifest = {"type": strategy_type, "path": target, "args": ["-a"], "exclude": [], "incremental": True}
+    manifest.update(options)
+    manifest_path = os.path.join(source, "ronin.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return StrategyFactory().get_strategy(source, Manifest(manifest_path))
+
+
+def bench_strategy(source, paths, scratch, strategy_type, repeat=DEFAULT_REPEAT):
+    """
+    Measure a strategy synchronizing a tree into an empty directory, again
+    with nothing changed, and incrementally after a fraction of its files
+    changed.
+
+    :param source: the root of the tree.
+    :param paths: the paths of the files in the tree.
+    :param scratch: the directory in which destinations are created.
+    :param strategy_type: one of :data:`STRATEGIES`.
+    :param repeat: Optional. The number of times each measurement is taken.
+    :returns: a list of results.
+    """
+    cold, warm, incremental = [], [], []
+    try:
+        for i in range(repeat):
+            target = os.path.join(scratch, "dst-{0}".format(strategy_type))
+            shutil.rmtree(target, True)
+            os.makedirs(target)
+            strategy = create_strategy(source, target, strategy_type)
+            try:
+                for samples, changes in ((cold, None), (warm, None), (incremental, ChangeSet())):
+                    if changes is not None:
+                        for path in touch(paths):
+                            changes.add_modified(path)
+                    duration, result = timed(strategy.invoke, changes)
+                    if result:
+                        raise RuntimeError("Synchronization failed: {0}".format(result))
+                    samples.append(duration)
+            finally:
+                strategy.close()
+    except Exception as err:
+        logger.warning("Could not measure the {0} strategy: {1}".format(strategy_type, err))
+        return [{"benchmark": "sync", "strategy": strategy_type, "error": "{0}".format(err)}]
+
+    return [{"benchmark": "sync", "strategy": strategy_type, "mode": "cold", "seconds": summarize(cold)},
+            {"benchmark": "sync", "strategy": strategy_type, "mode": "unchanged", "seconds": summarize(warm)},
+            {"benchmark": "sync", "strategy": strategy_type, "mode": "incremental", "seconds": summarize(incremental)}]
+
+
+def bench_latency(scratch, strategy_type="native", poll=False, samples=DEFAULT_LATENCY_SAMPLES, timeout=30):
+    """
+    Measure the time from a file being written to the strategy having
+    synchronized it while watching, through the observer, the event
+    handler and the strategy.
+
+    :param scratch: the directory in which the source and destination are
+        created.
+    :param strategy_type: Optional. The strategy to synchronize with.
+    :param poll: Optional. Whether changes are detected by polling.
+    :param samples: Optional. The number of changes that are measured.
+    :param timeout: Optional. How long to wait for each change, in seconds.
+    :returns: a list of results.
+    """
+    source = os.path.join(scratch, "latency-src")
+    target = os.path.join(scratch, "latency-dst")
+    for path in (source, target):
+        shutil.rmtree(path, True)
+        os.makedirs(path)
+    create_strategy(source, target, strategy_type)
+
+    ronin = Ronin(source, watch=True, poll=poll, logfile=os.path.join(scratch, "ronin.log"))
+    synchronized = {}
+    condition = threading.Condition()
+    invoke = ronin.invoke
+
+    def record(changes=None):
+        result = invoke(changes)
+        done = time.time()
+        with condition:
+            for path in (changes.updated_paths if changes is not None else []):
+                synchronized.setdefault(path, done)
+            condition.notify_all()
+        return result
+    ronin.invoke = record
+
+    observer = ronin.create_observer()
+    event_handler = ronin.start_watching(observer)
+    observer.start()
+    latencies = []
+    try:
+        time.sleep(1)
+        for i in range(samples):
+            path = os.path.join(source, "change-{0}.txt".format(i))
+            written = time.time()
+            with open(path, "w") as f:
+                f.write("{0}".format(written))
+            with condition:
+                deadline = written + timeout
+                while path not in synchronized and time.time() < deadline:
+                    condition.wait(deadline - time.time())
+            if path not in synchronized:
+                raise RuntimeError("Change was not synchronized within {0}s".format(timeout))
+            latencies.append(synchronized[path] - written)
+    except Exception as err:
+        logger.warning("Could not measure latency: {0}".format(err))
+        return [{"benchmark": "latency", "strategy": strategy_type, "poll": poll, "error": "{0}".format(err)}]
+    finally:
+        observer.stop()
+        observer.join()
+        ronin.stop_watching(event_handler)
+        ronin.strategy.close()
+    return [{"benchmark": "latency", "strategy": strategy_type, "poll": poll, "seconds": summarize(latencies)}]
+
+
+def bench_startup(scratch, repeat=DEFAULT_REPEAT):
+    """
+    Measure, in fresh interpreters, starting the interpreter alone,
+    importing `ronin`, and a one-shot synchronization of a small tree from
+    the command line, both without and with a log file.
+
+    :param scratch: the directory in which the small tree is created.
+    :param repeat: Optional. The number of times each measurement is taken.
+    :returns: a list of results.
+    """
+    source = os.path.join(scratch, "startup-src")
+    target = os.path.join(scratch, "startup-dst")
+    for path in (source, target):
+        shutil.rmtree(path, True)
+        os.makedirs(path)
+    generate_tree(source, "wide", files=10)
+    create_strategy(source, target, "native")
+
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([here] + [p for p in [env.get("PYTHONPATH")] if p])
+    commands = [("interpreter", ["-c", "pass"]),
+                ("import", ["-c", "import ronin"]),
+                ("one-shot", ["-m", "ronin", source]),
+                ("one-shot-logfile", ["-m", "ronin", "-l", os.path.join(scratch, "startup.log"), source])]
+
+    results = []
+    for name, args in commands:
+        samples = []
+        for i in range(repeat):
+            duration, code = timed(subprocess.call, [sys.executable] + args, env=env)
+            if code:
+                results.append({"benchmark": "startup", "mode": name, "error": "exited with {0}".format(code)})
+                break
+            samples.append(duration)
+        else:
+            results.append({"benchmark": "startup", "mode": name, "seconds": summarize(samples)})
+    return results
+
+
+def run(shapes=SHAPES, strategies=STRATEGIES, files=DEFAULT_FILES, large_size=DEFAULT_LARGE_SIZE,
+        repeat=DEFAULT_REPEAT, latency_samples=DEFAULT_LATENCY_SAMPLES, workers=DEFAULT_WALKER_THREADS, scratch=None,
+        latency=True, startup=True):
+    """
+    Run the benchmarks and return their results in a dictionary that can
+    be serialized to JSON.
+
+    :param shapes: Optional. The shapes of the trees to measure.
+    :param strategies: Optional. The strategies to measure.
+    :param files: Optional. The number of files in each tree.
+    :param large_size: Optional. The size of each file in "few-large" trees.
+    :param repeat: Optional. The number of times each measurement is taken.
+    :param latency_samples: Optional. The number of changes whose latency is
+        measured per pipeline.
+    :param workers: Optional. The number of threads that walk trees.
+    :param scratch: Optional. The directory in which trees are generated.
+        Default: a temporary directory that is removed afterwards.
+    :param latency: Optional. Whether the latency of watching is measured.
+    :param startup: Optional. Whether startup times are measured.
+    """
+    temporary = scratch is None
+    scratch = tempfile.mkdtemp(prefix="ronin-bench-") if temporary else scratch
+    results = []
+    try:
+        for shape in shapes:
+            source = os.path.join(scratch, "src-{0}".format(shape))
+            shutil.rmtree(source, True)
+            started = time.time()
+            paths = generate_tree(source, shape, files, large_size)
+            logger.info("Generated {0} tree of {1} files in {2:.3f}s".format(shape, len(paths), time.time() - started))
+
+            shape_results = bench_snapshots(source, paths, repeat, workers)
+            for strategy_type in strategies:
+                shape_results.extend(bench_strategy(source, paths, scratch, strategy_type, repeat))
+            for result in shape_results:
+                result["shape"] = shape
+                result["files"] = len(paths)
+            results.extend(shape_results)
+            shutil.rmtree(source, True)
+
+        if latency:
+            for poll in (False, True):
+                results.extend(bench_latency(scratch, poll=poll, samples=latency_samples))
+        if startup:
+            results.extend(bench_startup(scratch, repeat))
+    finally:
+        if temporary:
+            shutil.rmtree(scratch, True)
+
+    version_txt = os.path.join(os.path.dirname(os.path.abspath(__file__)), "version.txt")
+    with open(version_txt) as f:
+        version = f.read().strip()
+    return {"ronin": version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "results": results}
+
+
+#: Main program
+def main(argv=None):
+    """
+    Run the benchmarks selected by the command line arguments and write
+    their results as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Measure snapshot, diff and synchronization throughput.")
+    parser.add_argument("--shape", action="append", choices=SHAPES, help="Tree shape to measure; may be repeated. Default: all.")
+    parser.add_argument("--strategy", action="append", choices=STRATEGIES, help="Strategy to measure; may be repeated. Default: all.")
+    parser.add_argument("--files", metavar="NUM", type=int, default=DEFAULT_FILES, help="Number of files in each tree.")
+    parser.add_argument("--large-size", metavar="BYTES", type=int, default=DEFAULT_LARGE_SIZE, help="Size of each file in few-large trees.")
+    parser.add_argument("--repeat", metavar="NUM", type=int, default=DEFAULT_REPEAT, help="Number of times each measurement is taken.")
+    parser.add_argument("--latency-samples", metavar="NUM", type=int, default=DEFAULT_LATENCY_SAMPLES, help="Number of changes whose latency is measured.")
+    parser.add_argument("--walker-threads", metavar="NUM", type=int, default=DEFAULT_WALKER_THREADS, help="Number of threads that walk each tree.")
+    parser.add_argument("--scratch", metavar="DIR", type=str, help="Generate trees in DIR instead of a temporary directory.")
+    parser.add_argument("--no-latency", action="store_true", help="Skip measuring the latency of watching.")
+    parser.add_argument("--no-startup", action="store_true", help="Skip measuring startup times.")
+    parser.add_argument("-o", "--output", metavar="FILENAME", type=str, help="Write the results to FILENAME instead of stdout.")
+    args = parser.parse_args(argv)
+    init_console_logging()
+
+    report = run(shapes=args.shape or SHAPES,
+                 strategies=args.strategy or STRATEGIES,
+                 files=args.files,
+                 large_size=args.large_size,
+                 repeat=args.repeat,
+                 latency_samples=args.latency_samples,
+                 workers=args.walker_threads,
+                 scratch=args.scratch,
+                 latency=not args.no_latency,
+                 startup=not args.no_startup)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__": # pragma: no cover
+    sys.exit(main())
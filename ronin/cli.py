@@ -52,11 +52,24 @@ class CommandLine():
         self.parser = argparse.ArgumentParser(description='Synchronize directory contents.')
         self.parser.add_argument("-l", "--logfile", metavar="FILENAME", type=str, help="Use FILENAME as logfile path", required=False)
         self.parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output.", required=False)
+        self.parser.add_argument("--log-rate", metavar="NUM", type=int, help="Most debug messages per second each logging call writes to the logfile; 0 for no limit (default: 20).", required=False)
         self.parser.add_argument("--watch", action="store_true", help="Watch target for changes.", required=False)
         self.parser.add_argument("--poll", action="store_true", help="Use polling to detect file system changes instead of events.", required=False)
+        self.parser.add_argument("--hybrid", action="store_true", help="Use events for local file systems and poll only subtrees on network file systems or shared folders.", required=False)
+        self.parser.add_argument("--asyncio", action="store_true", help="Watch from an asyncio event loop instead of threads (Python 3.5+).", required=False)
+        self.parser.add_argument("--poll-min", metavar="MS", type=float, help="Shortest interval between polls, in milliseconds; enables adaptive polling.", required=False)
+        self.parser.add_argument("--poll-max", metavar="MS", type=float, help="Longest interval between polls while idle, in milliseconds; enables adaptive polling.", required=False)
+        self.parser.add_argument("--poll-duty", metavar="FRACTION", type=float, help="Largest fraction of time spent scanning, e.g. 0.1; enables adaptive polling.", required=False)
+        self.parser.add_argument("--state-dir", metavar="DIR", type=str, help="Persist a snapshot of the target in DIR so that restarts only synchronize what changed.", required=False)
         self.parser.add_argument("--timeout", metavar="NUM", type=float, help="Timeout in seconds to attempt to syncrhonize before giving up.", required=False)
+        self.parser.add_argument("--discover", metavar="DIR", action="append", help="Also synchronize every directory under DIR that contains a ronin.json file; may be repeated.", required=False)
+        self.parser.add_argument("--metrics-port", metavar="PORT", type=int, help="Serve metrics in the Prometheus text format on local PORT.", required=False)
+        self.parser.add_argument("--metrics-file", metavar="FILENAME", type=str, help="Periodically write metrics in the Prometheus text format to FILENAME.", required=False)
+        self.parser.add_argument("--profile", metavar="DIR", type=str, help="Write profiles of poll and sync cycles slower than --profile-threshold to DIR.", required=False)
+        self.parser.add_argument("--profile-threshold", metavar="MS", type=float, help="Duration in milliseconds above which a cycle's profile is kept (default: 1000).", required=False)
+        self.parser.add_argument("--max-syncs", metavar="NUM", type=int, help="Largest number of directories that synchronize at once when handling several.", required=False)
 
-        self.parser.add_argument("target", help="The directory containing the ronin manifest file (ronin.json).")
+        self.parser.add_argument("target", nargs="*", help="The directories containing the ronin manifest file (ronin.json).")
 
     def parse(self):
         """
@@ -64,17 +77,39 @@ class CommandLine():
         `ronin` process.
         """
         args = self.parser.parse_args()
+        if not args.target and not args.discover:
+            self.parser.error("at least one target or --discover directory is required")
+
+        options = dict(logfile=args.logfile,
+                       log_rate_limit=args.log_rate,
+                       loglevel=logging.DEBUG if args.verbose else logging.INFO,
+                       watch=args.watch,
+                       poll=args.poll,
+                       hybrid=args.hybrid,
+                       use_asyncio=args.asyncio,
+                       poll_min_ms=args.poll_min,
+                       poll_max_ms=args.poll_max,
+                       poll_duty_cycle=args.poll_duty,
+                       statedir=args.state_dir,
+                       metrics_port=args.metrics_port,
+                       metrics_file=args.metrics_file,
+                       profile_dir=args.profile,
+                       profile_threshold_ms=args.profile_threshold)
+
+        #: Several directories are handled by a single daemon process.
+        if len(args.target) > 1 or args.discover:
+            from ronin.daemon import RoninDaemon, DEFAULT_MAX_CONCURRENT_SYNCS
+            return RoninDaemon(args.target,
+                               discover=args.discover,
+                               max_concurrent_syncs=args.max_syncs or DEFAULT_MAX_CONCURRENT_SYNCS,
+                               **options)
 
         #: Resolve the path to the source directory (or, rather our target)
-        path = args.target
+        path = args.target[0]
         if os.path.isfile:
-            os.path.dirname(args.target)
+            os.path.dirname(path)
         path = os.path.abspath(os.path.expanduser(path) + os.sep)
 
         #: Create the Ronin instance.
-        ronin = Ronin(path,
-                      logfile=args.logfile,
-                      loglevel=logging.DEBUG if args.verbose else logging.INFO,
-                      watch=args.watch,
-                      poll=args.poll)
+        ronin = Ronin(path, **options)
         return ronin
@@ -0,0 +1,184 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import Ronin, get_async_runner, init_console_logging, metrics
+import logging
+import os
+import threading
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The default number of source directories that may synchronize at once.
+DEFAULT_MAX_CONCURRENT_SYNCS = 2
+
+#: The name of the manifest file that marks a source directory.
+MANIFEST_FILENAME = "ronin.json"
+
+
+class RoninDaemon(object):
+    """
+    Synchronizes many source directories, each with its own manifest, from a
+    single process.
+
+    Every source directory is handled by its own :class:`Ronin` instance, but
+    all of them are scheduled with one shared observer, so there is one
+    dispatch thread and one interpreter rather than one of each per
+    directory. A global cap on the number of concurrent synchronizations
+    keeps directories that change at the same time (e.g. after a branch
+    switch) from all hitting the disk at once.
+
+    :param sources: Optional. The source directories, each containing a
+        manifest file.
+    :param discover: Optional. Directories to search for manifest files;
+        every directory containing one is added to the sources.
+    :param max_concurrent_syncs: Optional. The largest number of source
+        directories that may synchronize at the same time. Default: `2`.
+    :param watch: Optional. Whether the source directories should be watched
+        for changes, rather than synchronized once. Default: `False`.
+    :param kwargs: Optional. The remaining keyword arguments for each
+        :class:`Ronin` instance, e.g. `poll` or `statedir`.
+    """
+
+    def __init__(self, sources=None, discover=None, max_concurrent_syncs=DEFAULT_MAX_CONCURRENT_SYNCS,
+                 watch=False, **kwargs):
+        init_console_logging()
+
+        #: The source directories.
+        self.sources = []
+        for source in list(sources or []) + [found for root in discover or () for found in self.discover(root)]:
+            source = os.path.join(os.path.abspath(os.path.expanduser(source)), "")
+            if source not in self.sources:
+                self.sources.append(source)
+
+        #: Whether the source directories should be watched for changes.
+        self.watch = watch
+
+        #: The largest number of source directories that may synchronize at
+        #: the same time.
+        self.max_concurrent_syncs = max(max_concurrent_syncs or 1, 1)
+
+        #: The semaphore shared by all instances, held while synchronizing.
+        self.sync_semaphore = threading.BoundedSemaphore(self.max_concurrent_syncs)
+
+        #: The `ronin` instances, one per source directory with a valid
+        #: manifest.
+        self.instances = []
+        for source in self.sources:
+            try:
+                ronin = Ronin(source, watch=watch, sync_semaphore=self.sync_semaphore, **kwargs)
+            except (IOError, OSError, ValueError) as e:
+                logger.error("Skipping source directory '{0}': {1}".format(source, e))
+                continue
+            self.instances.append(ronin)
+
+    def __repr__(self):
+        return "<RoninDaemon(sources={0}, watch='{1}')>".format(len(self.sources), self.watch)
+
+    @staticmethod
+    def discover(root):
+        """
+        Return the directories under the root that contain a manifest file.
+        Hidden directories are skipped, as are the subdirectories of a
+        directory with a manifest, which belong to that source directory.
+
+        :param root: the directory to search.
+        """
+        found = []
+        for path, dirnames, filenames in os.walk(os.path.abspath(os.path.expanduser(root))):
+            if MANIFEST_FILENAME in filenames:
+                found.append(path)
+                del dirnames[:]
+                continue
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        logger.info("Discovered {0} source directories under: {1}".format(len(found), root))
+        return found
+
+    def run(self):
+        """
+        Synchronize every source directory once or, if watching, watch them
+        all until interrupted.
+        """
+        if not self.instances:
+            logger.error("No source directories to synchronize.")
+            return 1
+        first = self.instances[0]
+        metrics.start_exporters(first.metrics_port, first.metrics_file)
+        try:
+            if self.watch and first.use_asyncio:
+                get_async_runner()(self.instances, self.max_concurrent_syncs).run()
+            elif self.watch:
+                self.run_watch()
+            else:
+                self.each(lambda ronin: ronin.invoke())
+        finally:
+            for ronin in self.instances:
+                ronin.strategy.close()
+            metrics.stop_exporters()
+        logger.info("Goodbye!")
+
+    def each(self, function):
+        """
+        Call the function with every instance, on a thread per instance, and
+        return the results in order. Synchronization is still limited by the
+        shared semaphore.
+
+        :param function: the function, called with a :class:`Ronin`.
+        """
+        results = [None] * len(self.instances)
+
+        def call(i, ronin):
+            try:
+                results[i] = function(ronin)
+            except Exception as err:
+                logger.error("An unexpected error occurred for '{0}': {1}".format(ronin.source, err))
+                logger.exception(err)
+
+        threads = [threading.Thread(target=call, args=(i, ronin)) for i, ronin in enumerate(self.instances)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def run_watch(self):
+        observer = self.instances[0].create_observer()
+        handlers = self.each(lambda ronin: ronin.start_watching(observer))
+        observer.start()
+
+        try:
+            logger.info("Watching {0} directories for changes".format(len([h for h in handlers if h])))
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Stopping watcher...")
+            observer.stop()
+        observer.join()
+        for ronin, event_handler in zip(self.instances, handlers):
+            if event_handler is not None:
+                ronin.stop_watching(event_handler)
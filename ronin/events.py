@@ -25,41 +25,394 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from pprint import pprint
-from watchdog.events import FileSystemEventHandler, PatternMatchingEventHandler
+from ronin import metrics
+from ronin.utils.changeset import ChangeSet
+from ronin.utils.settle import WriteSettler
+from watchdog.events import (
+    EVENT_TYPE_MOVED,
+    DirCreatedEvent,
+    DirDeletedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileSystemEventHandler,
+    PatternMatchingEventHandler
+)
 import glob
 import logging
+import threading
+import time
 
 #: The logging apparatus
 logger = logging.getLogger(__name__)
 
 
-class RoninEventHandler(PatternMatchingEventHandler):
+class EventCoalescer(object):
     """
-    A Watchdog file system event handler for performing file synchronization
-    based on the file synchronization strategy.
+    Folds bursts of file system events into a single batch that is handed to
+    a callback once the burst has settled.
+
+    A batch is released when no new event has arrived for ``debounce``
+    seconds, or when the oldest event in the batch has been waiting for
+    ``max_wait`` seconds, whichever comes first. Batches are dispatched from
+    a single worker thread, so the callback is never invoked concurrently;
+    events that arrive while the callback is running are collected into the
+    next batch, so that however many arrive, exactly one follow-up batch is
+    dispatched once the callback returns.
+
+    If ``supersede_after`` is given, ``on_supersede`` is called (from another
+    thread) when new events are waiting while the callback has been running
+    for longer than ``supersede_after`` seconds, so that a long running
+    batch that the new events have made stale can be abandoned. Items that
+    the abandoned batch did not handle can be put back with
+    :meth:`requeue`.
+
+    :param callback: The function invoked with the list of coalesced events.
+    :param debounce: Optional. The quiet window, in seconds. Default: `0.25`.
+    :param max_wait: Optional. The maximum time, in seconds, that an event
+        may be held back. Default: `2.0`.
+    :param supersede_after: Optional. The time, in seconds, after which a
+        running batch may be superseded by new events. Default: `None`,
+        batches are never superseded.
+    :param on_supersede: Optional. The function called, without arguments,
+        when the running batch is superseded.
+    """
+
+    def __init__(self, callback, debounce=0.25, max_wait=2.0, supersede_after=None, on_supersede=None):
+        #: The function that is invoked with each batch of events.
+        self.callback = callback
+
+        #: The quiet window, in seconds.
+        self.debounce = max(debounce, 0)
+
+        #: The maximum time, in seconds, that an event may be held back. It
+        #: is never shorter than the quiet window.
+        self.max_wait = max(max_wait, self.debounce)
+
+        #: The time, in seconds, after which a running batch may be
+        #: superseded by new events, or `None`.
+        self.supersede_after = supersede_after
+
+        #: The function called when the running batch is superseded.
+        self.on_supersede = on_supersede
+
+        self._condition = threading.Condition()
+        self._events = []
+        self._first_event_time = None
+        self._last_event_time = None
+        self._dispatch_time = None
+        self._supersede_timer = None
+        self._delayed = {}
+        self._stopped = False
+        self._thread = None
+
+    def add(self, event):
+        """
+        Add an event to the pending batch.
+
+        :param event: the file system event.
+        """
+        with self._condition:
+            now = time.time()
+            if self._first_event_time is None:
+                self._first_event_time = now
+            self._last_event_time = now
+            self._events.append(event)
+            self._condition.notify()
+            self._schedule_supersede(now)
+
+    def requeue(self, items, delay=None):
+        """
+        Put items back at the front of the pending batch, e.g. the changes
+        of a batch that was superseded before it was handled.
+
+        :param items: the items, which precede any pending events.
+        :param delay: Optional. The time, in seconds, to wait before putting
+            the items back. Items that are still waiting when the coalescer
+            is stopped are put back immediately.
+        """
+        if delay:
+            timer = threading.Timer(delay, self._requeue_delayed, (items,))
+            timer.daemon = True
+            with self._condition:
+                self._delayed[timer] = items
+            timer.start()
+            return
+        with self._condition:
+            now = time.time()
+            if self._first_event_time is None:
+                self._first_event_time = now
+                self._last_event_time = now
+            self._events[:0] = items
+            self._condition.notify()
+
+    def _requeue_delayed(self, items):
+        with self._condition:
+            for timer, delayed in list(self._delayed.items()):
+                if delayed is items:
+                    del self._delayed[timer]
+                    break
+            else:
+                # Already put back when the coalescer was stopped.
+                return
+        self.requeue(items)
+
+    def _schedule_supersede(self, now):
+        if self.supersede_after is None or self.on_supersede is None:
+            return
+        if self._dispatch_time is None or self._supersede_timer is not None:
+            return
+        delay = max(self._dispatch_time + self.supersede_after - now, 0)
+        self._supersede_timer = threading.Timer(delay, self._supersede, (self._dispatch_time,))
+        self._supersede_timer.daemon = True
+        self._supersede_timer.start()
+
+    def _supersede(self, dispatch_time):
+        with self._condition:
+            if self._dispatch_time != dispatch_time or not self._events:
+                return
+        logger.debug("Superseding the batch dispatched at {0}.".format(dispatch_time))
+        self.on_supersede()
+
+    @property
+    def pending(self):
+        """
+        The number of events waiting to be dispatched.
+        """
+        return len(self._events)
+
+    def start(self):
+        """
+        Start the worker thread that dispatches batches to the callback.
+        """
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="RoninEventCoalescer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """
+        Stop the worker thread, waiting for any batch that is currently
+        being dispatched to finish.
+
+        :param flush: Optional. Whether events that are still pending should
+            be dispatched before returning. Default: `True`.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._condition:
+            delayed, self._delayed = self._delayed, {}
+        for timer, items in delayed.items():
+            timer.cancel()
+            self.requeue(items)
+        if flush:
+            batch = self._take_batch()
+            if batch:
+                self.callback(batch)
+
+    def _take_batch(self):
+        with self._condition:
+            batch = self._events
+            self._events = []
+            self._first_event_time = None
+            self._last_event_time = None
+            return batch
+
+    def _next_batch(self):
+        """
+        Block until a batch is ready to be dispatched and return it, or
+        return `None` if the coalescer has been stopped.
+        """
+        with self._condition:
+            while not self._stopped:
+                if not self._events:
+                    self._condition.wait()
+                    continue
+                deadline = min(self._last_event_time + self.debounce,
+                               self._first_event_time + self.max_wait)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return self._take_batch()
+                self._condition.wait(remaining)
+        return None
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            with self._condition:
+                self._dispatch_time = time.time()
+                if self._events:
+                    self._schedule_supersede(self._dispatch_time)
+            try:
+                self.callback(batch)
+            finally:
+                with self._condition:
+                    self._dispatch_time = None
+                    if self._supersede_timer is not None:
+                        self._supersede_timer.cancel()
+                        self._supersede_timer = None
+
+
+class SourceEventHandler(PatternMatchingEventHandler):
+    """
+    A Watchdog file system event handler that receives the events of a
+    source directory, ignores those for excluded paths and hands the others
+    to :meth:`add_event`.
     """
 
     def __init__(self, ronin=None):
-        super_init = super(RoninEventHandler, self).__init__
+        super_init = super(SourceEventHandler, self).__init__
         super_init()
 
         #: Reference to the ronin process that informs this file system
         #: event handler how it should act when an event occurs.
         self.ronin = ronin
 
-        #: Attribute strategy exclude patterns to the ignore patterns of the
-        #: event handler.
-        strategy = self.ronin.strategy
-        self._ignore_patterns = strategy.exclude_patterns
-        logger.debug(self._ignore_patterns)
+        #: The matcher for the strategy's exclusions; events for excluded
+        #: paths are ignored.
+        self.matcher = self.ronin.strategy.exclude_matcher
+
+    def dispatch(self, event):
+        """
+        Dispatch the event unless it concerns an excluded path. A move
+        between an excluded and an included path is dispatched as the
+        creation or deletion of the included path.
+
+        :param event: the file system event.
+        """
+        matcher = self.matcher
+        if event.event_type == EVENT_TYPE_MOVED:
+            src_excluded = matcher.match(event.src_path, event.is_directory)
+            dest_excluded = matcher.match(event.dest_path, event.is_directory)
+            if src_excluded and dest_excluded:
+                return
+            if src_excluded:
+                event_class = DirCreatedEvent if event.is_directory else FileCreatedEvent
+                event = event_class(event.dest_path)
+            elif dest_excluded:
+                event_class = DirDeletedEvent if event.is_directory else FileDeletedEvent
+                event = event_class(event.src_path)
+        elif matcher.match(event.src_path, event.is_directory):
+            return
+        super(SourceEventHandler, self).dispatch(event)
 
     def on_any_event(self, event):
-        super(RoninEventHandler, self).on_any_event(event)
+        super(SourceEventHandler, self).on_any_event(event)
         logger.debug("Received file system event: %s", event)
+        metrics.EVENTS_RECEIVED.labels(self.ronin.source).inc()
+        if getattr(event, "seen", None) is None:
+            event.seen = time.time()
+        self.add_event(event)
+
+    def add_event(self, event):
+        """
+        Handle an event for an included path, on the observer's thread.
+
+        :param event: the file system event, with the time at which it was
+            received as its `seen` attribute.
+        """
+        raise NotImplementedError()
+
+
+class RoninEventHandler(SourceEventHandler):
+    """
+    A Watchdog file system event handler for performing file synchronization
+    based on the file synchronization strategy.
+
+    Events are not synchronized as they arrive; they are handed to an
+    :class:`EventCoalescer` which folds bursts of events into a single
+    invocation of the strategy.
+    """
 
+    def __init__(self, ronin=None):
+        super(RoninEventHandler, self).__init__(ronin)
+        strategy = self.ronin.strategy
+
+        #: The number of synchronizations that failed.
+        self.failures = 0
+
+        #: The settler that holds back files that are still being written,
+        #: or `None` if files are synchronized as soon as they change.
+        manifest = strategy.manifest
+        self.settler = WriteSettler(manifest.settle_ms / 1000.0) if manifest.settle_ms else None
+
+        #: Whether the handler is stopping, in which case files are no
+        #: longer held back.
+        self.stopping = False
+
+        #: The coalescer that batches events before they are synchronized.
+        supersede_after = manifest.supersede_after_ms
+        self.coalescer = EventCoalescer(self.synchronize,
+                                        debounce=manifest.debounce_ms / 1000.0,
+                                        max_wait=manifest.max_batch_wait_ms / 1000.0,
+                                        supersede_after=supersede_after / 1000.0 if supersede_after else None,
+                                        on_supersede=strategy.cancel)
+        metrics.QUEUE_DEPTH.labels(ronin.source).set_function(lambda: self.coalescer.pending)
+
+    def add_event(self, event):
+        self.coalescer.add(event)
+
+    def start(self):
+        """
+        Start dispatching coalesced events to the strategy.
+        """
+        self.coalescer.start()
+
+    def stop(self):
+        """
+        Stop dispatching events, synchronizing any that are still pending.
+        """
+        self.stopping = True
+        self.coalescer.stop()
+
+    def synchronize(self, events):
+        """
+        Invoke the strategy for a batch of coalesced events.
+
+        If the synchronization is cancelled because newer events superseded
+        it, its changes are requeued ahead of those events.
+
+        :param events: the file system events that triggered the
+            synchronization, preceded by the :class:`ChangeSet` of any
+            superseded synchronization. The settler stands in for the
+            changes it held back once they are due to be checked again.
+        """
+        changes = ChangeSet()
+        received = 0
+        for event in events:
+            if isinstance(event, ChangeSet):
+                changes.update(event)
+            elif event is self.settler:
+                changes.update(self.settler.release())
+            else:
+                changes.add_event(event)
+                received += 1
+        if received > 1:
+            metrics.EVENTS_COALESCED.labels(self.ronin.source).inc(received - 1)
+        if self.settler is not None and not self.stopping:
+            delay = self.settler.hold(changes)
+            if delay is not None:
+                self.coalescer.requeue([self.settler], delay=delay)
+        if not changes:
+            logger.debug("Ignoring {0} event(s) without changes to synchronize.".format(len(events)))
+            return
+        logger.debug("Synchronizing {0} coalesced event(s): {1}".format(len(events), changes))
+        strategy = self.ronin.strategy
+        strategy.cancelled = False
         try:
-            strategy = self.ronin.strategy
-            strategy.invoke()
+            result = self.ronin.invoke(changes)
+            if strategy.cancelled:
+                logger.info("Synchronization was superseded by newer changes, restarting.")
+                self.coalescer.requeue([changes])
+            elif result:
+                logger.error("Synchronization failed with exit status: {0}".format(result))
+                self.failures += 1
         except Exception as err:
-            logger.error("An unexpected error occurred while synchronizing files: {0}".format(err.message))
+            logger.error("An unexpected error occurred while synchronizing files: {0}".format(err))
             logger.exception(err)
+            self.failures += 1
@@ -0,0 +1,488 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import logging
+import os
+import threading
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The default upper bounds of histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+#: The default interval at which a metrics file is rewritten, in seconds.
+DEFAULT_WRITE_INTERVAL = 15.0
+
+#: The content type of the Prometheus text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return "{0}".format(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return "{0}".format(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+class Metric(object):
+    """
+    A named metric with optional labels, of which each combination of label
+    values is tracked separately.
+
+    :param name: the name of the metric.
+    :param documentation: the help text of the metric.
+    :param labelnames: Optional. The names of the metric's labels.
+    """
+
+    #: The type of the metric, as exposed to Prometheus.
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        #: The name of the metric.
+        self.name = name
+
+        #: The help text of the metric.
+        self.documentation = documentation
+
+        #: The names of the metric's labels.
+        self.labelnames = tuple(labelnames)
+
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        Return the child metric that tracks the given label values.
+
+        :param values: the values of the metric's labels, in order.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError("Expected values for labels: {0}".format(", ".join(self.labelnames)))
+        key = tuple("{0}".format(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._create_child())
+        return child
+
+    def _create_child(self):
+        raise NotImplementedError()
+
+    def render(self):
+        """
+        Return the lines of the Prometheus text exposition of the metric.
+        """
+        lines = ["# HELP {0} {1}".format(self.name, self.documentation.replace("\\", "\\\\").replace("\n", "\\n")),
+                 "# TYPE {0} {1}".format(self.name, self.type)]
+        for key, child in sorted(self._children.copy().items()):
+            labels = list(zip(self.labelnames, key))
+            for suffix, extra, value in child.samples():
+                pairs = ",".join("{0}=\"{1}\"".format(k, _escape(v)) for k, v in labels + extra)
+                lines.append("{0}{1}{2} {3}".format(self.name, suffix, "{" + pairs + "}" if pairs else "",
+                                                    _format_value(value)))
+        return lines
+
+
+class _CounterChild(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        """
+        Increase the counter by the given amount.
+        """
+        with self._lock:
+            self._value += amount
+
+    def samples(self):
+        return [("", [], self._value)]
+
+
+class Counter(Metric):
+    """
+    A metric whose value only increases, e.g. the number of events received.
+    """
+
+    type = "counter"
+
+    def _create_child(self):
+        return _CounterChild()
+
+
+class _GaugeChild(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        """
+        Set the gauge to the given value.
+        """
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        """
+        Increase the gauge by the given amount.
+        """
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        """
+        Decrease the gauge by the given amount.
+        """
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """
+        Take the value of the gauge from a function, called whenever the
+        metrics are exposed.
+        """
+        self._function = function
+
+    def samples(self):
+        function = self._function
+        return [("", [], function() if function is not None else self._value)]
+
+
+class Gauge(Metric):
+    """
+    A metric whose value may go up and down, e.g. the number of pending
+    events.
+    """
+
+    type = "gauge"
+
+    def _create_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild(object):
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+
+    def observe(self, value):
+        """
+        Record an observation, e.g. the duration of a synchronization.
+        """
+        with self._lock:
+            self._sum += value
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    def samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self._buckets, counts):
+            cumulative += count
+            samples.append(("_bucket", [("le", _format_value(bound))], cumulative))
+        samples.append(("_sum", [], total))
+        samples.append(("_count", [], cumulative))
+        return samples
+
+
+class Histogram(Metric):
+    """
+    A metric that counts observations in buckets, e.g. how long each
+    synchronization took.
+
+    :param buckets: Optional. The upper bounds of the buckets. A bucket for
+        any value is always added.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+
+        #: The upper bounds of the buckets.
+        self.buckets = tuple(sorted(set(buckets) | set([float("inf")])))
+
+    def _create_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class Registry(object):
+    """
+    The collection of metrics that are exposed together.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric to the registry and return it.
+        """
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Create and register a :class:`Counter`.
+        """
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        """
+        Create and register a :class:`Gauge`.
+        """
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Create and register a :class:`Histogram`.
+        """
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Return the Prometheus text exposition of every registered metric.
+        """
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+#: The registry of the metrics recorded by ronin.
+registry = Registry()
+
+SNAPSHOT_SECONDS = registry.histogram(
+    "ronin_snapshot_duration_seconds", "Time taken to snapshot a directory.", ("source",))
+SNAPSHOT_ENTRIES = registry.gauge(
+    "ronin_snapshot_entries", "Entries in the latest snapshot of a directory.", ("source",))
+ENTRIES_SCANNED = registry.counter(
+    "ronin_snapshot_entries_total", "Entries recorded by snapshots, a measure of the stat calls made.", ("source",))
+EVENTS_RECEIVED = registry.counter(
+    "ronin_events_received_total", "File system events or polled changes received.", ("source",))
+EVENTS_COALESCED = registry.counter(
+    "ronin_events_coalesced_total", "Events folded into the synchronization of an earlier event.", ("source",))
+QUEUE_DEPTH = registry.gauge(
+    "ronin_queue_depth", "Events or changes waiting to be synchronized.", ("source",))
+SYNC_SECONDS = registry.histogram(
+    "ronin_sync_duration_seconds", "Time taken by the strategy to synchronize.", ("source", "mode"))
+FILES_SYNCHRONIZED = registry.counter(
+    "ronin_files_synchronized_total", "Paths transferred by incremental synchronizations.", ("source",))
+SYNC_FAILURES = registry.counter(
+    "ronin_sync_failures_total", "Synchronizations that failed.", ("source",))
+SYNCS_SUPERSEDED = registry.counter(
+    "ronin_syncs_superseded_total", "Synchronizations cancelled because newer changes arrived.", ("source",))
+
+
+def observe_snapshot(source, snapshot, duration):
+    """
+    Record that a snapshot of a directory was taken.
+
+    :param source: the directory.
+    :param snapshot: the snapshot.
+    :param duration: how long it took, in seconds.
+    """
+    entries = len(snapshot)
+    SNAPSHOT_SECONDS.labels(source).observe(duration)
+    SNAPSHOT_ENTRIES.labels(source).set(entries)
+    ENTRIES_SCANNED.labels(source).inc(entries)
+
+
+def observe_sync(source, changes, duration, failed, cancelled, full_sync=None):
+    """
+    Record that the strategy synchronized a directory.
+
+    :param source: the source directory.
+    :param changes: the :class:`ChangeSet` that was synchronized, or `None`
+        for a synchronization of the entire directory.
+    :param duration: how long it took, in seconds.
+    :param failed: whether it failed.
+    :param cancelled: whether it was cancelled by newer changes.
+    :param full_sync: Optional. Whether the strategy synchronized the entire
+        directory, which it may do even when given changes. If `None`, a
+        synchronization without changes is taken to be a full one.
+    """
+    if cancelled:
+        SYNCS_SUPERSEDED.labels(source).inc()
+        return
+    if full_sync is None:
+        full_sync = changes is None
+    SYNC_SECONDS.labels(source, "full" if full_sync else "incremental").observe(duration)
+    if failed:
+        SYNC_FAILURES.labels(source).inc()
+    elif changes is not None and not full_sync:
+        FILES_SYNCHRONIZED.labels(source).inc(len(changes.updated_paths))
+
+
+def _create_server(host, port, registry):
+    try:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+    except ImportError:
+        from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", "{0}".format(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("Metrics request: " + format, *args)
+
+    return HTTPServer((host, port), MetricsRequestHandler)
+
+
+class MetricsServer(object):
+    """
+    Exposes the metrics over HTTP, in the Prometheus text format, from a
+    background thread.
+
+    :param port: the port to listen on.
+    :param host: Optional. The address to listen on. Default: `127.0.0.1`.
+    :param registry: Optional. The registry to expose.
+    """
+
+    def __init__(self, port, host="127.0.0.1", registry=registry):
+        self._server = _create_server(host, port, registry)
+        self._thread = None
+
+    @property
+    def port(self):
+        """
+        The port the server listens on.
+        """
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ronin-metrics")
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Serving metrics on port: {0}".format(self.port))
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsFileWriter(object):
+    """
+    Writes the metrics to a file, in the Prometheus text format, at a
+    regular interval, e.g. for the textfile collector of the node exporter.
+    The file is replaced atomically so that readers never see it partially
+    written.
+
+    :param path: the file to write.
+    :param interval: Optional. The interval between writes, in seconds.
+    :param registry: Optional. The registry to write.
+    """
+
+    def __init__(self, path, interval=DEFAULT_WRITE_INTERVAL, registry=registry):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self):
+        """
+        Write the metrics to the file now.
+        """
+        temporary = "{0}.{1}.tmp".format(self.path, os.getpid())
+        with open(temporary, "w") as f:
+            f.write(self.registry.render())
+        os.rename(temporary, self.path)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write()
+            except (IOError, OSError) as err:
+                logger.warning("Could not write metrics to: {0}: {1}".format(self.path, err))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ronin-metrics")
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Writing metrics to: {0}".format(self.path))
+
+    def stop(self):
+        self._stopped.set()
+        self.write()
+
+
+#: The exporters started by :func:`start_exporters`.
+_exporters = []
+
+
+def start_exporters(port=None, path=None, interval=DEFAULT_WRITE_INTERVAL):
+    """
+    Start exposing the metrics over HTTP, writing them to a file, or both.
+    Exporters are started only once per process.
+
+    :param port: Optional. The local port to serve the metrics on.
+    :param path: Optional. The file to write the metrics to.
+    :param interval: Optional. The interval between writes of the file.
+    """
+    if _exporters:
+        return
+    if port is not None:
+        _exporters.append(MetricsServer(port))
+    if path is not None:
+        _exporters.append(MetricsFileWriter(path, interval))
+    for exporter in _exporters:
+        exporter.start()
+
+
+def stop_exporters():
+    """
+    Stop the exporters started by :func:`start_exporters`, writing the
+    metrics file one last time.
+    """
+    while _exporters:
+        _exporters.pop().stop()
@@ -0,0 +1,305 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+:module: ronin.observers.hybrid
+:synopsis: Observer that relies on native events where they are reliable
+    and polls only the subtrees where they are not.
+
+Classes
+-------
+.. autoclass:: HybridObserver
+   :members:
+   :show-inheritance:
+"""
+
+from ronin.observers.polling import DiscriminatedPollingEmitter
+from watchdog.observers.api import (
+    BaseObserver,
+    ObservedWatch,
+    DEFAULT_OBSERVER_TIMEOUT
+)
+
+import copy
+import logging
+import os
+import re
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The mount tables that are consulted, in order, for the file system types.
+MOUNT_TABLES = ("/proc/self/mounts", "/proc/mounts", "/etc/mtab")
+
+#: The file system types on which file system events are not reliable,
+#: because the files may be changed by another system than the one being
+#: notified, e.g. network file systems and virtual machine shared folders.
+#: File systems in userspace (``fuse.*``) are polled as well.
+POLLED_FILE_SYSTEMS = frozenset([
+    "9p",
+    "afs",
+    "ceph",
+    "cifs",
+    "coda",
+    "fuse",
+    "glusterfs",
+    "lustre",
+    "ncpfs",
+    "nfs",
+    "nfs4",
+    "prl_fs",
+    "smb3",
+    "smbfs",
+    "vboxsf",
+    "virtiofs",
+    "vmhgfs"
+])
+
+#: Octal escapes, e.g. ``\040`` for a space, used in mount tables.
+_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def read_mounts(tables=MOUNT_TABLES):
+    """
+    Return the mount points of the system and their file system types, read
+    from the first mount table that exists, or an empty list if none does.
+
+    :param tables: Optional. The paths of the mount tables to try.
+    :returns: a list of `(mount_point, fstype)` tuples, in mount order.
+    """
+    for table in tables:
+        try:
+            with open(table) as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            continue
+
+        mounts = []
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            mount_point = _ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1])
+            mounts.append((mount_point, fields[2]))
+        return mounts
+    return []
+
+
+def requires_polling(fstype):
+    """
+    Return whether changes to a file system of the given type must be polled
+    for, because its events are not reliable.
+
+    :param fstype: the file system type, as it appears in the mount table.
+    """
+    return fstype in POLLED_FILE_SYSTEMS or fstype.startswith("fuse.")
+
+
+def is_within(path, directory):
+    """
+    Return whether the path is the directory itself or lies under it.
+
+    :param path: the absolute path.
+    :param directory: the absolute path of the directory.
+    """
+    directory = directory.rstrip(os.sep)
+    return path == directory or path.startswith(directory + os.sep)
+
+
+class Region(object):
+    """
+    A subtree of the source directory that is observed in one way, either
+    with native events or by polling.
+
+    :param path: the root directory of the region.
+    :param fstype: the type of the file system mounted at its root.
+    :param parent: Optional. The region that encloses this one.
+    """
+
+    def __init__(self, path, fstype, parent=None):
+        #: The root directory of the region.
+        self.path = path
+
+        #: The type of the file system mounted at its root.
+        self.fstype = fstype
+
+        #: Whether the region is polled rather than observed with events.
+        self.polled = requires_polling(fstype)
+
+        #: The regions nested directly within this one, which it excludes.
+        self.children = []
+
+        if parent is not None:
+            parent.children.append(self)
+
+    def __repr__(self):
+        return "<Region(path='{0}', fstype='{1}', polled={2})>".format(self.path, self.fstype, self.polled)
+
+
+def partition(path, mounts=None):
+    """
+    Divide a directory into the regions that are observed with native events
+    and those that are polled, from the file systems mounted under it.
+
+    A region only begins where a file system is mounted whose events differ
+    in reliability from those of the enclosing region, so a local file
+    system mounted within another local one does not begin a new region.
+
+    :param path: the absolute path of the directory.
+    :param mounts: Optional. The `(mount_point, fstype)` tuples of the
+        system. Default: those read by :func:`read_mounts`.
+    :returns: a list of :class:`Region`, the first of which is rooted at
+        `path`.
+    """
+    if mounts is None:
+        mounts = read_mounts()
+
+    real_path = os.path.realpath(path)
+
+    #: Mounted later on the same mount point shadows what was mounted before.
+    fstypes = {}
+    for mount_point, fstype in mounts:
+        fstypes[os.path.normpath(mount_point)] = fstype
+
+    #: The file system that the directory itself is on.
+    enclosing = [m for m in fstypes if is_within(real_path, m)]
+    root_fstype = fstypes[max(enclosing, key=len)] if enclosing else "unknown"
+    regions = [Region(path, root_fstype)]
+
+    nested = sorted((m for m in fstypes if m != real_path and is_within(m, real_path)), key=len)
+    for mount_point in nested:
+        region_path = os.path.join(path, os.path.relpath(mount_point, real_path))
+        parent = [r for r in regions if is_within(region_path, r.path)]
+        parent = max(parent, key=lambda r: len(r.path))
+        if requires_polling(fstypes[mount_point]) != parent.polled:
+            regions.append(Region(region_path, fstypes[mount_point], parent))
+    return regions
+
+
+class ExcludingEmitterMixin(object):
+    """
+    Drops the events of an emitter that concern paths within any of its
+    :attr:`exclude_paths`, which are observed by other emitters.
+    """
+
+    #: The directories whose events are dropped.
+    exclude_paths = ()
+
+    def queue_event(self, event):
+        for excluded in self.exclude_paths:
+            if is_within(event.src_path, excluded):
+                return
+        super(ExcludingEmitterMixin, self).queue_event(event)
+
+
+class HybridObserver(BaseObserver):
+    """
+    Observer that uses the native events of the platform, e.g. inotify, for
+    the parts of a directory on local file systems, and polls only the
+    subtrees on file systems where events are not reliable, such as network
+    file systems and shared folders.
+
+    The file system type is detected per mount point under each scheduled
+    directory. If the mount table cannot be read, the directory is observed
+    with native events alone.
+
+    :param timeout: Optional. The timeout of the emitters, in seconds.
+    :param mounts: Optional. The `(mount_point, fstype)` tuples of the
+        system. Default: those read by :func:`read_mounts` when a directory
+        is scheduled.
+    """
+
+    def __init__(self, timeout=DEFAULT_OBSERVER_TIMEOUT, mounts=None):
+        from watchdog.observers import Observer
+        BaseObserver.__init__(self, emitter_class=Observer()._emitter_class, timeout=timeout)
+
+        #: The emitter class of the platform, excluding polled subtrees.
+        self._native_emitter_class = type("Excluding" + self._emitter_class.__name__,
+                                          (ExcludingEmitterMixin, self._emitter_class), {})
+
+        #: The mount points and file system types, if they were given.
+        self._mounts = mounts
+
+    def schedule(self, event_handler, path, recursive=False, initial_snapshot=None, poll_interval=None, **kwargs):
+        """
+        Schedules watching a path and calls appropriate methods specified
+        in the given event handler in response to file system events.
+
+        :param event_handler:
+            An event handler instance that has appropriate event handling
+            methods which will be called by the observer in response to
+            file system events.
+        :type event_handler:
+            :class:`watchdog.events.FileSystemEventHandler` or a subclass
+        :param path:
+            Directory path that will be monitored.
+        :type path:
+            ``str``
+        :param recursive:
+            ``True`` if events will be emitted for sub-directories
+            traversed recursively; ``False`` otherwise.
+        :type recursive:
+            ``bool``
+        :param initial_snapshot:
+            The snapshot of the whole directory that polling should start
+            from. It is only used if the whole directory is polled.
+        :param poll_interval:
+            The scheduler of polling intervals; each polled region gets a
+            copy of its own.
+        :param kwargs:
+            Additional keyword arguments passed to the polling emitters,
+            e.g. ``walker`` or ``matcher``.
+        :return:
+            An :class:`ObservedWatch` object instance representing
+            the watch of `path`.
+        """
+        regions = partition(path, self._mounts)
+        with self._lock:
+            for region in regions:
+                watch = ObservedWatch(region.path, recursive)
+                self._add_handler_for_watch(event_handler, watch)
+                if self._emitter_for_watch.get(watch) is not None:
+                    continue
+
+                exclude_paths = [child.path for child in region.children]
+                if region.polled:
+                    logger.info("Polling for changes in: '{0}' ({1})".format(region.path, region.fstype))
+                    emitter = DiscriminatedPollingEmitter(
+                        event_queue=self.event_queue, watch=watch, timeout=self.timeout,
+                        exclude_paths=exclude_paths or None,
+                        initial_snapshot=initial_snapshot if len(regions) == 1 else None,
+                        poll_interval=copy.copy(poll_interval), **kwargs)
+                else:
+                    logger.info("Observing events in: '{0}' ({1})".format(region.path, region.fstype))
+                    emitter = self._native_emitter_class(event_queue=self.event_queue, watch=watch,
+                                                         timeout=self.timeout)
+                    emitter.exclude_paths = exclude_paths
+                self._add_emitter(emitter)
+                if self.is_alive():
+                    emitter.start()
+                self._watches.add(watch)
+        return ObservedWatch(regions[0].path, recursive)
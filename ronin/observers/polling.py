@@ -38,7 +38,8 @@ Classes
 """
 
 from watchdog.utils import stat as default_stat
-from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+from ronin import metrics
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot, DEFAULT_WALKER_THREADS
 from watchdog.utils.dirsnapshot import DirectorySnapshotDiff
 from watchdog.observers.api import (
     BaseObserver,
@@ -47,8 +48,19 @@ from watchdog.observers.api import (
     DEFAULT_EMITTER_TIMEOUT
 )
 from watchdog.observers.polling import PollingEmitter
+from watchdog.events import (
+    DirMovedEvent,
+    DirDeletedEvent,
+    DirCreatedEvent,
+    DirModifiedEvent,
+    FileMovedEvent,
+    FileDeletedEvent,
+    FileCreatedEvent,
+    FileModifiedEvent
+)
 import logging
 import os
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -57,17 +69,139 @@ class DiscriminatedPollingEmitter(PollingEmitter):
     """
     Platform-independent emitter that polls a directory to detect file
     system changes.
+
+    If ``incremental_scan`` is set, each poll takes its snapshot from the
+    previous one, relisting only the directories whose modification time
+    changed. The files of unchanged directories are then stat'ed only on
+    every ``file_stat_interval``-th poll.
+
+    If a ``poll_interval`` scheduler such as :class:`AdaptivePollInterval` is
+    given, it decides how long to wait before each poll instead of the fixed
+    ``timeout``.
+
+    If an ``initial_snapshot`` is given, changes are detected relative to it
+    instead of a snapshot taken when the emitter starts. Snapshots are
+    instances of ``snapshot_class``, e.g. :class:`CompactDirectorySnapshot`
+    for very large trees.
+
+    If a ``profiler`` such as :class:`CycleProfiler` is given, each poll's
+    snapshot and diff are profiled.
     """
 
     def __init__(self, event_queue, watch,
                  exclude_paths=None,
                  timeout=DEFAULT_EMITTER_TIMEOUT,
                  stat=default_stat,
-                 listdir=os.listdir):
+                 listdir=os.listdir,
+                 walker=None,
+                 incremental_scan=False,
+                 file_stat_interval=1,
+                 matcher=None,
+                 initial_snapshot=None,
+                 snapshot_class=DiscriminatedDirectorySnapshot,
+                 walker_threads=DEFAULT_WALKER_THREADS,
+                 poll_interval=None,
+                 profiler=None):
         PollingEmitter.__init__(self, event_queue, watch, timeout, stat, listdir)
         self._exclude_paths = exclude_paths
-        self._take_snapshot = lambda: DiscriminatedDirectorySnapshot(
-            self.watch.path, self.watch.is_recursive, ignore_paths=self._exclude_paths, stat=stat, listdir=listdir)
+        self._initial_snapshot = initial_snapshot
+        self._poll_interval = poll_interval
+        self._profiler = profiler
+        self._matcher = matcher
+        self._file_stat_interval = max(file_stat_interval or 1, 1)
+        self._poll_count = 0
+        self._take_snapshot = lambda previous=None: snapshot_class(
+            self.watch.path, self.watch.is_recursive, ignore_paths=self._exclude_paths, stat=stat, listdir=listdir,
+            walker=walker, workers=walker_threads, incremental=incremental_scan, previous=previous, matcher=self._matcher,
+            restat_files=self._poll_count % self._file_stat_interval == 0)
+
+    def on_thread_start(self):
+        # Start from the snapshot handed in, if any, rather than walking the
+        # directory again.
+        if self._initial_snapshot is not None:
+            self._snapshot = self._initial_snapshot
+            self._initial_snapshot = None
+        else:
+            started = time.time()
+            self._snapshot = self._take_snapshot()
+            metrics.observe_snapshot(self.watch.path, self._snapshot, time.time() - started)
+
+    def queue_events(self, timeout):
+        # We don't want to hit the disk continuously.
+        # timeout behaves like an interval for polling emitters.
+        if self._poll_interval is not None:
+            timeout = self._poll_interval.interval
+        if self.stopped_event.wait(timeout):
+            return
+
+        with self._lock:
+            if not self.should_keep_running():
+                return
+
+            # Get event diff between fresh snapshot and previous snapshot.
+            # Update snapshot.
+            started = time.time()
+            self._poll_count += 1
+            if self._profiler is None:
+                diff = self._scan()
+            else:
+                diff = self._profiler.run("poll", self.watch.path, self._scan)
+            changed = self.queue_diff(diff, started)
+
+            if self._poll_interval is not None:
+                interval = self._poll_interval.update(changed, time.time() - started)
+                logger.debug("Next poll of {0} in {1:.3f}s".format(self.watch.path, interval))
+
+    def _scan(self):
+        started = time.time()
+        new_snapshot = self._take_snapshot(self._snapshot)
+        metrics.observe_snapshot(self.watch.path, new_snapshot, time.time() - started)
+        diff = new_snapshot - self._snapshot
+        self._snapshot = new_snapshot
+        return diff
+
+    def queue_diff(self, diff, seen=None):
+        """
+        Queue the file system events described by a snapshot diff.
+
+        :param diff:
+            The :class:`DirectorySnapshotDiff` (or compatible) instance.
+        :param seen:
+            The time at which the changes were seen, recorded on each event
+            as its ``seen`` attribute.
+        :return:
+            ``True`` if any event was queued; ``False`` otherwise.
+        """
+        changed = bool(diff.files_deleted or diff.files_modified or diff.files_created or
+                       diff.files_moved or diff.dirs_deleted or diff.dirs_modified or
+                       diff.dirs_created or diff.dirs_moved)
+        if not changed:
+            return False
+
+        def queue(event):
+            event.seen = seen
+            self.queue_event(event)
+
+        # Files.
+        for src_path in diff.files_deleted:
+            queue(FileDeletedEvent(src_path))
+        for src_path in diff.files_modified:
+            queue(FileModifiedEvent(src_path))
+        for src_path in diff.files_created:
+            queue(FileCreatedEvent(src_path))
+        for src_path, dest_path in diff.files_moved:
+            queue(FileMovedEvent(src_path, dest_path))
+
+        # Directories.
+        for src_path in diff.dirs_deleted:
+            queue(DirDeletedEvent(src_path))
+        for src_path in diff.dirs_modified:
+            queue(DirModifiedEvent(src_path))
+        for src_path in diff.dirs_created:
+            queue(DirCreatedEvent(src_path))
+        for src_path, dest_path in diff.dirs_moved:
+            queue(DirMovedEvent(src_path, dest_path))
+        return True
 
 
 class DiscriminatedPollingObserver(BaseObserver):
@@ -79,7 +213,7 @@ class DiscriminatedPollingObserver(BaseObserver):
     def __init__(self, timeout=DEFAULT_OBSERVER_TIMEOUT):
         BaseObserver.__init__(self, emitter_class=DiscriminatedPollingEmitter, timeout=timeout)
 
-    def schedule(self, event_handler, path, exclude_paths=None, recursive=False):
+    def schedule(self, event_handler, path, exclude_paths=None, recursive=False, **kwargs):
         """
         Schedules watching a path and calls appropriate methods specified
         in the given event handler in response to file system events.
@@ -103,6 +237,9 @@ class DiscriminatedPollingObserver(BaseObserver):
             traversed recursively; ``False`` otherwise.
         :type recursive:
             ``bool``
+        :param kwargs:
+            Additional keyword arguments passed to the emitter, e.g.
+            ``walker`` or ``matcher``.
         :return:
             An :class:`ObservedWatch` object instance representing
             a watch.
@@ -113,13 +250,14 @@ class DiscriminatedPollingObserver(BaseObserver):
 
             # If we don't have an emitter for this watch already, create it.
             if self._emitter_for_watch.get(watch) is None:
-                kwargs = {"event_queue": self.event_queue,
-                          "watch": watch,
-                          "timeout": self.timeout}
+                emitter_kwargs = {"event_queue": self.event_queue,
+                                  "watch": watch,
+                                  "timeout": self.timeout}
                 if issubclass(self._emitter_class, DiscriminatedPollingEmitter):
-                    kwargs["exclude_paths"] = exclude_paths
-                    logger.debug(kwargs)
-                emitter = self._emitter_class(**kwargs)
+                    emitter_kwargs.update(kwargs)
+                    emitter_kwargs["exclude_paths"] = exclude_paths
+                    logger.debug(emitter_kwargs)
+                emitter = self._emitter_class(**emitter_kwargs)
                 self._add_emitter(emitter)
                 if self.is_alive():
                     emitter.start()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:module: ronin.observers.scheduling
+:synopsis: Scheduling of polling intervals.
+
+Classes
+-------
+.. autoclass:: AdaptivePollInterval
+   :members:
+   :show-inheritance:
+"""
+
+#: The default shortest interval between polls, in seconds.
+DEFAULT_MIN_INTERVAL = 0.25
+
+#: The default longest interval between polls, in seconds.
+DEFAULT_MAX_INTERVAL = 5.0
+
+#: The default largest fraction of wall time spent scanning.
+DEFAULT_DUTY_CYCLE = 0.1
+
+
+class AdaptivePollInterval(object):
+    """
+    Chooses the interval before the next poll from the outcome of the last
+    one.
+
+    After a poll that found changes the interval drops to ``minimum``, so
+    that follow-up changes during active editing are picked up quickly.
+    Each poll that finds nothing multiplies the interval by ``backoff``, up
+    to ``maximum``. Regardless of either, the interval is never shorter
+    than what keeps the time spent scanning below ``duty_cycle`` of wall
+    time, given how long the last scan took; on a tree that takes a second
+    to scan and a duty cycle of 0.1, polls are at least nine seconds apart.
+
+    :param minimum: Optional. The shortest interval, in seconds.
+    :param maximum: Optional. The longest interval while idle, in seconds.
+    :param duty_cycle: Optional. The largest fraction of wall time that may
+        be spent scanning, between 0 and 1.
+    :param backoff: Optional. The factor the interval grows by after each
+        idle poll. Default: `2`.
+    """
+
+    def __init__(self, minimum=None, maximum=None, duty_cycle=None, backoff=2.0):
+        #: The shortest interval, in seconds.
+        self.minimum = DEFAULT_MIN_INTERVAL if minimum is None else minimum
+
+        #: The longest interval while idle, in seconds.
+        self.maximum = max(DEFAULT_MAX_INTERVAL if maximum is None else maximum, self.minimum)
+
+        #: The largest fraction of wall time that may be spent scanning.
+        self.duty_cycle = DEFAULT_DUTY_CYCLE if duty_cycle is None else duty_cycle
+
+        #: The factor the interval grows by after each idle poll.
+        self.backoff = backoff
+
+        #: The interval before the next poll, in seconds.
+        self.interval = self.minimum
+
+    def __repr__(self):
+        return "<AdaptivePollInterval(minimum={0}, maximum={1}, duty_cycle={2})>".format(
+            self.minimum, self.maximum, self.duty_cycle)
+
+    def update(self, changed, scan_duration):
+        """
+        Record the outcome of a poll and return the interval before the next
+        one.
+
+        :param changed: whether the poll found any changes.
+        :param scan_duration: how long the poll took, in seconds.
+        """
+        if changed:
+            interval = self.minimum
+        else:
+            interval = min(self.interval * self.backoff, self.maximum)
+        if 0 < self.duty_cycle < 1:
+            interval = max(interval, scan_duration * (1 - self.duty_cycle) / self.duty_cycle)
+        self.interval = interval
+        return interval
@@ -0,0 +1,143 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import logging
+import os
+import re
+import threading
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The default duration, in milliseconds, above which a cycle's profile is
+#: kept.
+DEFAULT_THRESHOLD_MS = 1000
+
+#: The number of functions listed in the text summary of each profile.
+SUMMARY_LINES = 40
+
+#: Characters that are replaced in the names of profile files.
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class CycleProfiler(object):
+    """
+    Profiles the cycles of the watch loop, such as a poll (snapshot and
+    diff) or a synchronization, with :mod:`cProfile`, and keeps the profiles
+    of those that take longer than a threshold.
+
+    Each kept profile is written to the directory twice: as a `.prof` file
+    that can be loaded with :mod:`pstats` or a viewer such as snakeviz, and
+    as a `.txt` summary of the functions with the most cumulative time.
+    Time spent waiting for a subprocess, such as rsync, shows up in the
+    functions that wait for it. Work done on other threads, e.g. by a
+    threaded walker, is not profiled; the waits for it are.
+
+    Profiling is only set up if a profiler is configured; call sites check
+    for one first, so there is no overhead otherwise.
+
+    :param directory: the directory that profiles are written to; it is
+        created if necessary.
+    :param threshold_ms: Optional. The duration, in milliseconds, above
+        which a cycle's profile is kept. Default: `1000`.
+    """
+
+    def __init__(self, directory, threshold_ms=DEFAULT_THRESHOLD_MS):
+        #: The directory that profiles are written to.
+        self.directory = directory
+
+        #: The duration, in seconds, above which a cycle's profile is kept.
+        self.threshold = threshold_ms / 1000.0
+
+        #: The number of profiles that were kept.
+        self.kept = 0
+
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def run(self, kind, source, function, *args, **kwargs):
+        """
+        Call a function as one profiled cycle and return its result.
+
+        :param kind: the kind of cycle, e.g. "poll" or "sync".
+        :param source: the source directory the cycle is for.
+        :param function: the function to call with the remaining arguments.
+        """
+        import cProfile
+        profile = cProfile.Profile()
+        started = time.time()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active, e.g. for a concurrent cycle on
+            # Python versions that allow only one at a time.
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            duration = time.time() - started
+            if duration >= self.threshold:
+                try:
+                    self.dump(profile, kind, source, duration)
+                except (IOError, OSError) as err:
+                    logger.warning("Could not write profile to: {0}: {1}".format(self.directory, err))
+
+    def dump(self, profile, kind, source, duration):
+        """
+        Write a cycle's profile and its summary to the directory.
+
+        :param profile: the :class:`cProfile.Profile`.
+        :param kind: the kind of cycle.
+        :param source: the source directory the cycle was for.
+        :param duration: how long the cycle took, in seconds.
+        :return: the path of the `.prof` file.
+        """
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self.kept += 1
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+
+        name = "{0}-{1}-{2}-{3}-{4}ms".format(
+            time.strftime("%Y%m%d%H%M%S"), sequence, kind,
+            _UNSAFE.sub("_", source.strip(os.sep)) or "root", int(duration * 1000))
+        path = os.path.join(self.directory, name + ".prof")
+        import pstats
+        profile.dump_stats(path)
+        with open(os.path.join(self.directory, name + ".txt"), "w") as f:
+            f.write("{0} of {1} took {2:.3f}s\n\n".format(kind, source, duration))
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        logger.info("Slow {0} of {1} took {2:.3f}s, profile written to: {3}".format(kind, source, duration, path))
+        return path
@@ -24,8 +24,13 @@
 # OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from ronin.utils.matcher import ExclusionMatcher
+from stat import S_ISDIR
 import logging
 import os
+import subprocess
+import threading
+import time
 
 #: The logging apparatus.
 logger = logging.getLogger(__name__)
@@ -48,11 +53,36 @@ class FileSyncStrategy(object):
         #: The target directory that this sync handler will copy files to.
         self.target = os.path.abspath(os.path.expanduser(target))
 
+        #: The time at which the last completed full synchronization was
+        #: started, or `None` if no full synchronization has completed yet.
+        self.last_full_sync = None
+
+        #: Whether the last synchronization that was started synchronized
+        #: the entire source directory.
+        self.full_sync = False
+
+        #: Whether the synchronization in progress has been cancelled.
+        self.cancelled = False
+
+        self._exclude_matcher = None
+        self._lock = threading.Lock()
+        self._processes = set()
+
+    @property
+    def exclude_matcher(self):
+        """
+        The compiled :class:`ExclusionMatcher` for the manifest's exclusions,
+        anchored at the source directory.
+        """
+        if self._exclude_matcher is None:
+            self._exclude_matcher = ExclusionMatcher(self.manifest.exclude, self.source)
+        return self._exclude_matcher
+
     @property
     def exclude_paths(self):
         exclude_paths = list()
-        for exclusion in self.manifest.exclude:
-            path = os.path.abspath(os.path.join(".", exclusion))
+        for exclusion in self.manifest.exclude or ():
+            path = os.path.abspath(os.path.join(self.source, exclusion))
             exclude_paths.append(path)
         return exclude_paths
 
@@ -65,13 +95,246 @@ class FileSyncStrategy(object):
                 exclude_paths.append(pattern)
         return exclude_paths
 
-    def invoke(self):
+    def invoke(self, changes=None):
         """
         Handle file synchronization based on the instructions in the
         manifest from the source directory to the target directory.
+
+        :param changes: Optional. The :class:`ChangeSet` describing the
+            paths that changed since the last synchronization. If omitted,
+            the entire source directory is synchronized.
         """
         raise NotImplementedError()
 
+    def cancel(self):
+        """
+        Cancel the synchronization in progress, terminating the processes
+        that it started. Once cancelled, no further processes are started
+        until :attr:`cancelled` is cleared.
+        """
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+
+    def close(self):
+        """
+        Release the resources the strategy holds between synchronizations.
+        """
+        pass
+
+    def start_process(self, command, **kwargs):
+        """
+        Start a process on behalf of the synchronization in progress, so that
+        it is terminated if the synchronization is cancelled.
+
+        :param command: the command to run.
+        :param kwargs: the keyword arguments for :class:`subprocess.Popen`.
+        :return: the process, or `None` if the synchronization has been
+            cancelled.
+        """
+        with self._lock:
+            if self.cancelled:
+                return None
+            process = subprocess.Popen(command, **kwargs)
+            self._processes.add(process)
+            return process
+
+    def release_process(self, process):
+        """
+        Wait for a process started by :meth:`start_process` to exit and
+        return its exit status.
+        """
+        try:
+            return process.wait()
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+    def run_process(self, command, input=None, **kwargs):
+        """
+        Run a process on behalf of the synchronization in progress and wait
+        for it to exit.
+
+        :param command: the command to run.
+        :param input: Optional. The bytes written to the standard input of
+            the process.
+        :param kwargs: the keyword arguments for :class:`subprocess.Popen`.
+        :return: the exit status of the process, or `None` if the
+            synchronization has been cancelled.
+        """
+        if input is not None:
+            kwargs["stdin"] = subprocess.PIPE
+        process = self.start_process(command, **kwargs)
+        if process is None:
+            return None
+        try:
+            process.communicate(input)
+        finally:
+            self.release_process(process)
+        return process.returncode
+
+    def is_incremental(self, changes):
+        """
+        Return whether the given changes may be synchronized incrementally,
+        or whether a full synchronization of the source directory should be
+        performed instead.
+
+        A full synchronization is always performed the first time the
+        strategy is invoked and, as a safety net, whenever more than
+        `full_sync_interval_ms` has elapsed since the last one.
+
+        :param changes: the :class:`ChangeSet` to synchronize, or `None`.
+        """
+        manifest = self.manifest
+        if changes is None or not manifest.incremental:
+            return False
+        if self.last_full_sync is None:
+            return False
+        interval = manifest.full_sync_interval_ms
+        if interval and (time.time() - self.last_full_sync) * 1000 >= interval:
+            logger.debug("Last full synchronization is stale, performing a full synchronization.")
+            return False
+        return True
+
+    def apply_moves(self, changes):
+        """
+        Apply the moves in the change set as renames at the destination, so
+        that a moved file or directory is not transferred again. Entries
+        moved along with a directory are covered by the directory's rename.
+        Moves are renamed so that an entry is moved away before another
+        takes its place; entries that traded places are copied instead.
+
+        :param changes: the :class:`ChangeSet` to synchronize.
+        :return: the change set without the moves that were applied; moves
+            that could not be applied remain, to be copied instead.
+        """
+        if not changes.moved:
+            return changes
+        matcher = self.exclude_matcher
+        remaining = changes.copy()
+        renamed = []
+        for src_path, dest_path in changes.ordered_moves()[0]:
+            is_directory = dest_path in changes.directories
+            relative_dest, relative_src = self.relative_path(dest_path), self.relative_path(src_path)
+            if relative_dest is None or relative_src is None:
+                continue
+            if matcher.match(dest_path, is_directory) or matcher.match(src_path, is_directory):
+                continue
+            if any(relative_src.startswith(src + os.sep) and relative_dest == dest + relative_src[len(src):]
+                   for src, dest in renamed):
+                del remaining.moved[dest_path]
+                continue
+            if self.rename(os.path.join(self.target, relative_src), os.path.join(self.target, relative_dest)):
+                del remaining.moved[dest_path]
+                if is_directory:
+                    renamed.append((relative_src, relative_dest))
+        applied = len(changes.moved) - len(remaining.moved)
+        if applied:
+            logger.debug("Applied {0} move(s) as renames at the destination".format(applied))
+        return remaining
+
+    def rename(self, src, dest):
+        """
+        Rename a path at the destination.
+
+        :param src: the current path at the destination.
+        :param dest: the new path at the destination.
+        :return: whether the path was renamed.
+        """
+        if not os.path.lexists(src):
+            return False
+        parent = os.path.dirname(dest)
+        try:
+            if self.manifest.elevate:
+                # `mv` moves into, rather than onto, an existing directory.
+                if os.path.isdir(dest):
+                    return False
+                return (self.run_process(["sudo", "mkdir", "-p", "--", parent]) == 0 and
+                        self.run_process(["sudo", "mv", "-f", "--", src, dest]) == 0)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            os.rename(src, dest)
+        except OSError as e:
+            logger.debug("Unable to rename '{0}' to '{1}', copying instead: {2}".format(src, dest, e))
+            return False
+        return True
+
+    def removed_paths(self, changes):
+        """
+        Return the removed paths of the change set that lie within the
+        source directory and are not excluded.
+
+        :param changes: the :class:`ChangeSet` to synchronize.
+        """
+        matcher = self.exclude_matcher
+        return [path for path in changes.removed_paths
+                if self.relative_path(path) is not None and not matcher.match(path, path in changes.directories)]
+
+    def updated_entries(self, changes):
+        """
+        Return ``(path, stat_info)`` pairs for the updated paths of the
+        change set that still exist and are not excluded, including the
+        contents of updated directories.
+
+        :param changes: the :class:`ChangeSet` to synchronize.
+        """
+        from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+        matcher = self.exclude_matcher
+        entries = []
+        for path in changes.updated_paths:
+            if self.relative_path(path) is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Removed again since the change was recorded.
+                continue
+            if matcher.match(path, S_ISDIR(st.st_mode)):
+                continue
+            if S_ISDIR(st.st_mode):
+                entries.extend(DiscriminatedDirectorySnapshot(path, matcher=matcher).entries())
+            else:
+                entries.append((path, st))
+        return entries
+
+    def extraneous_paths(self, snapshot):
+        """
+        Yield the paths in the destination directory that are not in the
+        source snapshot, leaving excluded paths alone. Only the topmost path
+        of an extraneous directory is yielded, not its contents.
+
+        :param snapshot: the snapshot of the source directory.
+        """
+        if not os.path.isdir(self.target):
+            return
+        from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+        target = os.path.join(self.target, "")
+        matcher = ExclusionMatcher(self.manifest.exclude, target)
+        source_paths = snapshot.paths
+        extraneous = None
+        for path, st in sorted(DiscriminatedDirectorySnapshot(target, matcher=matcher).entries()):
+            if path == target or (extraneous and path.startswith(extraneous)):
+                continue
+            if os.path.join(self.source, path[len(target):]) not in source_paths:
+                extraneous = os.path.join(path, "")
+                yield path
+
+    def relative_path(self, path):
+        """
+        Return the path relative to the source directory, or `None` if the
+        path is the source directory itself or lies outside of it.
+
+        :param path: the absolute path.
+        """
+        if not path.startswith(self.source):
+            return None
+        return path[len(self.source):] or None
+
 
 class StrategyFactory(object):
     """
@@ -93,5 +356,14 @@ class StrategyFactory(object):
         if strategy_type == "rsync":
             from .rsync import RsyncStrategy
             return RsyncStrategy(source, path, manifest)
+        elif strategy_type == "native":
+            from .native import NativeStrategy
+            return NativeStrategy(source, path, manifest)
+        elif strategy_type == "link":
+            from .link import LinkStrategy
+            return LinkStrategy(source, path, manifest)
+        elif strategy_type == "tarstream":
+            from .tarstream import TarStreamStrategy
+            return TarStreamStrategy(source, path, manifest)
         else:
             raise ValueError("Unknown type: {0}".format(strategy_type))
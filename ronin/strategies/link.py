@@ -0,0 +1,139 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from .native import NativeStrategy
+import errno
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The Linux ioctl request that makes a file share the extents of another
+#: (``FICLONE``), supported by btrfs, XFS and other copy-on-write file
+#: systems.
+FICLONE = 0x40049409
+
+#: The errors that indicate that the file system cannot clone files.
+_UNSUPPORTED_ERRNOS = set(getattr(errno, name) for name in ("ENOTTY", "EXDEV", "EINVAL", "ENOTSUP", "EOPNOTSUPP",
+                                                            "ENOSYS")
+                          if hasattr(errno, name))
+
+
+class LinkStrategy(NativeStrategy):
+    """
+    Synchronizes files without copying their contents when the destination
+    is on the same file system as the source.
+
+    Whether both share a file system is decided from ``st_dev`` before each
+    synchronization. If they do, files are cloned with a ``FICLONE`` reflink
+    where the file system supports it (e.g. btrfs or XFS), so that source and
+    destination share their data until either is modified. If the manifest's
+    `hardlink` option is set, files are hard linked instead; note that a
+    hard linked destination file *is* the source file, so changes made to it
+    in place show up on both sides immediately.
+
+    Whenever neither is possible, files are copied as by the "native"
+    strategy.
+    """
+
+    def __init__(self, source, target, manifest):
+        super(LinkStrategy, self).__init__(source, target, manifest)
+
+        #: Whether the source and destination are on the same file system.
+        self.same_device = False
+
+        #: Whether the file system may support reflinks; cleared the first
+        #: time a clone is refused.
+        self.reflink = fcntl is not None
+
+    def invoke(self, changes=None):
+        self.same_device = self.is_same_device()
+        if not self.same_device:
+            logger.debug("'{0}' and '{1}' are on different file systems, copying files.".format(self.source,
+                                                                                                self.target))
+        return super(LinkStrategy, self).invoke(changes)
+
+    def is_same_device(self):
+        """
+        Return whether the destination directory, or its nearest existing
+        ancestor, is on the same device as the source directory.
+        """
+        target = self.target
+        while not os.path.exists(target):
+            parent = os.path.dirname(target)
+            if parent == target:
+                return False
+            target = parent
+        try:
+            return os.stat(self.source).st_dev == os.stat(target).st_dev
+        except OSError:
+            return False
+
+    def copy_file(self, path, st):
+        """
+        Hard link a source file into the destination if the manifest asks for
+        it and both are on the same file system, otherwise clone or copy it.
+        """
+        if not (self.same_device and self.manifest.hardlink):
+            return super(LinkStrategy, self).copy_file(path, st)
+
+        target_path = self.target_path(path)
+        try:
+            target_st = os.lstat(target_path)
+            if target_st.st_ino == st.st_ino and target_st.st_dev == st.st_dev:
+                return
+        except OSError:
+            pass
+        temporary = self.temporary_path(target_path)
+        os.link(path, temporary)
+        try:
+            os.rename(temporary, target_path)
+        except OSError:
+            os.unlink(temporary)
+            raise
+
+    def copy_contents(self, fd_in, fd_out, st):
+        """
+        Clone the contents of the source file if possible, otherwise copy
+        them.
+        """
+        if self.same_device and self.reflink:
+            try:
+                fcntl.ioctl(fd_out, FICLONE, fd_in)
+                return
+            except (IOError, OSError) as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                logger.debug("Reflinks are not supported for '{0}': {1}".format(self.target, e))
+                self.reflink = False
+        super(LinkStrategy, self).copy_contents(fd_in, fd_out, st)
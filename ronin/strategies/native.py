@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from . import FileSyncStrategy
+from multiprocessing.pool import ThreadPool
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+from stat import S_IMODE, S_ISDIR
+import errno
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The default number of files copied in parallel.
+DEFAULT_WORKERS = 8
+
+#: The number of files handed to a thread at a time. Batches no larger than
+#: this are copied on the calling thread, without starting the pool.
+POOL_CHUNK_SIZE = 16
+
+#: Whether :func:`os.utime` accepts times in nanoseconds.
+_UTIME_NS = sys.version_info >= (3, 3)
+
+#: The largest number of bytes handed to the kernel in one copy call.
+COPY_CHUNK_SIZE = 8388608
+
+#: The largest difference between two modification times, in seconds, that
+#: are considered the same when they are not known to the nanosecond, in
+#: which case they are only copied to about a microsecond.
+MTIME_TOLERANCE = 0.000002
+
+
+def _copy_file_range(fd_in, fd_out, size):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(fd_in, fd_out, min(size - offset, COPY_CHUNK_SIZE))
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def _sendfile(fd_in, fd_out, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(fd_out, fd_in, offset, min(size - offset, COPY_CHUNK_SIZE))
+        if sent == 0:
+            break
+        offset += sent
+    # Sending from an offset leaves the file position alone; move it past
+    # what was sent, so that anything the file has grown by is read next.
+    os.lseek(fd_in, offset, os.SEEK_SET)
+    return offset
+
+
+def _read_write(fd_in, fd_out, size):
+    copied = 0
+    while True:
+        data = os.read(fd_in, 1048576)
+        if not data:
+            break
+        while data:
+            written = os.write(fd_out, data)
+            data = data[written:]
+            copied += written
+    return copied
+
+
+#: The ways of copying file contents, fastest first. A method that the
+#: platform or file system turns out not to support is dropped for the rest
+#: of the process.
+_copy_methods = [method for name, method in (("copy_file_range", _copy_file_range),
+                                             ("sendfile", _sendfile))
+                 if hasattr(os, name)]
+_copy_methods_lock = threading.Lock()
+
+#: The errors that indicate a copy method is not supported, rather than that
+#: the copy failed.
+_UNSUPPORTED_ERRNOS = set(getattr(errno, name) for name in ("ENOSYS", "EXDEV", "EINVAL", "ENOTSUP", "EOPNOTSUPP")
+                          if hasattr(errno, name))
+
+
+def same_modification_time(st, other_st):
+    """
+    Return whether two stat results have the same modification time, to the
+    nanosecond where both know it.
+    """
+    if hasattr(st, "st_mtime_ns") and hasattr(other_st, "st_mtime_ns"):
+        return st.st_mtime_ns == other_st.st_mtime_ns
+    return abs(st.st_mtime - other_st.st_mtime) <= MTIME_TOLERANCE
+
+
+def copy_data(fd_in, fd_out, size):
+    """
+    Copy the contents of one open file to another, using zero-copy kernel
+    calls (``copy_file_range``, then ``sendfile``) where the platform
+    supports them and falling back to reading and writing.
+
+    :param fd_in: the file descriptor to copy from, positioned at the start.
+    :param fd_out: the file descriptor to copy to, positioned at the start.
+    :param size: the number of bytes expected to be copied.
+    """
+    for method in list(_copy_methods):
+        try:
+            copied = method(fd_in, fd_out, size)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            with _copy_methods_lock:
+                if method in _copy_methods:
+                    _copy_methods.remove(method)
+            logger.debug("Copy method {0} is not supported: {1}".format(method.__name__, e))
+            os.lseek(fd_in, 0, os.SEEK_SET)
+            os.lseek(fd_out, 0, os.SEEK_SET)
+            os.ftruncate(fd_out, 0)
+            continue
+        # The file may have grown since it was stat'ed.
+        return copied + _read_write(fd_in, fd_out, size)
+    return _read_write(fd_in, fd_out, size)
+
+
+class NativeStrategy(FileSyncStrategy):
+    """
+    Synchronizes files from within the ronin process, without starting an
+    external program.
+
+    Files are copied with zero-copy kernel calls where available, written to
+    a temporary file next to their destination and renamed into place, so a
+    reader never sees a partially written file. Permissions, modification
+    times and, when running as root, ownership are preserved. Many small
+    files are copied in parallel on a bounded pool of threads (manifest key
+    `workers`).
+
+    A file is only copied if its size or modification time differ from the
+    destination's. Paths that no longer exist in the source are removed from
+    the destination only if the manifest's `delete` option is set.
+    Symbolic links are followed, and their targets copied.
+    """
+
+    def __init__(self, source, target, manifest):
+        super(NativeStrategy, self).__init__(source, target, manifest)
+        if manifest.elevate:
+            raise ValueError("The native strategy cannot elevate; use the rsync strategy instead.")
+
+        #: The pool of threads that files are copied on, created on first use.
+        self._pool = None
+
+    @property
+    def pool(self):
+        """
+        The pool of threads that files are copied on.
+        """
+        if self._pool is None:
+            self._pool = ThreadPool(max(self.manifest.workers or 1, 1))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def target_path(self, path):
+        """
+        Return the destination path of a path in the source directory.
+
+        :param path: the absolute path in the source directory.
+        """
+        relative_path = self.relative_path(path)
+        if relative_path is None:
+            return self.target
+        return os.path.join(self.target, relative_path)
+
+    def invoke(self, changes=None):
+        started = time.time()
+        self.full_sync = not self.is_incremental(changes)
+        if self.full_sync:
+            result = self.synchronize_all()
+            if result == 0 and not self.cancelled:
+                self.last_full_sync = started
+        else:
+            result = self.synchronize_changes(changes)
+        logger.debug("Native synchronization finished in {0:.3f}s".format(time.time() - started))
+        return result
+
+    def synchronize_all(self):
+        """
+        Synchronize the entire source directory with the destination.
+        """
+        snapshot = DiscriminatedDirectorySnapshot(self.source, matcher=self.exclude_matcher)
+        errors = 0
+        if self.manifest.delete:
+            errors += self.remove_extraneous(snapshot)
+        errors += self.copy_entries(snapshot.entries())
+        return 1 if errors else 0
+
+    def synchronize_changes(self, changes):
+        """
+        Synchronize the paths in the change set with the destination.
+
+        :param changes: the :class:`ChangeSet` to synchronize.
+        """
+        changes = self.apply_moves(changes)
+        errors = 0
+        if self.manifest.delete:
+            for path in sorted(self.removed_paths(changes)):
+                errors += self.remove(self.target_path(path))
+        entries = self.updated_entries(changes)
+        errors += self.copy_entries(entries)
+        return 1 if errors else 0
+
+    def copy_entries(self, entries):
+        """
+        Create the directories and copy the files in the given entries to
+        the destination. Directories are created first, parents before
+        children; files are then copied in parallel, unless there are too
+        few to be worth it.
+
+        :param entries: ``(path, stat_info)`` pairs of source entries.
+        :return: the number of entries that could not be synchronized.
+        """
+        directories, files = [], []
+        for path, st in entries:
+            (directories if S_ISDIR(st.st_mode) else files).append((path, st))
+
+        errors = 0
+        directories.sort()
+        for path, st in directories:
+            errors += self._apply(self.make_directory, path, st)
+        if len(files) > POOL_CHUNK_SIZE:
+            errors += sum(self.pool.imap_unordered(self._copy_task, files, chunksize=POOL_CHUNK_SIZE))
+        else:
+            errors += sum(self._copy_task(entry) for entry in files)
+
+        # Creating files updates the modification time of their directories.
+        for path, st in directories:
+            self._copy_times(st, self.target_path(path))
+        logger.debug("Synchronized {0} directories and {1} files".format(len(directories), len(files)))
+        return errors
+
+    def _copy_task(self, entry):
+        if self.cancelled:
+            return 0
+        path, st = entry
+        return self._apply(self.copy_file, path, st)
+
+    def _apply(self, function, path, st):
+        try:
+            function(path, st)
+            return 0
+        except (IOError, OSError) as e:
+            logger.error("Unable to synchronize '{0}': {1}".format(path, e))
+            return 1
+
+    def make_directory(self, path, st):
+        """
+        Create the destination directory for a source directory.
+        """
+        target_path = self.target_path(path)
+        try:
+            os.makedirs(target_path)
+        except OSError:
+            if not os.path.isdir(target_path):
+                raise
+        os.chmod(target_path, S_IMODE(st.st_mode))
+        self._copy_owner(st, target_path)
+
+    def copy_file(self, path, st):
+        """
+        Copy a source file to the destination, unless the destination
+        already has the same size and modification time.
+        """
+        target_path = self.target_path(path)
+        try:
+            target_st = os.stat(target_path)
+            if target_st.st_size == st.st_size and same_modification_time(target_st, st):
+                return
+        except OSError:
+            pass
+        temporary = self.temporary_path(target_path)
+
+        fd_in = os.open(path, os.O_RDONLY)
+        try:
+            fd_out = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                self.copy_contents(fd_in, fd_out, st)
+                os.fchmod(fd_out, S_IMODE(st.st_mode))
+            finally:
+                os.close(fd_out)
+            self._copy_owner(st, temporary)
+            self._copy_times(st, temporary)
+            os.rename(temporary, target_path)
+        except BaseException:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            raise
+        finally:
+            os.close(fd_in)
+
+    def copy_contents(self, fd_in, fd_out, st):
+        """
+        Copy the contents of an open source file to its open temporary
+        destination file.
+
+        :param fd_in: the file descriptor of the source file.
+        :param fd_out: the file descriptor of the temporary file.
+        :param st: the stat information of the source file.
+        """
+        copy_data(fd_in, fd_out, st.st_size)
+
+    def temporary_path(self, target_path):
+        """
+        Return the path of the temporary file that a destination file is
+        written to before it is renamed into place, creating its directory
+        if necessary.
+        """
+        directory, name = os.path.split(target_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return os.path.join(directory, ".{0}.ronin-{1}".format(name, threading.current_thread().ident))
+
+    def _copy_owner(self, st, path):
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            os.chown(path, st.st_uid, st.st_gid)
+
+    def _copy_times(self, st, path):
+        try:
+            if _UTIME_NS and hasattr(st, "st_mtime_ns"):
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            else:
+                os.utime(path, (st.st_atime, st.st_mtime))
+        except OSError:
+            pass
+
+    def remove(self, target_path):
+        """
+        Remove a file or directory from the destination.
+
+        :return: the number of entries that could not be removed.
+        """
+        try:
+            if os.path.isdir(target_path) and not os.path.islink(target_path):
+                shutil.rmtree(target_path)
+            else:
+                os.remove(target_path)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return 0
+            logger.error("Unable to remove '{0}': {1}".format(target_path, e))
+            return 1
+        return 0
+
+    def remove_extraneous(self, snapshot):
+        """
+        Remove the entries of the destination that are not in the source
+        snapshot, leaving excluded paths alone.
+
+        :return: the number of entries that could not be removed.
+        """
+        return sum(self.remove(path) for path in self.extraneous_paths(snapshot))
@@ -28,7 +28,8 @@ from . import FileSyncStrategy
 from pprint import pprint
 import logging
 import os
-import subprocess
+import sys
+import time
 
 #: The logging apparatus.
 logger = logging.getLogger(__name__)
@@ -38,8 +39,23 @@ class RsyncStrategy(FileSyncStrategy):
     """
     """
 
-    def get_args(self):
+    @property
+    def deletes(self):
         """
+        Whether the manifest instructs rsync to delete extraneous files from
+        the destination.
+        """
+        return any(str(arg).startswith("--delete") for arg in self.manifest.args)
+
+    def get_args(self, files_from=False, recursive=False):
+        """
+        Return the arguments passed to rsync.
+
+        :param files_from: Optional. Whether the paths to transfer will be
+            written, NUL separated, to rsync's standard input.
+        :param recursive: Optional. Whether rsync should recurse into the
+            directories listed in the files. Ignored unless `files_from` is
+            set.
         """
         manifest = self.manifest
         args = list()
@@ -52,14 +68,91 @@ class RsyncStrategy(FileSyncStrategy):
         #:
         for exclusion in manifest.exclude:
             args.append("--exclude="+str(exclusion))
+
+        #: When transferring an explicit list of paths, paths that no longer
+        #: exist in the source are either deleted from the destination (if
+        #: the manifest asks rsync to delete) or skipped.
+        if files_from:
+            args.append("--from0")
+            args.append("--files-from=-")
+            if recursive:
+                args.append("--recursive")
+            if self.deletes:
+                args.append("--delete-missing-args")
+                args.append("--force")
+            else:
+                args.append("--ignore-missing-args")
         args.append(self.source)
         args.append(self.target)
         return args
 
-    def invoke(self):
+    def get_files_from(self, changes):
+        """
+        Return the list of paths, relative to the source directory, that
+        rsync should transfer for the given changes.
+
+        :param changes: the :class:`ChangeSet` to synchronize.
+        """
+        matcher = self.exclude_matcher
+        paths = set()
+        for path in changes.updated_paths | changes.removed_paths:
+            relative_path = self.relative_path(path)
+            if relative_path is None:
+                continue
+            if matcher.match(path, path in changes.directories):
+                continue
+            paths.add(relative_path)
+        return sorted(paths)
+
+    def get_command(self, changes=None):
+        """
+        Return the rsync command that synchronizes the given changes, as a
+        ``(command, input, full_sync)`` tuple: the command, the bytes to
+        write to its standard input (or `None`) and whether it synchronizes
+        the entire source directory. The command is `None` if there is
+        nothing to synchronize.
+
+        Moves are applied as renames at the destination before an
+        incremental command is built, see :meth:`apply_moves`.
+
+        :param changes: Optional. The :class:`ChangeSet` to synchronize.
+        """
         command = list(["rsync"])
         if self.manifest.elevate:
             command.insert(0, "sudo")
-        command = command + self.get_args()
-        logger.debug("Running command: {0}".format(" ".join(command)))
-        return subprocess.call(command)
+
+        if not self.is_incremental(changes):
+            return command + self.get_args(), None, True
+
+        changes = self.apply_moves(changes)
+        files = self.get_files_from(changes)
+        if not files:
+            return None, None, False
+        recursive = bool(changes.directories & changes.updated_paths)
+        command = command + self.get_args(files_from=True, recursive=recursive)
+        return command, b"\0".join(self.encode_path(path) for path in files), False
+
+    def invoke(self, changes=None):
+        started = time.time()
+        command, input, full_sync = self.get_command(changes)
+        self.full_sync = full_sync
+        if command is None:
+            logger.debug("No paths to synchronize.")
+            return 0
+        if full_sync:
+            logger.debug("Running command: {0}".format(" ".join(command)))
+        else:
+            logger.debug("Running command: {0} ({1} path(s))".format(" ".join(command), input.count(b"\0") + 1))
+        result = self.run_process(command, input=input)
+        if full_sync and result == 0 and not self.cancelled:
+            self.last_full_sync = started
+        return result
+
+    @staticmethod
+    def encode_path(path):
+        """
+        Return the path encoded as bytes for rsync's standard input.
+        """
+        if isinstance(path, bytes):
+            return path
+        return path.encode(sys.getfilesystemencoding())
@@ -0,0 +1,175 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from . import FileSyncStrategy
+from .rsync import RsyncStrategy
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+import logging
+import os
+import subprocess
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+
+class TarStreamStrategy(FileSyncStrategy):
+    """
+    Synchronizes a batch of changed paths as a single tar stream, piped from
+    a `tar` process that packs the source paths into a `tar` process that
+    extracts them at the destination, without writing an archive to disk.
+
+    Transferring thousands of small files this way (e.g. after a vendor
+    install or asset build) costs two processes and one pass over the data,
+    instead of per-file bookkeeping. Paths that were removed from the source
+    are deleted from the destination as a separate batch, if the manifest's
+    `delete` option is set.
+    """
+
+    def get_pack_command(self):
+        """
+        Return the command that writes the paths listed, NUL separated, on
+        its standard input to a tar stream on its standard output.
+        """
+        return ["tar", "-C", self.source, "--null", "--no-recursion", "--ignore-failed-read", "-T", "-", "-cf", "-"]
+
+    def get_extract_command(self):
+        """
+        Return the command that extracts a tar stream from its standard
+        input into the destination directory.
+        """
+        return self.elevated(["tar", "-C", self.target, "-xpf", "-"])
+
+    def get_delete_command(self):
+        """
+        Return the command that removes the paths listed, NUL separated, on
+        its standard input from the destination directory.
+        """
+        return self.elevated(["xargs", "-0", "rm", "-rf", "--"])
+
+    def elevated(self, command):
+        if self.manifest.elevate:
+            return ["sudo"] + command
+        return command
+
+    def invoke(self, changes=None):
+        started = time.time()
+        delete = self.manifest.delete
+        self.full_sync = not self.is_incremental(changes)
+        if self.full_sync:
+            snapshot = DiscriminatedDirectorySnapshot(self.source, matcher=self.exclude_matcher)
+            entries = snapshot.entries()
+            removed = [os.path.relpath(path, self.target) for path in self.extraneous_paths(snapshot)] if delete else []
+        else:
+            changes = self.apply_moves(changes)
+            entries = self.updated_entries(changes)
+            removed = [self.relative_path(path) for path in self.removed_paths(changes)] if delete else []
+        updated = sorted(set(self.relative_path(path) for path, st in entries) - set([None]))
+
+        result = 0
+        if removed:
+            result = self.delete(sorted(removed))
+        if updated:
+            result = self.transfer(updated) or result
+        if self.full_sync and result == 0 and not self.cancelled:
+            self.last_full_sync = started
+        logger.debug("Tar stream synchronization of {0} path(s) finished in {1:.3f}s".format(
+            len(updated) + len(removed), time.time() - started))
+        return result
+
+    def make_target(self):
+        if not os.path.isdir(self.target):
+            if self.manifest.elevate:
+                subprocess.call(self.elevated(["mkdir", "-p", self.target]))
+            else:
+                os.makedirs(self.target)
+
+    def transfer(self, paths):
+        """
+        Pack the given paths in the source directory into a tar stream and
+        extract it into the destination directory.
+
+        :param paths: the paths, relative to the source directory. Parent
+            directories must be listed before their contents.
+        :return: the exit status of the first process that failed, or 0.
+        """
+        self.make_target()
+        pack_command = self.get_pack_command()
+        extract_command = self.get_extract_command()
+        logger.debug("Running command: {0} | {1} ({2} path(s))".format(" ".join(pack_command),
+                                                                    " ".join(extract_command), len(paths)))
+        packer = self.start_process(pack_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        if packer is None:
+            return None
+        try:
+            extractor = self.start_process(extract_command, stdin=packer.stdout)
+        except OSError:
+            extractor = None
+            raise
+        finally:
+            # Only the extractor reads the stream.
+            packer.stdout.close()
+            if extractor is None:
+                packer.stdin.close()
+                packer.kill()
+                self.release_process(packer)
+        if extractor is None:
+            return None
+        try:
+            packer.stdin.write(self.encode_paths(paths))
+            packer.stdin.close()
+        except (IOError, OSError):
+            # The extractor exited early, e.g. because it was cancelled.
+            try:
+                packer.stdin.close()
+            except (IOError, OSError):
+                pass
+        pack_status = self.release_process(packer)
+        extract_status = self.release_process(extractor)
+        return pack_status or extract_status
+
+    def delete(self, paths):
+        """
+        Remove the given paths from the destination directory.
+
+        :param paths: the paths, relative to the destination directory.
+        :return: the exit status of the removal.
+        """
+        if not os.path.isdir(self.target):
+            return 0
+        command = self.get_delete_command()
+        logger.debug("Running command: {0} ({1} path(s))".format(" ".join(command), len(paths)))
+        return self.run_process(command, input=self.encode_paths(paths), cwd=self.target)
+
+    @staticmethod
+    def encode_paths(paths):
+        """
+        Return the paths, NUL separated and encoded as bytes. Each path is
+        prefixed with ``./`` so that names starting with a dash are not
+        mistaken for options.
+        """
+        return b"\0".join(RsyncStrategy.encode_path(os.path.join(".", path)) for path in paths)
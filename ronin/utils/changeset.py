@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:module: ronin.utils.changeset
+:synopsis: Accumulation of changed paths between synchronizations.
+
+A change set records which paths were created, modified, deleted or moved
+since the last synchronization, so that a strategy can transfer only those
+paths instead of the whole source tree. Changes are folded as they are
+added: a path that is created and then deleted only needs to be deleted,
+a file that is moved twice only needs to be moved once, and so on.
+
+Events are folded in the order they occurred. The changes in a directory
+snapshot diff (or in another change set) happened at once, so they are
+folded in an order that keeps them intact: deletions first, since an entry
+may have been replaced by another, then moves, each before the move onto
+its source, and creations and modifications last.
+
+Classes
+-------
+.. autoclass:: ChangeSet
+   :members:
+   :show-inheritance:
+
+"""
+
+from collections import OrderedDict
+from watchdog.events import (
+    EVENT_TYPE_CREATED,
+    EVENT_TYPE_DELETED,
+    EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_MOVED
+)
+
+#: The type of the event that newer releases of watchdog report when a file
+#: that was open for writing is closed.
+EVENT_TYPE_CLOSED = "closed"
+
+
+def _order_moves(moves):
+    """
+    Order moves that happened at once so that they can be applied one after
+    the other: the move out of a path comes before the move onto it.
+
+    :param moves: tuples whose first two items are the source and
+        destination paths of a move, in the order they are preferred in.
+    :returns: a tuple of the ordered moves and the moves that form cycles
+        (e.g. two swapped files), which cannot be ordered.
+    """
+    pending = OrderedDict((move[0], move) for move in moves)
+    ordered, cycles = [], []
+    while pending:
+        chain = [pending.popitem(last=False)[1]]
+        while chain[-1][1] in pending:
+            chain.append(pending.pop(chain[-1][1]))
+        if chain[-1][1] == chain[0][0]:
+            cycles.extend(chain)
+        else:
+            ordered.extend(reversed(chain))
+    return ordered, cycles
+
+
+class ChangeSet(object):
+    """
+    The set of paths that changed in a source tree, built from file system
+    events or directory snapshot diffs.
+    """
+
+    def __init__(self):
+        #: Paths that were created.
+        self.created = set()
+
+        #: Paths whose contents or metadata were modified.
+        self.modified = set()
+
+        #: Paths that were deleted.
+        self.deleted = set()
+
+        #: Paths that were moved, mapping the destination path to the path
+        #: the entry was originally moved from.
+        self.moved = {}
+
+        #: Paths that are known to be directories.
+        self.directories = set()
+
+        #: Files that were closed after being written, and not modified
+        #: since.
+        self.closed = set()
+
+        #: The time at which a change to each path was first seen, for the
+        #: changes that were reported with one.
+        self.seen = {}
+
+    def __len__(self):
+        return len(self.created) + len(self.modified) + len(self.deleted) + len(self.moved)
+
+    def __nonzero__(self):
+        return len(self) > 0
+
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        return "<ChangeSet(created={0}, modified={1}, deleted={2}, moved={3})>".format(
+            len(self.created), len(self.modified), len(self.deleted), len(self.moved))
+
+    def copy(self):
+        """
+        Return a copy of the change set.
+        """
+        changes = ChangeSet()
+        changes.created = set(self.created)
+        changes.modified = set(self.modified)
+        changes.deleted = set(self.deleted)
+        changes.moved = dict(self.moved)
+        changes.directories = set(self.directories)
+        changes.closed = set(self.closed)
+        changes.seen = dict(self.seen)
+        return changes
+
+    @classmethod
+    def from_events(cls, events):
+        """
+        Return a new change set built from a sequence of file system events.
+
+        :param events: the file system events, in the order they occurred.
+        """
+        changes = cls()
+        for event in events:
+            changes.add_event(event)
+        return changes
+
+    @classmethod
+    def from_diff(cls, diff, seen=None):
+        """
+        Return a new change set built from a directory snapshot diff.
+
+        :param diff: the :class:`DirectorySnapshotDiff` (or compatible)
+            instance.
+        :param seen: Optional. The time at which the changes were seen.
+        """
+        changes = cls()
+        changes.add_diff(diff, seen)
+        return changes
+
+    def add_created(self, path, is_directory=False):
+        self.deleted.discard(path)
+        self.created.add(path)
+        if is_directory:
+            self.directories.add(path)
+
+    def add_modified(self, path, is_directory=False):
+        # A path that was created since the last synchronization still only
+        # needs to be created; directory modifications are represented by
+        # the changes to their contents.
+        self.closed.discard(path)
+        if is_directory or path in self.created:
+            return
+        self.modified.add(path)
+
+    def add_closed(self, path):
+        self.closed.add(path)
+
+    def add_deleted(self, path, is_directory=False):
+        self.modified.discard(path)
+        self.closed.discard(path)
+        self.directories.discard(path)
+        if path in self.moved:
+            path = self.moved.pop(path)
+        elif path in self.created:
+            self.created.discard(path)
+            return
+        self.deleted.add(path)
+
+    def add_moved(self, src_path, dest_path, is_directory=False):
+        self.deleted.discard(dest_path)
+        self.modified.discard(dest_path)
+        self.closed.discard(dest_path)
+        if src_path in self.closed:
+            self.closed.discard(src_path)
+            self.closed.add(dest_path)
+        if is_directory:
+            self.directories.discard(src_path)
+            self.directories.add(dest_path)
+
+        if src_path in self.created:
+            # The entry never existed at the destination, so there is
+            # nothing to move: it is simply created at its new location.
+            self.created.discard(src_path)
+            self.created.add(dest_path)
+            return
+
+        if src_path in self.modified:
+            self.modified.discard(src_path)
+            self.modified.add(dest_path)
+        origin = self.moved.pop(src_path, src_path)
+        if origin == dest_path:
+            return
+        self.moved[dest_path] = origin
+
+    def add_moves(self, moves):
+        """
+        Fold moves that happened at once into the change set. Entries that
+        traded places cannot be moved one after the other, and are deleted
+        and created again instead.
+
+        :param moves: ``(src_path, dest_path, is_directory)`` tuples.
+        """
+        ordered, cycles = _order_moves(moves)
+        for src_path, dest_path, is_directory in ordered:
+            self.add_moved(src_path, dest_path, is_directory)
+        for src_path, dest_path, is_directory in cycles:
+            self.add_deleted(src_path, is_directory)
+        for src_path, dest_path, is_directory in cycles:
+            self.add_created(dest_path, is_directory)
+
+    def ordered_moves(self):
+        """
+        Return the moves as ``(src_path, dest_path)`` pairs, in an order in
+        which they can be applied as renames one after the other, along with
+        the moves that form cycles and cannot be.
+
+        :returns: a tuple of the ordered moves and the cyclic moves.
+        """
+        return _order_moves(sorted(((src_path, dest_path) for dest_path, src_path in self.moved.items()),
+                                   key=lambda move: move[1]))
+
+    def mark_seen(self, path, seen):
+        """
+        Record the time at which a change to the path was seen, unless an
+        earlier change to it was seen before.
+
+        :param path: the path.
+        :param seen: the time, or `None` if it is not known.
+        """
+        if seen is None:
+            return
+        previous = self.seen.get(path)
+        if previous is None or seen < previous:
+            self.seen[path] = seen
+
+    def add_event(self, event):
+        """
+        Fold a file system event into the change set. The time at which the
+        event was seen is taken from its `seen` attribute, if it has one.
+
+        :param event: the :class:`watchdog.events.FileSystemEvent`.
+        """
+        seen = getattr(event, "seen", None)
+        if seen is not None:
+            self.mark_seen(event.dest_path if event.event_type == EVENT_TYPE_MOVED else event.src_path, seen)
+        event_type = event.event_type
+        if event_type == EVENT_TYPE_CREATED:
+            self.add_created(event.src_path, event.is_directory)
+        elif event_type == EVENT_TYPE_MODIFIED:
+            self.add_modified(event.src_path, event.is_directory)
+        elif event_type == EVENT_TYPE_DELETED:
+            self.add_deleted(event.src_path, event.is_directory)
+        elif event_type == EVENT_TYPE_MOVED:
+            self.add_moved(event.src_path, event.dest_path, event.is_directory)
+        elif event_type == EVENT_TYPE_CLOSED and not event.is_directory:
+            self.add_closed(event.src_path)
+
+    def add_diff(self, diff, seen=None):
+        """
+        Fold the changes described by a directory snapshot diff into the
+        change set.
+
+        :param diff: the :class:`DirectorySnapshotDiff` (or compatible)
+            instance.
+        :param seen: Optional. The time at which the changes were seen.
+        """
+        if seen is not None:
+            for paths in (diff.files_created, diff.files_modified, diff.files_deleted,
+                          diff.dirs_created, diff.dirs_deleted):
+                for path in paths:
+                    self.mark_seen(path, seen)
+            for moves in (diff.files_moved, diff.dirs_moved):
+                for src_path, dest_path in moves:
+                    self.mark_seen(dest_path, seen)
+        for path in diff.files_deleted:
+            self.add_deleted(path)
+        for path in diff.dirs_deleted:
+            self.add_deleted(path, True)
+        self.add_moves([(src_path, dest_path, True) for src_path, dest_path in diff.dirs_moved] +
+                       [(src_path, dest_path, False) for src_path, dest_path in diff.files_moved])
+        for path in diff.dirs_created:
+            self.add_created(path, True)
+        for path in diff.files_created:
+            self.add_created(path)
+        for path in diff.files_modified:
+            self.add_modified(path)
+
+    def update(self, other):
+        """
+        Fold the changes of another change set, which occurred after the
+        changes in this one, into this change set.
+
+        :param other: the :class:`ChangeSet` to merge.
+        """
+        for path in other.deleted:
+            self.add_deleted(path, path in other.directories)
+        self.add_moves([(src_path, dest_path, dest_path in other.directories)
+                        for dest_path, src_path in sorted(other.moved.items())])
+        for path in other.created:
+            self.add_created(path, path in other.directories)
+        for path in other.modified:
+            self.add_modified(path)
+        for path in other.closed:
+            self.add_closed(path)
+        for path, seen in other.seen.items():
+            self.mark_seen(path, seen)
+
+    @property
+    def updated_paths(self):
+        """
+        Set of paths that exist in the source and must be transferred.
+        """
+        return self.created | self.modified | set(self.moved.keys())
+
+    @property
+    def removed_paths(self):
+        """
+        Set of paths that no longer exist in the source and must be removed
+        from the destination.
+        """
+        return self.deleted | set(self.moved.values())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:module: ronin.utils.compactsnapshot
+:synopsis: Compact, array-backed directory snapshots for very large trees.
+
+.. ADMONITION:: Why compact snapshots?
+
+        A :class:`DiscriminatedDirectorySnapshot` keeps an ``os.stat_result``
+        for every path, keyed by path, plus a second dictionary keyed by
+        inode. For trees with millions of entries this costs hundreds of
+        bytes per entry, and a polling emitter holds two snapshots at a
+        time. A compact snapshot stores only the fields that are compared
+        (inode, device, mode, size and modification time) in packed arrays,
+        alongside a sorted list of interned paths, so consecutive snapshots
+        share their path strings.
+
+Classes
+-------
+.. autoclass:: CompactDirectorySnapshot
+   :members:
+   :show-inheritance:
+
+"""
+
+from array import array
+from bisect import bisect_left
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot, StatInfo
+from stat import S_ISDIR
+import sys
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern
+
+try:
+    array("Q")
+    _UINT64 = "Q"
+except ValueError:
+    # Python 2 has no "Q" type code; "L" is 64 bits wide on LP64 platforms.
+    _UINT64 = "L"
+
+
+def _intern_path(path):
+    try:
+        return _intern(path)
+    except TypeError:
+        # Unicode paths cannot be interned on Python 2.
+        return path
+
+
+class CompactDirectorySnapshot(DiscriminatedDirectorySnapshot):
+    """
+    A :class:`DiscriminatedDirectorySnapshot` that stores its entries in
+    packed arrays sorted by path.
+
+    It accepts the same arguments, except that it cannot be taken
+    incrementally, and satisfies the interface used by
+    ``DirectorySnapshotDiff``. Looking up a path costs a binary search
+    rather than a dictionary lookup; subtracting two compact snapshots
+    merges their sorted arrays directly.
+    """
+
+    def __init__(self, path, recursive=True, ignore_paths=None, **kwargs):
+        kwargs.pop("incremental", None)
+        kwargs.pop("previous", None)
+        self._init_arrays()
+        super(CompactDirectorySnapshot, self).__init__(path, recursive, ignore_paths, **kwargs)
+
+    def _init_arrays(self):
+        self._paths = []
+        self._ino = array(_UINT64)
+        self._dev = array(_UINT64)
+        self._mode = array("I")
+        self._size = array(_UINT64)
+        self._mtime = array("d")
+        self._inode_to_index = None
+
+    def _add_entry(self, path, st):
+        self._paths.append(_intern_path(path))
+        self._ino.append(st.st_ino)
+        self._dev.append(st.st_dev)
+        self._mode.append(st.st_mode)
+        self._size.append(st.st_size)
+        self._mtime.append(st.st_mtime)
+
+    def _finish(self):
+        self._stat_info = None
+        self._inode_to_path = None
+        paths = self._paths
+        order = sorted(range(len(paths)), key=paths.__getitem__)
+        self._paths = [paths[i] for i in order]
+        for name in ("_ino", "_dev", "_mode", "_size", "_mtime"):
+            values = getattr(self, name)
+            setattr(self, name, array(values.typecode, [values[i] for i in order]))
+
+    @classmethod
+    def from_stat_info(cls, stat_info, timestamp=0):
+        snapshot = cls.__new__(cls)
+        snapshot._ignore_paths = None
+        snapshot._matcher = None
+        snapshot._timestamp = timestamp
+        snapshot._children = None
+        snapshot._columns = None
+        snapshot._init_arrays()
+        for path, st in stat_info.items():
+            snapshot._add_entry(path, st)
+        snapshot._finish()
+        return snapshot
+
+    def __len__(self):
+        return len(self._paths)
+
+    def index(self, path):
+        """
+        Return the position of the path in the snapshot's arrays.
+
+        :raises KeyError: if the path is not in the snapshot.
+        """
+        paths = self._paths
+        i = bisect_left(paths, path)
+        if i == len(paths) or paths[i] != path:
+            raise KeyError(path)
+        return i
+
+    @property
+    def paths(self):
+        """
+        Set of file/directory paths in the snapshot.
+        """
+        return set(self._paths)
+
+    @property
+    def sorted_paths(self):
+        """
+        The list of paths in the snapshot, in sorted order.
+        """
+        return self._paths
+
+    def entries(self):
+        """
+        Iterate over ``(path, stat_info)`` pairs for every entry in the
+        snapshot, in path order.
+        """
+        for i, path in enumerate(self._paths):
+            yield path, StatInfo(self._mode[i], self._ino[i], self._dev[i], self._size[i], self._mtime[i])
+
+    def columns(self):
+        """
+        Return the ``(paths, inodes, devices, modes, sizes, mtimes)``
+        sequences of the snapshot's entries, sorted by path.
+        """
+        return self._paths, self._ino, self._dev, self._mode, self._size, self._mtime
+
+    def path(self, id):
+        """
+        Returns path for id. None if id is unknown to this snapshot.
+        """
+        if self._inode_to_index is None:
+            self._inode_to_index = dict(((ino, dev), i) for i, (ino, dev)
+                                        in enumerate(zip(self._ino, self._dev)))
+        i = self._inode_to_index.get(id)
+        return None if i is None else self._paths[i]
+
+    def inode(self, path):
+        """ Returns an id for path. """
+        i = self.index(path)
+        return (self._ino[i], self._dev[i])
+
+    def isdir(self, path):
+        return S_ISDIR(self._mode[self.index(path)])
+
+    def mtime(self, path):
+        return self._mtime[self.index(path)]
+
+    def size(self, path):
+        return self._size[self.index(path)]
+
+    def stat_info(self, path):
+        """
+        Returns the recorded subset of stat information for the specified
+        path, as a :class:`StatInfo`.
+        """
+        i = self.index(path)
+        return StatInfo(self._mode[i], self._ino[i], self._dev[i], self._size[i], self._mtime[i])
+
+    def __repr__(self):
+        return "<CompactDirectorySnapshot(entries={0})>".format(len(self._paths))
@@ -39,6 +39,23 @@
         of watchdog if we don't care about the directories with large
         numbers of files.
 
+.. ADMONITION:: Walkers
+
+        Three strategies are available for walking the directory tree. The
+        ``scandir`` walker reads each directory with ``os.scandir`` (or the
+        ``scandir`` backport on older Pythons), reusing the file type
+        reported by the directory read and walking the tree iteratively.
+        The ``listdir`` walker is the original implementation, built on
+        ``os.listdir`` and a ``stat`` call per entry; it is used when a
+        custom ``stat`` or ``listdir`` function is given, when ``scandir``
+        is unavailable, or when explicitly requested.
+
+        The ``threaded`` walker reads directories the same way, but on a
+        pool of worker threads that fan out across subdirectories. Reading
+        a directory and stat'ing its entries release the GIL, so on
+        high-latency mounts (e.g. VirtualBox shared folders) the round
+        trips to the host overlap instead of being made one at a time.
+
 Classes
 -------
 .. autoclass:: DiscriminatedDirectorySnapshot
@@ -49,10 +66,44 @@ Classes
 
 import errno
 import os
+import threading
+import time
+from collections import namedtuple
 from stat import S_ISDIR
 from watchdog.utils import platform
 from watchdog.utils import stat as default_stat
 from watchdog.utils.dirsnapshot import DirectorySnapshotDiff
+from ronin.utils.snapshotdiff import MergeSnapshotDiff
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+#: The walker that reads directories with ``os.listdir`` and stats every
+#: entry separately.
+WALKER_LISTDIR = "listdir"
+
+#: The walker that reads directories with ``os.scandir``.
+WALKER_SCANDIR = "scandir"
+
+#: The walker that reads directories on a pool of worker threads.
+WALKER_THREADED = "threaded"
+
+#: The default number of worker threads used by the threaded walker.
+DEFAULT_WALKER_THREADS = 8
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+#: The subset of stat information that snapshots rely on, for snapshots that
+#: are not built from ``stat`` calls.
+StatInfo = namedtuple("StatInfo", ["st_mode", "st_ino", "st_dev", "st_size", "st_mtime"])
 
 
 class DiscriminatedDirectorySnapshot(object):
@@ -77,6 +128,11 @@ class DiscriminatedDirectorySnapshot(object):
         directory snapshots.
     :type ignore_paths:
         ``list``
+    :param matcher:
+        The exclusion matcher; entries it matches are excluded from the
+        snapshot and excluded directories are not descended into.
+    :type matcher:
+        :class:`ronin.utils.matcher.ExclusionMatcher`
     :param recursive:
         ``True`` if the entire directory tree should be included in the
         snapshot; ``False`` otherwise.
@@ -92,19 +148,69 @@ class DiscriminatedDirectorySnapshot(object):
         which will be called for every entry in the directory tree.
     :param listdir:
         Use custom listdir function. See ``os.listdir`` for details.
+    :param walker:
+        The walker used to traverse the directory tree: ``"scandir"``,
+        ``"listdir"`` or ``"threaded"``. By default the ``scandir`` walker
+        is used unless it is unavailable or a custom ``stat`` or ``listdir``
+        function is given.
+    :type walker:
+        ``str``
+    :param workers:
+        The number of worker threads used by the ``threaded`` walker.
+    :type workers:
+        ``int``
+    :param incremental:
+        ``True`` if the snapshot should record the entries of each
+        directory so that a later snapshot may be taken incrementally from
+        it; ``False`` otherwise.
+    :type incremental:
+        ``bool``
+    :param previous:
+        An incremental snapshot of the same directory taken earlier. If
+        given, only directories whose modification time changed since the
+        previous snapshot are listed again.
+    :type previous:
+        :class:`DiscriminatedDirectorySnapshot`
+    :param restat_files:
+        When taking a snapshot from a previous one, ``True`` if the files of
+        unchanged directories should be stat'ed again; ``False`` if their
+        previous stat information should be reused.
+    :type restat_files:
+        ``bool``
     """
 
     def __init__(self, path, recursive=True, ignore_paths=None,
                  walker_callback=(lambda p, s: None),
                  stat=default_stat,
-                 listdir=os.listdir):
-        self._ignore_paths = ignore_paths
+                 listdir=os.listdir,
+                 walker=None,
+                 incremental=False,
+                 previous=None,
+                 restat_files=True,
+                 matcher=None,
+                 workers=DEFAULT_WALKER_THREADS):
+        self._ignore_paths = frozenset(ignore_paths) if ignore_paths else None
+        self._matcher = matcher if matcher else None
         self._stat_info = {}
         self._inode_to_path = {}
+        self._timestamp = time.time()
+        self._columns = None
 
-        st = stat(path)
-        self._stat_info[path] = st
-        self._inode_to_path[(st.st_ino, st.st_dev)] = path
+        #: The entries of each directory, recorded only by incremental
+        #: snapshots.
+        self._children = {} if incremental else None
+
+        self._add_entry(path, stat(path))
+
+        if walker is None:
+            if scandir is not None and stat is default_stat and listdir is os.listdir:
+                walker = WALKER_SCANDIR
+            else:
+                walker = WALKER_LISTDIR
+        elif walker == WALKER_SCANDIR and scandir is None:
+            walker = WALKER_LISTDIR
+        if walker not in (WALKER_LISTDIR, WALKER_SCANDIR, WALKER_THREADED):
+            raise ValueError("Unknown walker: {0}".format(walker))
 
         def walk(root):
             try:
@@ -121,7 +227,10 @@ class DiscriminatedDirectorySnapshot(object):
             for p in paths:
                 try:
                     if self.is_proccess_path(p):
-                        entries.append((p, stat(p)))
+                        st = stat(p)
+                        if self._is_excluded_directory(p, st):
+                            continue
+                        entries.append((p, st))
                 except OSError:
                     continue
             for _ in entries:
@@ -132,19 +241,266 @@ class DiscriminatedDirectorySnapshot(object):
                         for _ in walk(path):
                             yield _
 
-        for p, st in walk(path):
-            i = (st.st_ino, st.st_dev)
-            self._inode_to_path[i] = p
-            self._stat_info[p] = st
+        if walker == WALKER_SCANDIR or (walker == WALKER_THREADED and scandir is not None and
+                                        stat is default_stat and listdir is os.listdir):
+            list_directory = self._scandir_entries
+        else:
+            list_directory = lambda directory: self._listdir_entries(directory, stat, listdir)
+
+        if incremental:
+            if previous is not None and previous._children is None:
+                previous = None
+            entries = self._walk_incremental(path, recursive, previous, list_directory, stat, restat_files)
+        elif walker == WALKER_SCANDIR:
+            entries = self._walk_scandir(path, recursive)
+        elif walker == WALKER_THREADED:
+            entries = self._walk_threaded(path, recursive, list_directory, workers)
+        else:
+            entries = walk(path)
+
+        for p, st in entries:
+            self._add_entry(p, st)
             walker_callback(p, st)
+        self._finish()
+
+    def _add_entry(self, path, st):
+        """
+        Record the stat information of an entry in the snapshot.
+        """
+        self._inode_to_path[(st.st_ino, st.st_dev)] = path
+        self._stat_info[path] = st
+
+    def _finish(self):
+        """
+        Called once every entry has been recorded.
+        """
+
+    def _walk_scandir(self, root, recursive):
+        """
+        Iteratively walk the directory tree beneath the root with
+        ``scandir``, yielding a ``(path, stat_info)`` pair for each entry
+        that is not ignored.
+
+        The type reported by the directory read decides whether an entry is
+        descended into; each entry is still stat'ed once for its inode and
+        modification time.
+        """
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            for p, st, is_dir in self._scandir_entries(directory):
+                yield p, st
+                if recursive and is_dir:
+                    directories.append(p)
+
+    def _walk_threaded(self, root, recursive, list_directory, workers):
+        """
+        Walk the directory tree beneath the root on a pool of worker
+        threads, yielding a ``(path, stat_info)`` pair for each entry that
+        is not ignored.
+
+        Each worker lists and stats one directory at a time; the
+        subdirectories it finds are queued for the next free worker. The
+        results are merged on the calling thread, so the snapshot itself is
+        only ever modified by one thread.
+        """
+        directories = Queue()
+        results = Queue()
+
+        def work():
+            while True:
+                directory = directories.get()
+                if directory is None:
+                    return
+                try:
+                    results.put((list(list_directory(directory)), None))
+                except Exception as e:
+                    results.put((None, e))
+
+        threads = []
+        for _ in range(max(workers or 1, 1)):
+            thread = threading.Thread(target=work, name="RoninDirectoryWalker")
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        try:
+            directories.put(root)
+            pending = 1
+            while pending:
+                entries, error = results.get()
+                pending -= 1
+                if error is not None:
+                    raise error
+                for p, st, is_dir in entries:
+                    yield p, st
+                    if recursive and is_dir:
+                        directories.put(p)
+                        pending += 1
+        finally:
+            for _ in threads:
+                directories.put(None)
+            for thread in threads:
+                thread.join()
+
+    def _scandir_entries(self, directory):
+        """
+        Yield a ``(path, stat_info, is_dir)`` tuple for each entry of the
+        directory that is not ignored, read with ``scandir``.
+        """
+        try:
+            iterator = scandir(directory)
+        except OSError as e:
+            # See the listdir walker; a directory deleted while walking
+            # is treated as empty.
+            if e.errno == errno.ENOENT:
+                return
+            raise
+        try:
+            for entry in iterator:
+                p = entry.path
+                try:
+                    is_dir = entry.is_dir()
+                    if not self.is_proccess_path(p, is_dir):
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield p, st, is_dir
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
 
-    def is_proccess_path(self, path):
+    def _listdir_entries(self, directory, stat, listdir):
+        """
+        Yield a ``(path, stat_info, is_dir)`` tuple for each entry of the
+        directory that is not ignored, read with ``listdir``.
         """
+        try:
+            names = listdir(directory)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return
+            raise
+        for name in names:
+            p = os.path.join(directory, name)
+            if not self.is_proccess_path(p):
+                continue
+            try:
+                st = stat(p)
+            except OSError:
+                continue
+            if self._is_excluded_directory(p, st):
+                continue
+            yield p, st, S_ISDIR(st.st_mode)
+
+    def _walk_incremental(self, root, recursive, previous, list_directory, stat, restat_files):
+        """
+        Iteratively walk the directory tree beneath the root, relisting only
+        the directories whose modification time changed since the previous
+        snapshot.
+
+        Adding, removing or renaming an entry updates the modification time
+        of its parent directory, so the entries of an unchanged directory
+        are taken from the previous snapshot. Subdirectories are always
+        stat'ed again, since that is how their own changes are detected;
+        files are stat'ed again only if ``restat_files`` is set, otherwise
+        their previous stat information is carried over.
+
+        A directory modified within a second of the previous snapshot is
+        always relisted, as a change made in the same timestamp tick as the
+        previous listing would not alter its modification time.
+        """
+        directories = [root]
+        while directories:
+            directory = directories.pop()
+            children = None
+            previous_children = None
+            if previous is not None:
+                previous_children = previous._children.get(directory)
+            if previous_children is not None:
+                st = self._stat_info[directory]
+                previous_st = previous._stat_info[directory]
+                if (st.st_mtime == previous_st.st_mtime and
+                        st.st_ino == previous_st.st_ino and
+                        st.st_mtime < previous._timestamp - 1):
+                    children = []
+                    for p in previous_children:
+                        previous_st = previous._stat_info[p]
+                        is_dir = S_ISDIR(previous_st.st_mode)
+                        if is_dir or restat_files:
+                            try:
+                                st = stat(p)
+                            except OSError:
+                                continue
+                            is_dir = S_ISDIR(st.st_mode)
+                        else:
+                            st = previous_st
+                        children.append(p)
+                        yield p, st
+                        if recursive and is_dir:
+                            directories.append(p)
+            if children is None:
+                children = []
+                for p, st, is_dir in list_directory(directory):
+                    children.append(p)
+                    yield p, st
+                    if recursive and is_dir:
+                        directories.append(p)
+            self._children[directory] = children
+
+    @classmethod
+    def from_stat_info(cls, stat_info, timestamp=0):
+        """
+        Return a snapshot built from previously recorded stat information
+        rather than by walking the file system.
+
+        :param stat_info:
+            A dictionary of stat information, keyed by path.
+        :param timestamp:
+            The time at which the stat information was recorded.
+        """
+        snapshot = cls.__new__(cls)
+        snapshot._ignore_paths = None
+        snapshot._matcher = None
+        snapshot._timestamp = timestamp
+        snapshot._children = None
+        snapshot._columns = None
+        snapshot._stat_info = stat_info
+        snapshot._inode_to_path = dict(((st.st_ino, st.st_dev), path) for path, st in stat_info.items())
+        return snapshot
+
+    def _is_excluded_directory(self, path, st):
+        """
+        Return whether an entry that passed :func:`is_proccess_path` before
+        its type was known is a directory excluded by a directory-only
+        exclusion.
+        """
+        if self._matcher is None or not self._matcher.has_directory_rules:
+            return False
+        return S_ISDIR(st.st_mode) and not self.is_proccess_path(path, True)
+
+    def is_proccess_path(self, path, is_dir=None):
+        """
+        Return whether the path should be included in the snapshot.
+
+        :param path:
+            The path of the entry.
+        :param is_dir:
+            Whether the entry is a directory, or ``None`` if this is not
+            known yet; exclusions that apply to directories only are then
+            not considered.
         """
         if self._ignore_paths is not None and path in self._ignore_paths:
             return False
+        if self._matcher is not None and self._matcher.match_path(path, is_dir):
+            return False
         return True
 
+    def __len__(self):
+        return len(self._stat_info)
+
     @property
     def paths(self):
         """
@@ -152,6 +508,33 @@ class DiscriminatedDirectorySnapshot(object):
         """
         return set(self._stat_info.keys())
 
+    def entries(self):
+        """
+        Iterate over ``(path, stat_info)`` pairs for every entry in the
+        snapshot.
+        """
+        return iter(self._stat_info.items())
+
+    def columns(self):
+        """
+        Return the ``(paths, inodes, devices, modes, sizes, mtimes)``
+        sequences of the snapshot's entries, sorted by path, as used by
+        :class:`ronin.utils.snapshotdiff.MergeSnapshotDiff`. The columns are
+        built on first use and kept, so that a snapshot sorted as the new
+        side of one comparison is not sorted again as the reference side of
+        the next.
+        """
+        if self._columns is None:
+            paths = sorted(self._stat_info)
+            stat_info = [self._stat_info[p] for p in paths]
+            self._columns = (paths,
+                             [st.st_ino for st in stat_info],
+                             [st.st_dev for st in stat_info],
+                             [st.st_mode for st in stat_info],
+                             [st.st_size for st in stat_info],
+                             [st.st_mtime for st in stat_info])
+        return self._columns
+
     def path(self, id):
         """
         Returns path for id. None if id is unknown to this snapshot.
@@ -169,6 +552,9 @@ class DiscriminatedDirectorySnapshot(object):
     def mtime(self, path):
         return self._stat_info[path].st_mtime
 
+    def size(self, path):
+        return self._stat_info[path].st_size
+
     def stat_info(self, path):
         """
         Returns a stat information object for the specified path from
@@ -186,11 +572,16 @@ class DiscriminatedDirectorySnapshot(object):
 
     def __sub__(self, previous_dirsnap):
         """Allow subtracting a DirectorySnapshot object instance from
-        another.
+        another. Snapshots that provide :meth:`columns` are compared with a
+        single merge pass.
 
         :returns:
-            A :class:`DirectorySnapshotDiff` object.
+            A :class:`ronin.utils.snapshotdiff.MergeSnapshotDiff` object, or
+            a :class:`DirectorySnapshotDiff` object if the previous snapshot
+            does not provide :meth:`columns`.
         """
+        if hasattr(previous_dirsnap, "columns"):
+            return MergeSnapshotDiff(previous_dirsnap, self)
         return DirectorySnapshotDiff(previous_dirsnap, self)
 
     def __str__(self):
@@ -0,0 +1,206 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+:module: ronin.utils.latency
+:synopsis: Tracking of the time changes take to reach the destination.
+
+Classes
+-------
+.. autoclass:: LatencyTracker
+   :members:
+   :show-inheritance:
+"""
+
+from ronin import metrics
+from collections import deque
+from stat import S_ISDIR
+import logging
+import os
+import threading
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+#: The default number of most recent latencies that percentiles are
+#: computed over.
+DEFAULT_WINDOW = 1000
+
+#: The largest number of paths of a single synchronization whose latency is
+#: measured, which bounds the stat calls made after each synchronization.
+MAX_SAMPLES_PER_SYNC = 256
+
+#: How long, in seconds, before a change was first seen the modification
+#: time of its file may be and still be taken as the moment of the change.
+#: Older modification times, e.g. of files that were moved or copied with
+#: their times preserved, are ignored in favour of when the change was
+#: seen.
+MTIME_WINDOW = 60.0
+
+#: The percentiles that are reported.
+PERCENTILES = (50, 95, 99)
+
+#: Buckets of the latency histogram, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+CHANGE_LATENCY = metrics.registry.histogram(
+    "ronin_change_latency_seconds",
+    "Time from a change in the source to its synchronization.",
+    ("source",), LATENCY_BUCKETS)
+LATENCY_SLO_BREACHES = metrics.registry.counter(
+    "ronin_latency_slo_breaches_total",
+    "Changes that took longer than the latency objective to synchronize.",
+    ("source",))
+
+
+class LatencyTracker(object):
+    """
+    Tracks how long changes take to reach the destination, from the moment
+    a file was written to the moment the strategy finished synchronizing it,
+    and keeps a rolling window of those latencies for percentiles.
+
+    The moment a file was written is its modification time, as long as that
+    is no later than, and at most :data:`MTIME_WINDOW` seconds before, the
+    time its change was first seen; otherwise, e.g. for a moved file, or a
+    file on a shared folder whose clock is skewed, it is the time the change
+    was first seen. Paths that were only moved or deleted are measured from
+    when the move or deletion was seen. Changes without a time they were
+    seen, e.g. those found by the catch-up after a restart, are not
+    measured.
+
+    :param source: the source directory, used to label metrics and
+        messages.
+    :param slo: Optional. The latency, in seconds, within which changes
+        should be synchronized. A warning is logged for each synchronization
+        in which some changes took longer.
+    :param window: Optional. The number of most recent latencies that
+        percentiles are computed over.
+    :param stat: Optional. The function used to stat files.
+    """
+
+    def __init__(self, source, slo=None, window=DEFAULT_WINDOW, stat=os.stat):
+        #: The source directory.
+        self.source = source
+
+        #: The latency, in seconds, within which changes should be
+        #: synchronized, or `None`.
+        self.slo = slo
+
+        #: The number of changes that took longer than :attr:`slo`.
+        self.breaches = 0
+
+        self._stat = stat
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def origin(self, path, seen):
+        """
+        Return the moment of the change to a path that was seen at the given
+        time.
+
+        :param path: the path.
+        :param seen: the time at which the change was first seen.
+        """
+        try:
+            st = self._stat(path)
+        except OSError:
+            return seen
+        if S_ISDIR(st.st_mode):
+            return None
+        if seen - MTIME_WINDOW <= st.st_mtime <= seen:
+            return st.st_mtime
+        return seen
+
+    def record(self, changes, completed):
+        """
+        Record the latencies of the changes that a synchronization completed.
+
+        :param changes: the :class:`ChangeSet` that was synchronized.
+        :param completed: the time at which the synchronization completed.
+        :return: the latencies, in seconds.
+        """
+        seen = changes.seen
+        if not seen:
+            return []
+        latencies = []
+        slowest = (0, None)
+        for path in list(seen)[:MAX_SAMPLES_PER_SYNC]:
+            if path in changes.created or path in changes.modified:
+                origin = self.origin(path, seen[path])
+            elif path in changes.moved or path in changes.deleted:
+                origin = seen[path]
+            else:
+                continue
+            if origin is None:
+                continue
+            latency = max(completed - origin, 0)
+            latencies.append(latency)
+            slowest = max(slowest, (latency, path))
+        if not latencies:
+            return latencies
+
+        histogram = CHANGE_LATENCY.labels(self.source)
+        for latency in latencies:
+            histogram.observe(latency)
+        with self._lock:
+            self._samples.extend(latencies)
+        if self.slo is not None:
+            breaches = sum(1 for latency in latencies if latency > self.slo)
+            if breaches:
+                self.breaches += breaches
+                LATENCY_SLO_BREACHES.labels(self.source).inc(breaches)
+                logger.warning(
+                    "{0} of {1} change(s) took longer than {2:.3f}s to "
+                    "synchronize, the slowest '{3}' {4:.3f}s ({5})".format(
+                        breaches, len(latencies), self.slo, slowest[1],
+                        slowest[0], self.summary()))
+        logger.debug("Change latency: {0}".format(self.summary()))
+        return latencies
+
+    def percentiles(self):
+        """
+        Return the 50th, 95th and 99th percentile of the recent latencies, in
+        seconds, keyed by percentile, or an empty dictionary if none were
+        recorded.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {}
+        last = len(samples) - 1
+        return dict((p, samples[min(int(len(samples) * p / 100.0), last)])
+                    for p in PERCENTILES)
+
+    def summary(self):
+        """
+        Return a description of the recent latency percentiles.
+        """
+        percentiles = self.percentiles()
+        if not percentiles:
+            return "no changes measured"
+        return ", ".join("p{0}={1:.3f}s".format(p, percentiles[p])
+                         for p in PERCENTILES)
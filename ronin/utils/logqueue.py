@@ -0,0 +1,234 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+:module: ronin.utils.logqueue
+:synopsis: Non-blocking logging through a queue and a background writer.
+
+Classes
+-------
+.. autoclass:: BackgroundHandler
+   :members:
+   :show-inheritance:
+
+.. autoclass:: RateLimitFilter
+   :members:
+   :show-inheritance:
+"""
+
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    QueueHandler = None
+    QueueListener = None
+
+#: The default number of records that may wait to be written; records
+#: logged while the queue is full are dropped rather than waited for.
+DEFAULT_CAPACITY = 10000
+
+#: The default number of records per second that each call site may log at
+#: or below the rate-limited level.
+DEFAULT_RATE = 20
+
+
+if QueueHandler is None:
+    class QueueHandler(logging.Handler):
+        """
+        Hands records to a queue. Provided for Python 2, whose
+        :mod:`logging.handlers` does not have one.
+        """
+
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def enqueue(self, record):
+            self.queue.put_nowait(record)
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.enqueue(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        """
+        Writes the records of a queue to handlers on a background thread.
+        Provided for Python 2, whose :mod:`logging.handlers` does not have
+        one.
+        """
+
+        _sentinel = None
+
+        def __init__(self, queue, *handlers):
+            self.queue = queue
+            self.handlers = handlers
+            self.respect_handler_level = False
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor, name="ronin-logging")
+            self._thread.daemon = True
+            self._thread.start()
+
+        def handle(self, record):
+            for handler in self.handlers:
+                if not self.respect_handler_level or record.levelno >= handler.level:
+                    handler.handle(record)
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get(True)
+                if record is self._sentinel:
+                    break
+                self.handle(record)
+
+        def stop(self):
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Hands records to a queue, from which a background thread writes them to
+    the target handlers, so that logging never waits for the disk.
+
+    Records are not formatted until they are written, so that the thread
+    logging them does not pay for it either. If the queue is full, records
+    are dropped rather than waited for, and how many were dropped is logged
+    once there is room again.
+
+    :param handlers: the handlers that records are written to.
+    :param capacity: Optional. The number of records that may wait to be
+        written. Default: `10000`.
+    """
+
+    def __init__(self, handlers, capacity=DEFAULT_CAPACITY):
+        QueueHandler.__init__(self, queue.Queue(capacity))
+
+        #: The number of records dropped because the queue was full, since
+        #: the last time it was reported.
+        self.dropped = 0
+
+        self._listener = QueueListener(self.queue, *handlers)
+        self._listener.respect_handler_level = True
+        self._listener.start()
+        self._closed = False
+
+    @property
+    def handlers(self):
+        """
+        The handlers that records are written to.
+        """
+        return self._listener.handlers
+
+    def prepare(self, record):
+        # Records stay in this process, so they need not be formatted (or
+        # made picklable) before they are queued.
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                dropped = logging.LogRecord(record.name, logging.WARNING, __file__, 0,
+                                            "Dropped %d log message(s) because the log queue was full",
+                                            (self.dropped,), None)
+                self.queue.put_nowait(dropped)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Write the records that are still queued, then close the target
+        handlers.
+        """
+        if not self._closed:
+            self._closed = True
+            self._listener.stop()
+            for handler in self.handlers:
+                handler.close()
+        QueueHandler.close(self)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits how many records each call site may log per second at or below a
+    level, e.g. the debug messages logged for every file system event, so
+    that a storm of events does not become a storm of log writes. The
+    number of records suppressed is appended to the next record that is let
+    through from the same call site.
+
+    :param rate: Optional. The number of records per second that each call
+        site may log. Default: `20`.
+    :param level: Optional. The highest level that is rate-limited; records
+        above it are always let through. Default: `logging.DEBUG`.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, level=logging.DEBUG):
+        logging.Filter.__init__(self)
+
+        #: The number of records per second that each call site may log.
+        self.rate = rate
+
+        #: The highest level that is rate-limited.
+        self.level = level
+
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = int(time.time())
+        with self._lock:
+            window, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if window != now:
+                window, count = now, 0
+            if count >= self.rate:
+                self._windows[key] = (window, count, suppressed + 1)
+                return False
+            self._windows[key] = (window, count + 1, 0)
+        if suppressed:
+            record.msg = "{0} ({1} similar message(s) suppressed)".format(record.getMessage(), suppressed)
+            record.args = None
+        return True
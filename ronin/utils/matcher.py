@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:module: ronin.utils.matcher
+:synopsis: Compiled matching of manifest exclusion patterns.
+
+The exclusions listed in a manifest follow the rsync/gitignore conventions:
+
+* A pattern without a slash, e.g. ``node_modules`` or ``*.pyc``, matches an
+  entry with that name at any depth.
+* A pattern with a leading slash, e.g. ``/build``, is anchored to the
+  source directory.
+* A pattern with a slash elsewhere, e.g. ``docs/_build``, matches the end of
+  the path relative to the source directory.
+* A pattern with a trailing slash, e.g. ``cache/``, matches directories only.
+* ``*`` matches anything but a slash, ``**`` matches anything, ``**/``
+  matches zero or more directories, ``?`` matches a single character other
+  than a slash and ``[...]`` matches a character class.
+
+Patterns are compiled once: literal names are kept in sets and the
+remaining patterns are combined into a single regular expression per rule
+kind, so checking an entry costs a constant number of lookups and checking
+a whole path costs one check per path component.
+
+Classes
+-------
+.. autoclass:: ExclusionMatcher
+   :members:
+   :show-inheritance:
+
+"""
+
+import os
+import re
+
+
+def translate(pattern):
+    """
+    Translate a glob pattern into a regular expression, without anchors.
+
+    :param pattern: the glob pattern.
+    """
+    i, n = 0, len(pattern)
+    result = []
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            if i < n and pattern[i] == "*":
+                i += 1
+                if i < n and pattern[i] == "/":
+                    # "a/**/b" also matches "a/b".
+                    i += 1
+                    result.append("(?:.*/)?")
+                else:
+                    result.append(".*")
+            else:
+                result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+            if j >= n:
+                result.append("\\[")
+            else:
+                stuff = pattern[i:j].replace("\\", "\\\\")
+                i = j + 1
+                if stuff[0] in "!^":
+                    stuff = "^" + stuff[1:]
+                result.append("[" + stuff + "]")
+        else:
+            result.append(re.escape(c))
+    return "".join(result)
+
+
+def _compile(expressions):
+    if not expressions:
+        return None
+    return re.compile("|".join("(?:{0})\\Z".format(e) for e in expressions))
+
+
+class ExclusionMatcher(object):
+    """
+    Matches paths beneath a root directory against a list of exclusion
+    patterns.
+
+    :param patterns: The exclusion patterns, e.g. the manifest's `exclude`.
+    :param root: The directory that anchored patterns are relative to.
+    """
+
+    def __init__(self, patterns, root):
+        #: The directory that anchored patterns are relative to.
+        self.root = os.path.abspath(root)
+        self._root_prefix = os.path.join(self.root, "")
+
+        names = (set(), set())
+        name_expressions = ([], [])
+        path_expressions = ([], [])
+        for pattern in patterns or ():
+            pattern = str(pattern).strip()
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            anchored = pattern.startswith("/")
+            pattern = pattern.lstrip("/")
+            if not pattern:
+                continue
+            if anchored or "/" in pattern:
+                prefix = "^" if anchored else "(?:^|.*/)"
+                path_expressions[dir_only].append(prefix + translate(pattern))
+            elif any(c in pattern for c in "*?["):
+                name_expressions[dir_only].append(translate(pattern))
+            else:
+                names[dir_only].add(pattern)
+
+        #: The literal names that are excluded, for any entry and for
+        #: directories only.
+        self._names, self._dir_names = names
+
+        #: The compiled name and relative path expressions, for any entry
+        #: and for directories only.
+        self._name_regex, self._dir_name_regex = [_compile(e) for e in name_expressions]
+        self._path_regex, self._dir_path_regex = [_compile(e) for e in path_expressions]
+
+    def __nonzero__(self):
+        return bool(self._names or self._dir_names or self._name_regex or
+                    self._dir_name_regex or self._path_regex or self._dir_path_regex)
+
+    __bool__ = __nonzero__
+
+    @property
+    def has_directory_rules(self):
+        """
+        Whether any pattern applies to directories only.
+        """
+        return bool(self._dir_names or self._dir_name_regex or self._dir_path_regex)
+
+    def relative_path(self, path):
+        """
+        Return the path relative to the root, with forward slashes, or
+        `None` if the path is the root or lies outside of it.
+
+        :param path: the absolute path.
+        """
+        if not path.startswith(self._root_prefix):
+            return None
+        relative_path = path[len(self._root_prefix):]
+        if os.sep != "/":
+            relative_path = relative_path.replace(os.sep, "/")
+        return relative_path.rstrip("/") or None
+
+    def match_entry(self, relative_path, name, is_dir=None):
+        """
+        Return whether a single entry is excluded, without considering its
+        parent directories.
+
+        :param relative_path: the entry's path relative to the root, with
+            forward slashes.
+        :param name: the entry's name.
+        :param is_dir: Optional. Whether the entry is a directory. If `None`,
+            patterns that apply to directories only are not considered.
+        """
+        if name in self._names:
+            return True
+        if self._name_regex is not None and self._name_regex.match(name):
+            return True
+        if self._path_regex is not None and self._path_regex.match(relative_path):
+            return True
+        if is_dir:
+            if name in self._dir_names:
+                return True
+            if self._dir_name_regex is not None and self._dir_name_regex.match(name):
+                return True
+            if self._dir_path_regex is not None and self._dir_path_regex.match(relative_path):
+                return True
+        return False
+
+    def match_path(self, path, is_dir=None):
+        """
+        Return whether an entry, which was reached without passing through
+        an excluded directory, is excluded. This is how a walker prunes
+        excluded subtrees before listing them.
+
+        :param path: the absolute path of the entry.
+        :param is_dir: Optional. Whether the entry is a directory.
+        """
+        relative_path = self.relative_path(path)
+        if relative_path is None:
+            return False
+        name = relative_path.rpartition("/")[2]
+        return self.match_entry(relative_path, name, is_dir)
+
+    def match(self, path, is_dir=False):
+        """
+        Return whether a path is excluded, either itself or because one of
+        its parent directories beneath the root is excluded.
+
+        :param path: the absolute path.
+        :param is_dir: Optional. Whether the path is a directory.
+        """
+        relative_path = self.relative_path(path)
+        if relative_path is None:
+            return False
+        names = relative_path.split("/")
+        last = len(names) - 1
+        end = -1
+        for i, name in enumerate(names):
+            end += len(name) + 1
+            if self.match_entry(relative_path[:end], name, is_dir if i == last else True):
+                return True
+        return False
@@ -0,0 +1,154 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+:module: ronin.utils.settle
+:synopsis: Detection of files that are still being written.
+
+Classes
+-------
+.. autoclass:: WriteSettler
+   :members:
+   :show-inheritance:
+"""
+
+from ronin.utils.changeset import ChangeSet
+import logging
+import os
+import time
+
+#: The logging apparatus.
+logger = logging.getLogger(__name__)
+
+
+class WriteSettler(object):
+    """
+    Holds back files that are still being written, so that a file is not
+    synchronized (perhaps truncated) after each of the writes that an editor
+    or build tool makes, but once, after the last.
+
+    A created or modified file is considered settled once its modification
+    time is at least ``interval`` seconds old, i.e. it has not been written
+    for that long; once its size and modification time have been seen
+    unchanged for ``interval`` seconds (which copes with coarse or skewed
+    modification times, e.g. on shared folders); or once a close-after-write
+    event has been reported for it by an observer that supports them.
+
+    :param interval: The time, in seconds, that a file must not have been
+        written to before it is synchronized.
+    :param stat: Optional. The function used to stat files.
+    """
+
+    def __init__(self, interval, stat=os.stat):
+        #: The time, in seconds, that a file must not have been written to.
+        self.interval = interval
+
+        #: The changes that are held back.
+        self.held = ChangeSet()
+
+        self._stat = stat
+        self._signatures = {}
+        self._recheck_scheduled = False
+
+    def hold(self, changes):
+        """
+        Move the files that are still being written from the change set to
+        the held changes.
+
+        :param changes: the :class:`ChangeSet`. The files that are still
+            being written are removed from it.
+        :return: the time, in seconds, after which the held changes should
+            be checked again with :meth:`release`, or `None` if nothing was
+            held or a check is already due.
+        """
+        self.release_closed(changes)
+        delay = 0
+        now = time.time()
+        for path in changes.deleted:
+            self._signatures.pop(path, None)
+        for path in list(changes.created | changes.modified):
+            if path in changes.directories or path in changes.closed:
+                self._signatures.pop(path, None)
+                continue
+            try:
+                st = self._stat(path)
+            except OSError:
+                # Removed since; the strategy copes with missing paths.
+                continue
+            # The time since which the size and modification time have been
+            # seen unchanged.
+            signature = (st.st_size, st.st_mtime)
+            previous_signature, since = self._signatures.get(path, (None, now))
+            if previous_signature != signature:
+                since = now
+            remaining = self.interval - (now - min(st.st_mtime, since))
+            if remaining <= 0:
+                self._signatures.pop(path, None)
+                continue
+            self._signatures[path] = (signature, since)
+            if path in changes.created:
+                self.held.add_created(path)
+            else:
+                self.held.add_modified(path)
+            self.held.mark_seen(path, changes.seen.pop(path, None))
+            changes.created.discard(path)
+            changes.modified.discard(path)
+            delay = max(delay, remaining)
+        if not delay or self._recheck_scheduled:
+            return None
+        logger.debug("Holding {0} file(s) that are still being written for {1:.3f}s".format(len(self.held), delay))
+        self._recheck_scheduled = True
+        return delay
+
+    def release_closed(self, changes):
+        """
+        Move the held files that the change set reports as closed after
+        being written back to it, so that they are synchronized without
+        waiting for the interval. The close event of a file usually arrives
+        in a later batch than its writes.
+
+        :param changes: the :class:`ChangeSet`.
+        """
+        for path in changes.closed & (self.held.created | self.held.modified):
+            self._signatures.pop(path, None)
+            if path in self.held.created:
+                self.held.created.discard(path)
+                changes.created.add(path)
+            else:
+                self.held.modified.discard(path)
+                # Not add_modified(), which would forget that it was closed.
+                changes.modified.add(path)
+            changes.mark_seen(path, self.held.seen.pop(path, None))
+
+    def release(self):
+        """
+        Return the held changes, to be checked again with :meth:`hold`.
+        """
+        held = self.held
+        self.held = ChangeSet()
+        self._recheck_scheduled = False
+        return held
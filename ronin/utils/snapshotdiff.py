@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:module: ronin.utils.snapshotdiff
+:synopsis: Sort-merge comparison of directory snapshots.
+
+``DirectorySnapshotDiff`` compares snapshots with set operations and a
+method call per path and field. The :class:`MergeSnapshotDiff` instead
+walks the path-sorted columns of both snapshots in a single merge pass:
+
+* The common leading and trailing runs of paths are found by comparing
+  slices of the path lists a chunk at a time. Consecutive snapshots share
+  interned path strings, so these comparisons are mostly identity checks
+  done in C.
+* Within those runs, the inode, device, size and modification time
+  columns are compared a chunk at a time in the same way, and only chunks
+  that differ are examined entry by entry.
+* Only the remaining middle section is merged entry by entry.
+
+An idle tree therefore costs a handful of slice comparisons per
+``CHUNK_SIZE`` entries. Moves are detected by inode among the created and
+deleted entries.
+
+Classes
+-------
+.. autoclass:: MergeSnapshotDiff
+   :members:
+   :show-inheritance:
+
+"""
+
+from stat import S_ISDIR
+
+#: The number of entries compared at once when looking for differences.
+CHUNK_SIZE = 1024
+
+
+def _common_prefix(a, b, a_start, b_start, limit):
+    """
+    Return the number of equal items at the start of ``a[a_start:]`` and
+    ``b[b_start:]``, up to ``limit``.
+    """
+    k = 0
+    while k + CHUNK_SIZE <= limit and \
+            a[a_start + k:a_start + k + CHUNK_SIZE] == b[b_start + k:b_start + k + CHUNK_SIZE]:
+        k += CHUNK_SIZE
+    while k < limit and a[a_start + k] == b[b_start + k]:
+        k += 1
+    return k
+
+
+def _common_suffix(a, b, a_end, b_end, limit):
+    """
+    Return the number of equal items at the end of ``a[:a_end]`` and
+    ``b[:b_end]``, up to ``limit``.
+    """
+    k = 0
+    while k + CHUNK_SIZE <= limit and \
+            a[a_end - k - CHUNK_SIZE:a_end - k] == b[b_end - k - CHUNK_SIZE:b_end - k]:
+        k += CHUNK_SIZE
+    while k < limit and a[a_end - k - 1] == b[b_end - k - 1]:
+        k += 1
+    return k
+
+
+def _differing_offsets(columns, a_start, b_start, length):
+    """
+    Yield the offsets within an aligned run of entries at which any of the
+    given ``(a, b)`` column pairs differ.
+    """
+    for start in range(0, length, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, length)
+        for a, b in columns:
+            if a[a_start + start:a_start + end] != b[b_start + start:b_start + end]:
+                break
+        else:
+            continue
+        for k in range(start, end):
+            for a, b in columns:
+                if a[a_start + k] != b[b_start + k]:
+                    yield k
+                    break
+
+
+class MergeSnapshotDiff(object):
+    """
+    Compares two directory snapshots with a single merge pass over their
+    path-sorted columns.
+
+    Both snapshots must provide a ``columns()`` method returning the
+    ``(paths, inodes, devices, modes, sizes, mtimes)`` sequences of their
+    entries, sorted by path. The result has the same attributes as
+    ``DirectorySnapshotDiff``, and an entry is modified if its size or
+    modification time changed. A moved entry that was also modified is
+    reported as modified at its new path.
+
+    :param ref:
+        The reference directory snapshot.
+    :param snapshot:
+        The directory snapshot which will be compared
+        with the reference snapshot.
+    :param by_path:
+        Optional. Whether entries are identified by their path alone rather
+        than by their inode and device, e.g. because the file system was
+        mounted again with new device (and perhaps inode) numbers. Moves
+        are then reported as deletions and creations, and an entry is only
+        replaced if its type changed. Default: `False`.
+    """
+
+    def __init__(self, ref, snapshot, by_path=False):
+        ref_paths, ref_ino, ref_dev, ref_mode, ref_size, ref_mtime = ref.columns()
+        paths, ino, dev, mode, size, mtime = snapshot.columns()
+        n, m = len(ref_paths), len(paths)
+        created, deleted, modified, moved = [], [], [], []
+
+        def compare(i, j):
+            if by_path:
+                replaced = S_ISDIR(ref_mode[i]) != S_ISDIR(mode[j])
+            else:
+                replaced = ref_ino[i] != ino[j] or ref_dev[i] != dev[j]
+            if replaced:
+                created.append(j)
+                deleted.append(i)
+            elif ref_mtime[i] != mtime[j] or ref_size[i] != size[j]:
+                modified.append(j)
+
+        if by_path:
+            columns = ((ref_mode, mode), (ref_mtime, mtime), (ref_size, size))
+        else:
+            columns = ((ref_ino, ino), (ref_dev, dev), (ref_mtime, mtime), (ref_size, size))
+
+        #: Leading run of equal paths.
+        prefix = _common_prefix(ref_paths, paths, 0, 0, min(n, m))
+        for k in _differing_offsets(columns, 0, 0, prefix):
+            compare(k, k)
+
+        #: Trailing run of equal paths.
+        suffix = _common_suffix(ref_paths, paths, n, m, min(n, m) - prefix)
+        for k in _differing_offsets(columns, n - suffix, m - suffix, suffix):
+            compare(n - suffix + k, m - suffix + k)
+
+        #: Merge the paths in between.
+        i, j = prefix, prefix
+        ref_end, end = n - suffix, m - suffix
+        while i < ref_end and j < end:
+            ref_path, path = ref_paths[i], paths[j]
+            if ref_path == path:
+                compare(i, j)
+                i += 1
+                j += 1
+            elif ref_path < path:
+                deleted.append(i)
+                i += 1
+            else:
+                created.append(j)
+                j += 1
+        deleted.extend(range(i, ref_end))
+        created.extend(range(j, end))
+
+        #: Pair deleted and created entries that share an inode.
+        if deleted and created and not by_path:
+            deleted_by_inode = dict(((ref_ino[i], ref_dev[i]), i) for i in deleted)
+            moved_from, moved_to = set(), set()
+            for j in created:
+                i = deleted_by_inode.pop((ino[j], dev[j]), None)
+                if i is not None:
+                    moved.append((i, j))
+                    moved_from.add(i)
+                    moved_to.add(j)
+                    if ref_mtime[i] != mtime[j] or ref_size[i] != size[j]:
+                        modified.append(j)
+            if moved:
+                created = [j for j in created if j not in moved_to]
+                deleted = [i for i in deleted if i not in moved_from]
+
+        self._dirs_created = [paths[j] for j in created if S_ISDIR(mode[j])]
+        self._files_created = [paths[j] for j in created if not S_ISDIR(mode[j])]
+        self._dirs_deleted = [ref_paths[i] for i in deleted if S_ISDIR(ref_mode[i])]
+        self._files_deleted = [ref_paths[i] for i in deleted if not S_ISDIR(ref_mode[i])]
+        self._dirs_modified = [paths[j] for j in modified if S_ISDIR(mode[j])]
+        self._files_modified = [paths[j] for j in modified if not S_ISDIR(mode[j])]
+        self._dirs_moved = [(ref_paths[i], paths[j]) for i, j in moved if S_ISDIR(ref_mode[i])]
+        self._files_moved = [(ref_paths[i], paths[j]) for i, j in moved if not S_ISDIR(ref_mode[i])]
+
+    @property
+    def files_created(self):
+        """List of files that were created."""
+        return self._files_created
+
+    @property
+    def files_deleted(self):
+        """List of files that were deleted."""
+        return self._files_deleted
+
+    @property
+    def files_modified(self):
+        """List of files that were modified."""
+        return self._files_modified
+
+    @property
+    def files_moved(self):
+        """
+        List of files that were moved.
+
+        Each event is a two-tuple the first item of which is the path
+        that has been renamed to the second item in the tuple.
+        """
+        return self._files_moved
+
+    @property
+    def dirs_modified(self):
+        """
+        List of directories that were modified.
+        """
+        return self._dirs_modified
+
+    @property
+    def dirs_moved(self):
+        """
+        List of directories that were moved.
+
+        Each event is a two-tuple the first item of which is the path
+        that has been renamed to the second item in the tuple.
+        """
+        return self._dirs_moved
+
+    @property
+    def dirs_deleted(self):
+        """
+        List of directories that were deleted.
+        """
+        return self._dirs_deleted
+
+    @property
+    def dirs_created(self):
+        """
+        List of directories that were created.
+        """
+        return self._dirs_created
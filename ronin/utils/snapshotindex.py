@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+:module: ronin.utils.snapshotindex
+:synopsis: Persistence of directory snapshots between runs.
+
+A snapshot index records the state of a source directory at the time it
+was last synchronized, so that a restarted watcher only needs to transfer
+what changed while it was not running.
+
+The index is a compact binary file: a fixed header, followed by the root
+directory and one fixed-size record per entry (inode, device, mode, size
+and modification time) followed by the entry's path relative to the root.
+It is read through a memory map and written to a temporary file that is
+renamed into place, so a crash never leaves a truncated index behind.
+
+Classes
+-------
+.. autoclass:: SnapshotIndex
+   :members:
+   :show-inheritance:
+
+"""
+
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot, StatInfo
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+#: The magic number identifying a snapshot index file.
+MAGIC = b"RONINIDX"
+
+#: The version of the index file format.
+VERSION = 1
+
+#: Magic number, format version, time of the last full synchronization (or
+#: -1 if unknown), time the snapshot was taken and the number of records.
+_HEADER = struct.Struct("<8sHddQ")
+
+#: Inode, device, mode, size, modification time and the length of the path
+#: that follows the record.
+_RECORD = struct.Struct("<QQIQdH")
+
+#: The length of the root path that follows the header.
+_LENGTH = struct.Struct("<H")
+
+_ENCODING = sys.getfilesystemencoding()
+
+
+def _encode(path):
+    if isinstance(path, bytes):
+        return path
+    try:
+        return path.encode(_ENCODING, "surrogateescape")
+    except LookupError:
+        return path.encode(_ENCODING)
+
+
+def _decode(data, like):
+    if isinstance(like, bytes):
+        return bytes(data)
+    try:
+        return data.decode(_ENCODING, "surrogateescape")
+    except LookupError:
+        return data.decode(_ENCODING)
+
+
+class SnapshotIndex(object):
+    """
+    A persisted snapshot of a source directory.
+
+    :param filename: The path of the index file.
+    :param root: The source directory that the snapshot was taken of.
+    """
+
+    def __init__(self, filename, root):
+        #: The path of the index file.
+        self.filename = filename
+
+        #: The source directory that the snapshot was taken of.
+        self.root = root
+
+    def __repr__(self):
+        return "<SnapshotIndex(filename='{0}', root='{1}')>".format(self.filename, self.root)
+
+    @classmethod
+    def for_manifest(cls, statedir, source, manifest):
+        """
+        Return the index for the given source directory and manifest within
+        the state directory. Each combination of source, strategy type and
+        destination has its own index.
+
+        :param statedir: the directory that indexes are stored in.
+        :param source: the source directory.
+        :param manifest: the :class:`Manifest` for the source directory.
+        """
+        key = "\0".join([os.path.abspath(source), str(manifest.type), str(manifest.destination)])
+        digest = hashlib.sha1(_encode(key)).hexdigest()
+        return cls(os.path.join(statedir, digest + ".idx"), source)
+
+    def load(self, snapshot_class=DiscriminatedDirectorySnapshot):
+        """
+        Load the persisted snapshot.
+
+        :param snapshot_class: Optional. The snapshot class to load the
+            snapshot as; it must provide ``from_stat_info``.
+
+        :returns:
+            A ``(snapshot, last_full_sync)`` tuple, where ``last_full_sync``
+            is the time of the last full synchronization or ``None``, or
+            ``None`` if there is no usable index.
+        """
+        try:
+            with open(self.filename, "rb") as f:
+                if os.fstat(f.fileno()).st_size < _HEADER.size:
+                    return None
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError) as e:
+            logger.debug("No snapshot index loaded from {0}: {1}".format(self.filename, e))
+            return None
+
+        try:
+            magic, version, last_full_sync, timestamp, count = _HEADER.unpack_from(buf, 0)
+            if magic != MAGIC or version != VERSION:
+                logger.warning("Ignoring snapshot index with unknown format: {0}".format(self.filename))
+                return None
+            offset = _HEADER.size
+            length, = _LENGTH.unpack_from(buf, offset)
+            offset += _LENGTH.size
+            root = _decode(buf[offset:offset + length], self.root)
+            offset += length
+            if root != os.path.abspath(self.root):
+                logger.warning("Ignoring snapshot index of another directory: {0}".format(root))
+                return None
+
+            stat_info = {self.root: None}
+            join = os.path.join
+            unpack_from = _RECORD.unpack_from
+            record_size = _RECORD.size
+            for _ in range(count):
+                ino, dev, mode, size, mtime, length = unpack_from(buf, offset)
+                offset += record_size
+                relative_path = _decode(buf[offset:offset + length], self.root)
+                offset += length
+                path = join(self.root, relative_path) if relative_path else self.root
+                stat_info[path] = StatInfo(mode, ino, dev, size, mtime)
+        except struct.error:
+            logger.warning("Ignoring truncated snapshot index: {0}".format(self.filename))
+            return None
+        finally:
+            buf.close()
+
+        if stat_info[self.root] is None:
+            return None
+        snapshot = snapshot_class.from_stat_info(stat_info, timestamp)
+        if last_full_sync < 0:
+            last_full_sync = None
+        return snapshot, last_full_sync
+
+    def save(self, snapshot, last_full_sync=None):
+        """
+        Persist the snapshot.
+
+        :param snapshot: the snapshot of the source directory.
+        :param last_full_sync: Optional. The time of the last full
+            synchronization.
+        """
+        directory = os.path.dirname(self.filename)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+        root = self.root
+        prefix = os.path.join(root, "")
+        count = len(snapshot.paths)
+        temporary = "{0}.{1}.tmp".format(self.filename, os.getpid())
+        with open(temporary, "wb") as f:
+            encoded_root = _encode(os.path.abspath(root))
+            f.write(_HEADER.pack(MAGIC, VERSION,
+                                 -1 if last_full_sync is None else last_full_sync,
+                                 getattr(snapshot, "_timestamp", 0), count))
+            f.write(_LENGTH.pack(len(encoded_root)))
+            f.write(encoded_root)
+            pack = _RECORD.pack
+            for path, st in snapshot.entries():
+                relative_path = _encode(path[len(prefix):] if path.startswith(prefix) else b"")
+                f.write(pack(st.st_ino, st.st_dev, st.st_mode, st.st_size, st.st_mtime, len(relative_path)))
+                f.write(relative_path)
+        os.rename(temporary, self.filename)
+        logger.debug("Saved snapshot index of {0} entries to {1}".format(count, self.filename))
@@ -93,6 +93,7 @@ dist = setup(
     entry_points={
         "console_scripts": [
             "ronin = ronin.__main__:main",
+            "ronin-bench = ronin.bench:main",
         ],
     },
 )
@@ -0,0 +1,211 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import Ronin
+from ronin.utils.changeset import EVENT_TYPE_CLOSED
+from watchdog.events import FileCreatedEvent, FileSystemEvent
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from ronin.aio import AsyncRonin, AsyncWatch, _LoopEventHandler
+
+#: How long to wait for a change to be synchronized, in seconds.
+TIMEOUT = 10
+
+
+class FileClosedEvent(FileSystemEvent):
+
+    event_type = EVENT_TYPE_CLOSED
+    is_directory = False
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio watching requires Python 3.5 or later")
+class AsyncTestCase(unittest.TestCase):
+    """
+    Watches a source directory with the native strategy from an event loop
+    that the test runs in steps.
+    """
+
+    manifest = {}
+
+    #: Whether the source directory is polled rather than observed.
+    poll = True
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "src")
+        self.target = os.path.join(self.root, "dst")
+        os.mkdir(self.source)
+        os.mkdir(self.target)
+        manifest = {"type": "native", "path": self.target, "exclude": ["*.log"], "delete": True,
+                    "incremental": True, "debounce_ms": 10, "poll_min_ms": 20, "poll_max_ms": 50}
+        manifest.update(self.manifest)
+        with open(os.path.join(self.source, "ronin.json"), "w") as f:
+            json.dump(manifest, f)
+        self.write("a.txt", "a")
+        self.ronin = Ronin(self.source, poll=self.poll, statedir=os.path.join(self.root, "state"))
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        self.ronin.strategy.close()
+        shutil.rmtree(self.root)
+
+    def write(self, name, data):
+        with open(os.path.join(self.source, name), "w") as f:
+            f.write(data)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.target, name)) as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def run_until(self, predicate, timeout=TIMEOUT):
+        """
+        Run the event loop until the predicate holds, failing if it does
+        not within the timeout.
+        """
+        deadline = time.time() + timeout
+        while not predicate():
+            if time.time() > deadline:
+                self.fail("Timed out waiting for the change to be synchronized")
+            self.loop.run_until_complete(asyncio.sleep(0.02))
+
+
+class TestAsyncWatch(AsyncTestCase):
+
+    def setUp(self):
+        super(TestAsyncWatch, self).setUp()
+        self.watch = AsyncWatch(self.ronin, self.loop)
+        self.loop.run_until_complete(self.watch.start())
+
+    def stop(self):
+        self.loop.run_until_complete(self.watch.take_final_snapshot())
+        self.loop.run_until_complete(self.watch.stop())
+
+    def test_catches_up_on_start(self):
+        self.stop()
+        self.assertEqual(self.read("a.txt"), "a")
+        self.assertTrue(os.path.exists(self.ronin.snapshot_index.filename))
+
+    def test_polled_changes(self):
+        self.write("b.txt", "b")
+        self.run_until(lambda: self.read("b.txt") == "b")
+        self.write("a.txt", "changed")
+        self.run_until(lambda: self.read("a.txt") == "changed")
+        os.remove(os.path.join(self.source, "b.txt"))
+        self.run_until(lambda: not os.path.exists(os.path.join(self.target, "b.txt")))
+        self.stop()
+        self.assertEqual(self.watch.failures, 0)
+
+    def test_atomic_save(self):
+        self.write(".a.txt.tmp", "saved")
+        os.rename(os.path.join(self.source, ".a.txt.tmp"), os.path.join(self.source, "a.txt"))
+        self.run_until(lambda: self.read("a.txt") == "saved")
+        self.stop()
+
+    def test_observed_events_are_handed_to_the_loop(self):
+        handler = _LoopEventHandler(self.watch)
+        included = os.path.join(self.source, "b.txt")
+        excluded = os.path.join(self.source, "b.log")
+        handler.dispatch(FileCreatedEvent(included))
+        handler.dispatch(FileCreatedEvent(excluded))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(self.watch._pending.created, set([included]))
+        self.stop()
+
+    def test_changes_made_before_stopping_are_synchronized(self):
+        self.write("b.txt", "b")
+        self.stop()
+        self.assertEqual(self.read("b.txt"), "b")
+
+
+class TestAsyncWatchSettling(AsyncTestCase):
+
+    manifest = {"settle_ms": 60000}
+
+    def test_late_close_releases_the_file(self):
+        watch = AsyncWatch(self.ronin, self.loop)
+        self.loop.run_until_complete(watch.start())
+        path = os.path.join(self.source, "a.txt")
+        self.write("a.txt", "changed")
+        # Polling reports the write; a modification reported after the
+        # close would mean that the file is being written again.
+        self.run_until(lambda: watch.snapshot.stat_info(path).st_size == len("changed") and
+                       watch.settler.held)
+        self.assertEqual(self.read("a.txt"), "a")
+        watch.add_event(FileClosedEvent(path))
+        self.run_until(lambda: self.read("a.txt") == "changed")
+        self.assertFalse(watch.settler.held)
+        self.loop.run_until_complete(watch.take_final_snapshot())
+        self.loop.run_until_complete(watch.stop())
+
+
+class TestAsyncRonin(AsyncTestCase):
+
+    def test_run_until_interrupted(self):
+        def interrupt():
+            # The loop only handles the signal once it is running, which it
+            # is by the time the initial synchronization has been made.
+            deadline = time.time() + TIMEOUT
+            while self.read("a.txt") is None and time.time() < deadline:
+                time.sleep(0.02)
+            self.write("b.txt", "b")
+            time.sleep(0.2)
+            os.kill(os.getpid(), signal.SIGINT)
+
+        thread = threading.Thread(target=interrupt)
+        thread.start()
+        try:
+            AsyncRonin([self.ronin]).run()
+        finally:
+            thread.join()
+        self.assertEqual(self.read("a.txt"), "a")
+        self.assertEqual(self.read("b.txt"), "b")
+
+
+
+class TestAsyncRoninObserver(TestAsyncRonin):
+
+    poll = False
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin.utils.changeset import ChangeSet
+from ronin.utils.compactsnapshot import CompactDirectorySnapshot
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+from watchdog.events import (
+    DirCreatedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent
+)
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class Diff(object):
+    """
+    A directory snapshot diff with the given changes.
+    """
+
+    def __init__(self, **changes):
+        for name in ("files_created", "files_modified", "files_deleted", "files_moved",
+                     "dirs_created", "dirs_modified", "dirs_deleted", "dirs_moved"):
+            setattr(self, name, changes.get(name, []))
+
+
+class TestChangeSetEvents(unittest.TestCase):
+
+    def test_created_then_deleted_is_nothing(self):
+        changes = ChangeSet.from_events([FileCreatedEvent("/src/a"), FileDeletedEvent("/src/a")])
+        self.assertFalse(changes)
+
+    def test_modified_then_deleted_is_deleted(self):
+        changes = ChangeSet.from_events([FileModifiedEvent("/src/a"), FileDeletedEvent("/src/a")])
+        self.assertEqual(changes.deleted, set(["/src/a"]))
+        self.assertEqual(changes.updated_paths, set())
+
+    def test_created_then_modified_is_created(self):
+        changes = ChangeSet.from_events([FileCreatedEvent("/src/a"), FileModifiedEvent("/src/a")])
+        self.assertEqual(changes.created, set(["/src/a"]))
+        self.assertEqual(changes.modified, set())
+
+    def test_moved_twice_is_moved_once(self):
+        changes = ChangeSet.from_events([FileMovedEvent("/src/a", "/src/b"), FileMovedEvent("/src/b", "/src/c")])
+        self.assertEqual(changes.moved, {"/src/c": "/src/a"})
+
+    def test_moved_back_is_nothing(self):
+        changes = ChangeSet.from_events([FileMovedEvent("/src/a", "/src/b"), FileMovedEvent("/src/b", "/src/a")])
+        self.assertFalse(changes)
+
+    def test_created_then_moved_is_created_at_destination(self):
+        changes = ChangeSet.from_events([FileCreatedEvent("/src/.a.tmp"), FileMovedEvent("/src/.a.tmp", "/src/a")])
+        self.assertEqual(changes.created, set(["/src/a"]))
+        self.assertEqual(changes.removed_paths, set())
+
+    def test_moved_then_deleted_deletes_the_origin(self):
+        changes = ChangeSet.from_events([FileMovedEvent("/src/a", "/src/b"), FileDeletedEvent("/src/b")])
+        self.assertEqual(changes.deleted, set(["/src/a"]))
+        self.assertEqual(changes.moved, {})
+
+    def test_moved_over_deleted_path(self):
+        changes = ChangeSet.from_events([FileDeletedEvent("/src/a"), FileMovedEvent("/src/b", "/src/a")])
+        self.assertEqual(changes.moved, {"/src/a": "/src/b"})
+        self.assertEqual(changes.deleted, set())
+
+    def test_directories_are_recorded(self):
+        changes = ChangeSet.from_events([DirCreatedEvent("/src/d")])
+        self.assertEqual(changes.directories, set(["/src/d"]))
+
+    def test_seen_keeps_the_earliest_time(self):
+        first, second = FileModifiedEvent("/src/a"), FileModifiedEvent("/src/a")
+        first.seen, second.seen = 2.0, 1.0
+        changes = ChangeSet.from_events([first, second])
+        self.assertEqual(changes.seen, {"/src/a": 1.0})
+
+
+class TestChangeSetDiff(unittest.TestCase):
+
+    def test_replaced_file_is_updated(self):
+        # An atomic save of a file that was not in the previous snapshot.
+        changes = ChangeSet.from_diff(Diff(files_created=["/src/a"], files_deleted=["/src/a"]))
+        self.assertEqual(changes.updated_paths, set(["/src/a"]))
+        self.assertEqual(changes.removed_paths, set())
+
+    def test_file_moved_over_deleted_file_is_updated(self):
+        # An atomic save of a file that was in the previous snapshot.
+        changes = ChangeSet.from_diff(Diff(files_moved=[("/src/.a.tmp", "/src/a")], files_deleted=["/src/a"]))
+        self.assertEqual(changes.updated_paths, set(["/src/a"]))
+        self.assertEqual(changes.removed_paths, set(["/src/.a.tmp"]))
+
+    def test_replaced_file_after_earlier_changes(self):
+        changes = ChangeSet.from_events([FileCreatedEvent("/src/a")])
+        changes.add_diff(Diff(files_created=["/src/a"], files_deleted=["/src/a"]))
+        self.assertEqual(changes.updated_paths, set(["/src/a"]))
+        self.assertEqual(changes.removed_paths, set())
+
+    def test_chained_moves(self):
+        changes = ChangeSet.from_diff(Diff(files_moved=[("/src/a", "/src/b"), ("/src/b", "/src/c")]))
+        self.assertEqual(changes.moved, {"/src/b": "/src/a", "/src/c": "/src/b"})
+
+    def test_swapped_files(self):
+        changes = ChangeSet.from_diff(Diff(files_moved=[("/src/a", "/src/b"), ("/src/b", "/src/a")]))
+        self.assertEqual(changes.updated_paths, set(["/src/a", "/src/b"]))
+        self.assertEqual(changes.removed_paths, set())
+
+    def test_moved_directory(self):
+        changes = ChangeSet.from_diff(Diff(dirs_moved=[("/src/d", "/src/e")], files_moved=[("/src/d/a", "/src/e/a")]))
+        self.assertEqual(changes.moved, {"/src/e": "/src/d", "/src/e/a": "/src/d/a"})
+        self.assertEqual(changes.directories, set(["/src/e"]))
+
+    def test_seen(self):
+        changes = ChangeSet.from_diff(Diff(files_created=["/src/a"], files_moved=[("/src/b", "/src/c")]), seen=5.0)
+        self.assertEqual(changes.seen, {"/src/a": 5.0, "/src/c": 5.0})
+
+    def test_ordered_moves(self):
+        changes = ChangeSet.from_diff(Diff(files_moved=[("/src/a", "/src/b"), ("/src/b", "/src/c"),
+                                                        ("/src/x", "/src/y")]))
+        ordered, cycles = changes.ordered_moves()
+        self.assertEqual(ordered, [("/src/b", "/src/c"), ("/src/a", "/src/b"), ("/src/x", "/src/y")])
+        self.assertEqual(cycles, [])
+
+    def test_update_with_swapped_files(self):
+        swapped = ChangeSet.from_events([FileMovedEvent("/src/a", "/src/tmp"),
+                                         FileMovedEvent("/src/b", "/src/a"),
+                                         FileMovedEvent("/src/tmp", "/src/b")])
+        self.assertEqual(swapped.moved, {"/src/a": "/src/b", "/src/b": "/src/a"})
+        changes = ChangeSet()
+        changes.update(swapped)
+        self.assertEqual(changes.updated_paths, set(["/src/a", "/src/b"]))
+        self.assertEqual(changes.removed_paths, set())
+
+    def test_update_folds_later_changes(self):
+        changes = ChangeSet.from_events([FileCreatedEvent("/src/a"), FileModifiedEvent("/src/b")])
+        changes.update(ChangeSet.from_events([FileDeletedEvent("/src/a"), FileMovedEvent("/src/b", "/src/c")]))
+        self.assertEqual(changes.created, set())
+        self.assertEqual(changes.modified, set(["/src/c"]))
+        self.assertEqual(changes.moved, {"/src/c": "/src/b"})
+
+
+class TestChangeSetSnapshots(unittest.TestCase):
+    """
+    Atomic saves, as seen by diffing the snapshots taken before and after.
+    """
+
+    snapshot_class = DiscriminatedDirectorySnapshot
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("a.txt", "old")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write(data)
+
+    def diff(self, change):
+        before = self.snapshot_class(self.root)
+        change()
+        return ChangeSet.from_diff(self.snapshot_class(self.root) - before)
+
+    def test_atomic_save(self):
+        def save():
+            self.write(".a.txt.tmp", "new")
+            os.rename(os.path.join(self.root, ".a.txt.tmp"), os.path.join(self.root, "a.txt"))
+
+        changes = self.diff(save)
+        self.assertEqual(changes.updated_paths, set([os.path.join(self.root, "a.txt")]))
+        self.assertEqual(changes.removed_paths, set())
+
+    def test_atomic_save_of_existing_temporary_file(self):
+        self.write(".a.txt.tmp", "new")
+        changes = self.diff(lambda: os.rename(os.path.join(self.root, ".a.txt.tmp"), os.path.join(self.root, "a.txt")))
+        self.assertEqual(changes.updated_paths, set([os.path.join(self.root, "a.txt")]))
+        self.assertEqual(changes.removed_paths, set([os.path.join(self.root, ".a.txt.tmp")]))
+
+
+class TestChangeSetCompactSnapshots(TestChangeSetSnapshots):
+
+    snapshot_class = CompactDirectorySnapshot
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin.daemon import RoninDaemon
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestRoninDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.target = os.path.join(self.root, "dst")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, relative_path):
+        return os.path.join(self.root, *relative_path.split("/"))
+
+    def project(self, relative_path, manifest=None):
+        """
+        Create a source directory with a native manifest, or with the given
+        manifest contents.
+        """
+        path = self.path(relative_path)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with open(os.path.join(path, "ronin.json"), "w") as f:
+            if manifest is None:
+                json.dump({"type": "native", "path": os.path.join(self.target, relative_path),
+                           "exclude": []}, f)
+            else:
+                f.write(manifest)
+        return path
+
+    def write(self, relative_path, data):
+        with open(self.path(relative_path), "w") as f:
+            f.write(data)
+
+    def test_discover(self):
+        a = self.project("src/a")
+        b = self.project("src/b/sub")
+        os.makedirs(self.path("src/c"))
+        self.assertEqual(RoninDaemon.discover(self.path("src")), [a, b])
+
+    def test_discover_skips_hidden_directories(self):
+        a = self.project("src/a")
+        self.project("src/.hidden")
+        self.project("src/a2/.cache/b")
+        self.assertEqual(RoninDaemon.discover(self.path("src")), [a])
+
+    def test_discover_skips_nested_projects(self):
+        a = self.project("src/a")
+        self.project("src/a/vendor/b")
+        self.assertEqual(RoninDaemon.discover(self.path("src")), [a])
+        self.project("src")
+        self.assertEqual(RoninDaemon.discover(self.path("src")), [self.path("src")])
+
+    def test_sources_are_not_repeated(self):
+        a = self.project("src/a")
+        daemon = RoninDaemon(sources=[a, a + os.sep], discover=[self.path("src")])
+        self.assertEqual(daemon.sources, [os.path.join(a, "")])
+        self.assertEqual(len(daemon.instances), 1)
+
+    def test_sources_that_fail_to_load_are_skipped(self):
+        a = self.project("src/a")
+        invalid = self.project("src/invalid", "{not json")
+        os.makedirs(self.path("src/missing"))
+        daemon = RoninDaemon(sources=[a, invalid, self.path("src/missing")])
+        self.assertEqual(len(daemon.sources), 3)
+        self.assertEqual([ronin.source for ronin in daemon.instances], [os.path.join(a, "")])
+
+    def test_each(self):
+        self.project("src/a")
+        self.project("src/b")
+        daemon = RoninDaemon(discover=[self.path("src")])
+
+        def function(ronin):
+            if ronin.source.endswith(os.path.join("a", "")):
+                raise RuntimeError("failed")
+            return ronin.source
+        self.assertEqual(daemon.each(function), [None, daemon.instances[1].source])
+
+    def test_run_synchronizes_every_source(self):
+        self.project("src/a")
+        self.project("src/b")
+        self.write("src/a/1.txt", "1")
+        self.write("src/b/2.txt", "2")
+        daemon = RoninDaemon(discover=[self.path("src")], max_concurrent_syncs=1)
+        self.assertEqual(daemon.max_concurrent_syncs, 1)
+        daemon.run()
+        with open(self.path("dst/src/a/1.txt")) as f:
+            self.assertEqual(f.read(), "1")
+        with open(self.path("dst/src/b/2.txt")) as f:
+            self.assertEqual(f.read(), "2")
+
+    def test_run_without_sources(self):
+        self.assertEqual(RoninDaemon(discover=[self.root]).run(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
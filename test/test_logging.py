@@ -0,0 +1,95 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import init_console_logging
+from ronin.utils.logqueue import BackgroundHandler
+import logging
+import unittest
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestBackgroundHandler(unittest.TestCase):
+
+    def test_close_writes_queued_records(self):
+        target = ListHandler()
+        handler = BackgroundHandler([target])
+        logger = logging.getLogger("ronin.test.background")
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            for i in range(100):
+                logger.warning("message %d", i)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        self.assertEqual(target.messages, ["message {0}".format(i) for i in range(100)])
+
+
+class TestConsoleLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.handlers = self.root.handlers[:]
+        self.level = self.root.level
+        for handler in self.handlers:
+            self.root.removeHandler(handler)
+
+    def tearDown(self):
+        for handler in self.root.handlers[:]:
+            self.root.removeHandler(handler)
+            if handler not in self.handlers:
+                handler.close()
+        for handler in self.handlers:
+            self.root.addHandler(handler)
+        self.root.setLevel(self.level)
+
+    def test_console_is_written_in_the_background(self):
+        init_console_logging()
+        self.assertEqual(len(self.root.handlers), 1)
+        handler = self.root.handlers[0]
+        self.assertIsInstance(handler, BackgroundHandler)
+        self.assertEqual([type(target) for target in handler.handlers], [logging.StreamHandler])
+        self.assertEqual(self.root.level, logging.INFO)
+
+    def test_configured_logging_is_kept(self):
+        handler = ListHandler()
+        self.root.addHandler(handler)
+        init_console_logging()
+        self.assertEqual(self.root.handlers, [handler])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin.utils.matcher import ExclusionMatcher, translate
+import os
+import re
+import unittest
+
+
+class TestTranslate(unittest.TestCase):
+
+    def assertMatches(self, pattern, path):
+        self.assertTrue(re.match(translate(pattern) + "\\Z", path), "{0!r} does not match {1!r}".format(pattern, path))
+
+    def assertNotMatches(self, pattern, path):
+        self.assertFalse(re.match(translate(pattern) + "\\Z", path), "{0!r} matches {1!r}".format(pattern, path))
+
+    def test_literal(self):
+        self.assertMatches("a.b", "a.b")
+        self.assertNotMatches("a.b", "axb")
+
+    def test_star(self):
+        self.assertMatches("*.pyc", "a.pyc")
+        self.assertMatches("*.pyc", ".pyc")
+        self.assertNotMatches("*.pyc", "a/b.pyc")
+
+    def test_question_mark(self):
+        self.assertMatches("a?c", "abc")
+        self.assertNotMatches("a?c", "ac")
+        self.assertNotMatches("a?c", "a/c")
+
+    def test_character_class(self):
+        self.assertMatches("[ab].txt", "a.txt")
+        self.assertNotMatches("[ab].txt", "c.txt")
+        self.assertMatches("[!ab].txt", "c.txt")
+        self.assertNotMatches("[!ab].txt", "a.txt")
+        self.assertMatches("[]].txt", "].txt")
+
+    def test_unclosed_character_class(self):
+        self.assertMatches("[ab", "[ab")
+
+    def test_double_star(self):
+        self.assertMatches("a/**", "a/b")
+        self.assertMatches("a/**", "a/b/c")
+        self.assertMatches("a**", "ab/c")
+
+    def test_double_star_directories(self):
+        self.assertMatches("a/**/b", "a/b")
+        self.assertMatches("a/**/b", "a/x/b")
+        self.assertMatches("a/**/b", "a/x/y/b")
+        self.assertNotMatches("a/**/b", "ab")
+        self.assertNotMatches("a/**/b", "a/xb")
+        self.assertMatches("**/b", "b")
+        self.assertMatches("**/b", "x/b")
+
+
+class TestExclusionMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.join(os.sep, "src")
+
+    def path(self, relative_path):
+        return os.path.join(self.root, *relative_path.split("/"))
+
+    def assertExcluded(self, patterns, relative_path, is_dir=False):
+        matcher = ExclusionMatcher(patterns, self.root)
+        self.assertTrue(matcher.match(self.path(relative_path), is_dir),
+                        "{0!r} does not exclude {1!r}".format(patterns, relative_path))
+
+    def assertIncluded(self, patterns, relative_path, is_dir=False):
+        matcher = ExclusionMatcher(patterns, self.root)
+        self.assertFalse(matcher.match(self.path(relative_path), is_dir),
+                         "{0!r} excludes {1!r}".format(patterns, relative_path))
+
+    def test_empty(self):
+        self.assertFalse(ExclusionMatcher([], self.root))
+        self.assertFalse(ExclusionMatcher(None, self.root))
+        self.assertFalse(ExclusionMatcher(["", "/"], self.root))
+        self.assertTrue(ExclusionMatcher(["a"], self.root))
+
+    def test_name(self):
+        self.assertExcluded(["node_modules"], "node_modules", True)
+        self.assertExcluded(["node_modules"], "a/node_modules", True)
+        self.assertExcluded(["node_modules"], "a/node_modules/b/c.js")
+        self.assertIncluded(["node_modules"], "node_modules2")
+
+    def test_name_pattern(self):
+        self.assertExcluded(["*.pyc"], "a.pyc")
+        self.assertExcluded(["*.pyc"], "a/b/c.pyc")
+        self.assertIncluded(["*.pyc"], "a.py")
+
+    def test_anchored(self):
+        self.assertExcluded(["/build"], "build", True)
+        self.assertExcluded(["/build"], "build/a")
+        self.assertIncluded(["/build"], "a/build", True)
+
+    def test_relative_path(self):
+        self.assertExcluded(["docs/_build"], "docs/_build", True)
+        self.assertExcluded(["docs/_build"], "a/docs/_build/b")
+        self.assertIncluded(["docs/_build"], "docs/a/_build", True)
+        self.assertIncluded(["docs/_build"], "adocs/_build", True)
+
+    def test_relative_path_pattern(self):
+        self.assertExcluded(["docs/*.tmp"], "docs/a.tmp")
+        self.assertIncluded(["docs/*.tmp"], "docs/a/b.tmp")
+
+    def test_double_star(self):
+        self.assertExcluded(["a/**/b"], "a/b")
+        self.assertExcluded(["a/**/b"], "a/x/y/b")
+        self.assertExcluded(["a/**/b"], "x/a/b")
+        self.assertExcluded(["/a/**/b"], "a/b")
+        self.assertIncluded(["/a/**/b"], "x/a/b")
+        self.assertIncluded(["a/**/b"], "a/xb")
+
+    def test_directories_only(self):
+        self.assertExcluded(["cache/"], "cache", True)
+        self.assertExcluded(["cache/"], "cache/a")
+        self.assertIncluded(["cache/"], "cache")
+        self.assertExcluded(["*.d/"], "a/b.d", True)
+        self.assertIncluded(["*.d/"], "a/b.d")
+        self.assertExcluded(["/a/b/"], "a/b", True)
+        self.assertIncluded(["/a/b/"], "a/b")
+
+    def test_has_directory_rules(self):
+        self.assertFalse(ExclusionMatcher(["a", "*.b", "/c"], self.root).has_directory_rules)
+        self.assertTrue(ExclusionMatcher(["a/"], self.root).has_directory_rules)
+
+    def test_outside_root(self):
+        matcher = ExclusionMatcher(["*"], self.root)
+        self.assertFalse(matcher.match(self.root, True))
+        self.assertFalse(matcher.match(os.path.join(os.sep, "other", "a")))
+        self.assertFalse(matcher.match(os.path.join(os.sep, "src2", "a")))
+
+    def test_match_path(self):
+        matcher = ExclusionMatcher(["build"], self.root)
+        self.assertTrue(matcher.match_path(self.path("a/build"), True))
+        self.assertFalse(matcher.match_path(self.path("build/a")))
+
+    def test_match_entry(self):
+        matcher = ExclusionMatcher(["cache/"], self.root)
+        self.assertFalse(matcher.match_entry("cache", "cache"))
+        self.assertTrue(matcher.match_entry("cache", "cache", True))
+
+
+if __name__ == "__main__":
+    unittest.main()
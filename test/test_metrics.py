@@ -0,0 +1,76 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import metrics
+from ronin.utils.changeset import ChangeSet
+import unittest
+
+
+class TestObserveSync(unittest.TestCase):
+
+    def setUp(self):
+        self.source = "/src/{0}".format(self.id())
+        self.changes = ChangeSet()
+        self.changes.add_created("/src/a")
+
+    def sample(self, metric, suffix, **labels):
+        labels = ",".join("{0}=\"{1}\"".format(name, labels[name]) for name in metric.labelnames)
+        prefix = "{0}{1}{{{2}}} ".format(metric.name, suffix, labels)
+        for line in metric.render():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return 0
+
+    def test_full_without_changes(self):
+        metrics.observe_sync(self.source, None, 0.1, False, False)
+        self.assertEqual(self.sample(metrics.SYNC_SECONDS, "_count", source=self.source, mode="full"), 1)
+        self.assertEqual(self.sample(metrics.FILES_SYNCHRONIZED, "", source=self.source), 0)
+
+    def test_incremental(self):
+        metrics.observe_sync(self.source, self.changes, 0.1, False, False, False)
+        self.assertEqual(self.sample(metrics.SYNC_SECONDS, "_count", source=self.source, mode="incremental"), 1)
+        self.assertEqual(self.sample(metrics.FILES_SYNCHRONIZED, "", source=self.source), 1)
+
+    def test_full_with_changes(self):
+        metrics.observe_sync(self.source, self.changes, 0.1, False, False, True)
+        self.assertEqual(self.sample(metrics.SYNC_SECONDS, "_count", source=self.source, mode="full"), 1)
+        self.assertEqual(self.sample(metrics.SYNC_SECONDS, "_count", source=self.source, mode="incremental"), 0)
+        self.assertEqual(self.sample(metrics.FILES_SYNCHRONIZED, "", source=self.source), 0)
+
+    def test_failed(self):
+        metrics.observe_sync(self.source, self.changes, 0.1, True, False, False)
+        self.assertEqual(self.sample(metrics.SYNC_FAILURES, "", source=self.source), 1)
+        self.assertEqual(self.sample(metrics.FILES_SYNCHRONIZED, "", source=self.source), 0)
+
+    def test_cancelled(self):
+        metrics.observe_sync(self.source, self.changes, 0.1, False, True, False)
+        self.assertEqual(self.sample(metrics.SYNCS_SUPERSEDED, "", source=self.source), 1)
+        self.assertEqual(self.sample(metrics.SYNC_SECONDS, "_count", source=self.source, mode="incremental"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,253 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import Manifest
+from ronin.strategies import StrategyFactory, native
+from ronin.utils.changeset import ChangeSet
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class NativeStrategyTestCase(unittest.TestCase):
+    """
+    Synchronizes a source directory into a destination with the native
+    strategy.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "src")
+        self.target = os.path.join(self.root, "dst")
+        os.mkdir(self.source)
+        os.mkdir(self.target)
+        manifest_path = os.path.join(self.root, "ronin.json")
+        with open(manifest_path, "w") as f:
+            json.dump({"type": "native", "path": self.target, "exclude": [], "delete": True,
+                       "incremental": True}, f)
+        self.strategy = StrategyFactory().get_strategy(self.source, Manifest(manifest_path))
+
+    def tearDown(self):
+        self.strategy.close()
+        shutil.rmtree(self.root)
+
+    def write(self, name, data):
+        path = os.path.join(self.source, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(data)
+
+    def rename(self, src, dest):
+        os.rename(os.path.join(self.source, src), os.path.join(self.source, dest))
+
+    def synchronize(self, change=None):
+        """
+        Synchronize the entire source directory or, if given a function that
+        changes it, the changes the function makes.
+        """
+        if change is None:
+            self.assertEqual(self.strategy.invoke(), 0)
+            return
+        before = DiscriminatedDirectorySnapshot(self.source)
+        change()
+        changes = ChangeSet.from_diff(DiscriminatedDirectorySnapshot(self.source) - before)
+        self.assertEqual(self.strategy.invoke(changes), 0)
+
+    def contents(self, root):
+        result = {}
+        for directory, names, files in os.walk(root):
+            for name in names:
+                result[os.path.relpath(os.path.join(directory, name), root)] = None
+            for name in files:
+                path = os.path.join(directory, name)
+                with open(path) as f:
+                    result[os.path.relpath(path, root)] = f.read()
+        return result
+
+    def assertSynchronized(self):
+        self.assertEqual(self.contents(self.target), self.contents(self.source))
+
+
+class TestCopyData(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.copy_methods = list(native._copy_methods)
+
+    def tearDown(self):
+        native._copy_methods[:] = self.copy_methods
+        shutil.rmtree(self.root)
+
+    def copy(self, data):
+        source, target = os.path.join(self.root, "source"), os.path.join(self.root, "target")
+        with open(source, "wb") as f:
+            f.write(data)
+        fd_in = os.open(source, os.O_RDONLY)
+        fd_out = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            copied = native.copy_data(fd_in, fd_out, len(data))
+        finally:
+            os.close(fd_in)
+            os.close(fd_out)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(copied, len(data))
+
+    def test_copy(self):
+        self.copy(b"x" * 12000)
+
+    @unittest.skipUnless(hasattr(os, "sendfile"), "os.sendfile is not available")
+    def test_sendfile(self):
+        native._copy_methods[:] = [native._sendfile]
+        self.copy(b"x" * 12000)
+
+    def test_read_write(self):
+        native._copy_methods[:] = []
+        self.copy(b"x" * 12000)
+
+    def test_empty(self):
+        self.copy(b"")
+
+
+class TestNativeStrategy(NativeStrategyTestCase):
+
+    def test_full_synchronization(self):
+        self.write("a", "a")
+        self.write("d/e/f", "f")
+        self.synchronize()
+        self.assertSynchronized()
+
+    def test_full_synchronization_time(self):
+        self.assertIsNone(self.strategy.last_full_sync)
+        self.synchronize()
+        self.assertIsNotNone(self.strategy.last_full_sync)
+
+    def test_full_synchronization_mode(self):
+        self.write("a", "a")
+        self.synchronize(lambda: self.write("b", "b"))
+        self.assertTrue(self.strategy.full_sync)
+        self.synchronize(lambda: self.write("c", "c"))
+        self.assertFalse(self.strategy.full_sync)
+        self.assertSynchronized()
+
+    def test_failed_full_synchronization_time(self):
+        # A file at the destination that a directory cannot be created over.
+        with open(os.path.join(self.target, "d"), "w") as f:
+            f.write("d")
+        self.write("d/e", "e")
+        self.assertEqual(self.strategy.invoke(), 1)
+        self.assertIsNone(self.strategy.last_full_sync)
+
+    def test_extraneous_paths_are_removed(self):
+        os.makedirs(os.path.join(self.target, "old"))
+        with open(os.path.join(self.target, "old", "a"), "w") as f:
+            f.write("a")
+        self.write("a", "a")
+        self.synchronize()
+        self.assertSynchronized()
+
+    def test_modified_file(self):
+        self.write("a", "a")
+        self.synchronize()
+        self.synchronize(lambda: self.write("a", "changed"))
+        self.assertSynchronized()
+
+    def test_same_size_modification_within_a_second(self):
+        path = os.path.join(self.source, "a")
+        self.write("a", "AAAA")
+        os.utime(path, (1000000000.1, 1000000000.1))
+        self.synchronize()
+
+        def change():
+            self.write("a", "BBBB")
+            os.utime(path, (1000000000.9, 1000000000.9))
+
+        self.synchronize(change)
+        self.assertSynchronized()
+
+    def test_deleted_file(self):
+        self.write("a", "a")
+        self.write("b", "b")
+        self.synchronize()
+        self.synchronize(lambda: os.remove(os.path.join(self.source, "a")))
+        self.assertSynchronized()
+
+    def test_deleted_directory(self):
+        self.write("d/e/f", "f")
+        self.write("b", "b")
+        self.synchronize()
+        self.synchronize(lambda: shutil.rmtree(os.path.join(self.source, "d")))
+        self.assertSynchronized()
+
+    def test_created_directory(self):
+        self.synchronize()
+        self.synchronize(lambda: self.write("d/e/f", "f"))
+        self.assertSynchronized()
+
+
+class TestNativeStrategyMoves(NativeStrategyTestCase):
+
+    def setUp(self):
+        super(TestNativeStrategyMoves, self).setUp()
+        self.write("a", "a")
+        self.write("bb", "bb")
+        self.write("ccc", "ccc")
+        self.write("d/e", "e")
+        self.synchronize()
+
+    def test_move(self):
+        self.synchronize(lambda: self.rename("a", "z"))
+        self.assertSynchronized()
+
+    def test_move_directory(self):
+        self.synchronize(lambda: self.rename("d", "f"))
+        self.assertSynchronized()
+
+    def test_chained_moves(self):
+        def change():
+            self.rename("bb", "ccc")
+            self.rename("a", "bb")
+
+        self.synchronize(change)
+        self.assertSynchronized()
+
+    def test_swapped_files(self):
+        def change():
+            self.rename("a", "tmp")
+            self.rename("bb", "a")
+            self.rename("tmp", "bb")
+
+        self.synchronize(change)
+        self.assertSynchronized()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import Ronin
+from ronin.events import RoninEventHandler
+from ronin.utils.changeset import EVENT_TYPE_CLOSED, ChangeSet
+from ronin.utils.settle import WriteSettler
+from watchdog.events import FileModifiedEvent, FileSystemEvent
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+#: The interval used by the tests, in seconds.
+INTERVAL = 0.05
+
+
+class FileClosedEvent(FileSystemEvent):
+    """
+    The close-after-write event of newer watchdog releases.
+    """
+
+    event_type = EVENT_TYPE_CLOSED
+    is_directory = False
+
+
+class FakeStat(object):
+    """
+    Stands in for :func:`os.stat`, returning the size and modification time
+    set for each path.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def set(self, path, size, mtime):
+        self.files[path] = os.stat_result((0o100644, 1, 1, 1, 0, 0, size, mtime, mtime, mtime))
+
+    def __call__(self, path):
+        try:
+            return self.files[path]
+        except KeyError:
+            raise OSError(2, "No such file or directory", path)
+
+
+def modified(*paths):
+    changes = ChangeSet()
+    for path in paths:
+        changes.add_modified(path)
+    return changes
+
+
+class TestWriteSettler(unittest.TestCase):
+
+    def setUp(self):
+        self.stat = FakeStat()
+        self.settler = WriteSettler(INTERVAL, stat=self.stat)
+
+    def test_settled_file_is_not_held(self):
+        self.stat.set("/src/a", 1, time.time() - 10)
+        changes = modified("/src/a")
+        self.assertIsNone(self.settler.hold(changes))
+        self.assertEqual(changes.modified, set(["/src/a"]))
+        self.assertFalse(self.settler.held)
+
+    def test_file_being_written_is_held(self):
+        self.stat.set("/src/a", 1, time.time())
+        changes = modified("/src/a")
+        delay = self.settler.hold(changes)
+        self.assertIsNotNone(delay)
+        self.assertTrue(0 < delay <= INTERVAL)
+        self.assertFalse(changes)
+        self.assertEqual(self.settler.held.modified, set(["/src/a"]))
+
+    def test_created_file_is_held_as_created(self):
+        self.stat.set("/src/a", 1, time.time())
+        changes = ChangeSet()
+        changes.add_created("/src/a")
+        self.settler.hold(changes)
+        self.assertEqual(self.settler.held.created, set(["/src/a"]))
+
+    def test_directories_deletions_and_missing_files_are_not_held(self):
+        changes = ChangeSet()
+        changes.add_created("/src/d", True)
+        changes.add_deleted("/src/b")
+        changes.add_modified("/src/missing")
+        self.assertIsNone(self.settler.hold(changes))
+        self.assertEqual(len(changes), 3)
+
+    def test_release_by_modification_time_age(self):
+        self.stat.set("/src/a", 1, time.time())
+        self.settler.hold(modified("/src/a"))
+        time.sleep(INTERVAL * 2)
+        changes = self.settler.release()
+        self.assertIsNone(self.settler.hold(changes))
+        self.assertEqual(changes.modified, set(["/src/a"]))
+        self.assertFalse(self.settler.held)
+
+    def test_release_by_stable_signature(self):
+        # A modification time in the future, as a skewed shared folder may
+        # report, never ages; the file is released once its size and
+        # modification time have been seen unchanged for the interval.
+        mtime = time.time() + 3600
+        self.stat.set("/src/a", 1, mtime)
+        self.settler.hold(modified("/src/a"))
+        time.sleep(INTERVAL * 2)
+        changes = self.settler.release()
+        self.assertIsNone(self.settler.hold(changes))
+        self.assertEqual(changes.modified, set(["/src/a"]))
+
+    def test_changed_signature_is_held_again(self):
+        mtime = time.time() + 3600
+        self.stat.set("/src/a", 1, mtime)
+        self.settler.hold(modified("/src/a"))
+        time.sleep(INTERVAL * 2)
+        self.stat.set("/src/a", 2, mtime)
+        changes = self.settler.release()
+        self.assertIsNotNone(self.settler.hold(changes))
+        self.assertFalse(changes)
+        self.assertEqual(self.settler.held.modified, set(["/src/a"]))
+
+    def test_close_in_the_same_batch(self):
+        self.stat.set("/src/a", 1, time.time())
+        changes = modified("/src/a")
+        changes.add_closed("/src/a")
+        self.assertIsNone(self.settler.hold(changes))
+        self.assertEqual(changes.modified, set(["/src/a"]))
+
+    def test_close_in_a_later_batch(self):
+        self.stat.set("/src/a", 1, time.time())
+        self.stat.set("/src/b", 1, time.time())
+        first = modified("/src/a", "/src/b")
+        first.mark_seen("/src/a", 1.0)
+        self.settler.hold(first)
+        changes = ChangeSet()
+        changes.add_closed("/src/a")
+        self.assertIsNone(self.settler.hold(changes))
+        self.assertEqual(changes.modified, set(["/src/a"]))
+        self.assertEqual(changes.seen, {"/src/a": 1.0})
+        self.assertEqual(self.settler.held.modified, set(["/src/b"]))
+
+    def test_close_of_a_created_file_in_a_later_batch(self):
+        self.stat.set("/src/a", 1, time.time())
+        first = ChangeSet()
+        first.add_created("/src/a")
+        self.settler.hold(first)
+        changes = ChangeSet()
+        changes.add_closed("/src/a")
+        self.settler.hold(changes)
+        self.assertEqual(changes.created, set(["/src/a"]))
+        self.assertFalse(self.settler.held)
+
+
+class TestEventHandlerSettling(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "src")
+        self.target = os.path.join(self.root, "dst")
+        os.mkdir(self.source)
+        with open(os.path.join(self.source, "ronin.json"), "w") as f:
+            json.dump({"type": "native", "path": self.target, "exclude": [], "incremental": True,
+                       "settle_ms": 60000}, f)
+        self.ronin = Ronin(self.source)
+        self.synchronized = []
+        self.ronin.invoke = lambda changes=None: self.synchronized.append(changes) or 0
+        self.handler = RoninEventHandler(self.ronin)
+
+    def tearDown(self):
+        self.handler.coalescer.stop(flush=False)
+        self.ronin.strategy.close()
+        shutil.rmtree(self.root)
+
+    def test_late_close_releases_the_file(self):
+        path = os.path.join(self.source, "a.txt")
+        with open(path, "w") as f:
+            f.write("a")
+        self.handler.synchronize([FileModifiedEvent(path)])
+        self.assertEqual(self.synchronized, [])
+        self.handler.synchronize([FileClosedEvent(path)])
+        self.assertEqual(len(self.synchronized), 1)
+        self.assertEqual(self.synchronized[0].modified, set([path]))
+        self.assertFalse(self.handler.settler.held)
+
+
+if __name__ == "__main__":
+    unittest.main()
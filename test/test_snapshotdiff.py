@@ -0,0 +1,252 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin.utils.compactsnapshot import CompactDirectorySnapshot
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot, StatInfo
+from ronin.utils.snapshotdiff import MergeSnapshotDiff
+from stat import S_IFDIR, S_IFREG
+from watchdog.utils.dirsnapshot import DirectorySnapshotDiff
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+#: The root of the synthetic snapshots.
+ROOT = "/src"
+
+FILE = S_IFREG | 0o644
+DIR = S_IFDIR | 0o755
+
+
+def stat_info(entries, dev=1):
+    """
+    Return stat information for a synthetic tree, given ``(mode, inode,
+    size, mtime)`` tuples keyed by path relative to the root.
+    """
+    result = {ROOT: StatInfo(DIR, 1, dev, 0, 0.0)}
+    for path, (mode, ino, size, mtime) in entries.items():
+        result[ROOT + "/" + path] = StatInfo(mode, ino, dev, size, mtime)
+    return result
+
+
+def normalize(diff, renamed_modifications=False):
+    """
+    Return the changes of a diff as sets. Watchdog's diff reports a moved
+    entry that was also modified at its old path; if
+    `renamed_modifications` is set, such paths are translated to the new
+    path, as :class:`MergeSnapshotDiff` reports them.
+    """
+    renamed = dict(list(diff.files_moved) + list(diff.dirs_moved)) if renamed_modifications else {}
+    return {
+        "files_created": set(diff.files_created),
+        "files_deleted": set(diff.files_deleted),
+        "files_modified": set(renamed.get(path, path) for path in diff.files_modified),
+        "files_moved": set(diff.files_moved),
+        "dirs_created": set(diff.dirs_created),
+        "dirs_deleted": set(diff.dirs_deleted),
+        "dirs_modified": set(renamed.get(path, path) for path in diff.dirs_modified),
+        "dirs_moved": set(diff.dirs_moved),
+    }
+
+
+class TestMergeSnapshotDiff(unittest.TestCase):
+    """
+    Compares :class:`MergeSnapshotDiff` with watchdog's
+    ``DirectorySnapshotDiff`` on synthetic snapshots.
+    """
+
+    ref_class = DiscriminatedDirectorySnapshot
+    snapshot_class = DiscriminatedDirectorySnapshot
+
+    def diff(self, before, after):
+        ref = self.ref_class.from_stat_info(stat_info(before))
+        snapshot = self.snapshot_class.from_stat_info(stat_info(after))
+        expected = normalize(DirectorySnapshotDiff(ref, snapshot), True)
+        diff = snapshot - ref
+        self.assertIsInstance(diff, MergeSnapshotDiff)
+        self.assertEqual(normalize(diff), expected)
+        return normalize(diff)
+
+    def test_unchanged(self):
+        tree = {"a": (FILE, 2, 1, 1.0), "d": (DIR, 3, 0, 1.0), "d/b": (FILE, 4, 1, 1.0)}
+        self.assertFalse(any(self.diff(tree, tree).values()))
+
+    def test_modified(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), "b": (FILE, 3, 1, 1.0)},
+                         {"a": (FILE, 2, 1, 2.0), "b": (FILE, 3, 2, 2.0)})
+        self.assertEqual(diff["files_modified"], set(["/src/a", "/src/b"]))
+
+    def test_modified_size(self):
+        # Older releases of watchdog only compare modification times.
+        ref = self.ref_class.from_stat_info(stat_info({"a": (FILE, 2, 1, 1.0)}))
+        snapshot = self.snapshot_class.from_stat_info(stat_info({"a": (FILE, 2, 2, 1.0)}))
+        self.assertEqual((snapshot - ref).files_modified, ["/src/a"])
+
+    def test_created_and_deleted(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), "d": (DIR, 3, 0, 1.0)},
+                         {"b": (FILE, 4, 1, 1.0), "e": (DIR, 5, 0, 1.0)})
+        self.assertEqual(diff["files_created"], set(["/src/b"]))
+        self.assertEqual(diff["files_deleted"], set(["/src/a"]))
+        self.assertEqual(diff["dirs_created"], set(["/src/e"]))
+        self.assertEqual(diff["dirs_deleted"], set(["/src/d"]))
+
+    def test_moved(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), "b": (FILE, 3, 1, 1.0)},
+                         {"c": (FILE, 2, 1, 1.0), "d": (FILE, 3, 2, 2.0)})
+        self.assertEqual(diff["files_moved"], set([("/src/a", "/src/c"), ("/src/b", "/src/d")]))
+        self.assertEqual(diff["files_modified"], set(["/src/d"]))
+
+    def test_moved_directory(self):
+        diff = self.diff({"d": (DIR, 2, 0, 1.0), "d/a": (FILE, 3, 1, 1.0)},
+                         {"e": (DIR, 2, 0, 1.0), "e/a": (FILE, 3, 1, 1.0)})
+        self.assertEqual(diff["dirs_moved"], set([("/src/d", "/src/e")]))
+        self.assertEqual(diff["files_moved"], set([("/src/d/a", "/src/e/a")]))
+
+    def test_chained_and_swapped_moves(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), "b": (FILE, 3, 1, 1.0), "x": (FILE, 4, 1, 1.0),
+                          "y": (FILE, 5, 1, 1.0)},
+                         {"b": (FILE, 2, 1, 1.0), "c": (FILE, 3, 1, 1.0), "x": (FILE, 5, 1, 1.0),
+                          "y": (FILE, 4, 1, 1.0)})
+        self.assertEqual(diff["files_moved"], set([("/src/a", "/src/b"), ("/src/b", "/src/c"),
+                                                   ("/src/x", "/src/y"), ("/src/y", "/src/x")]))
+
+    def test_replaced(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0)}, {"a": (FILE, 3, 1, 2.0)})
+        self.assertEqual(diff["files_created"], set(["/src/a"]))
+        self.assertEqual(diff["files_deleted"], set(["/src/a"]))
+
+    def test_replaced_by_move(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), ".a.tmp": (FILE, 3, 1, 2.0)}, {"a": (FILE, 3, 1, 2.0)})
+        self.assertEqual(diff["files_moved"], set([("/src/.a.tmp", "/src/a")]))
+        self.assertEqual(diff["files_deleted"], set(["/src/a"]))
+
+    def test_inode_reuse(self):
+        # A file is deleted and another created elsewhere with its inode.
+        diff = self.diff({"a": (FILE, 2, 1, 1.0)}, {"b": (FILE, 2, 5, 3.0)})
+        self.assertEqual(diff["files_moved"], set([("/src/a", "/src/b")]))
+        self.assertEqual(diff["files_modified"], set(["/src/b"]))
+
+    def test_type_changed(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), "d": (DIR, 3, 0, 1.0)},
+                         {"a": (DIR, 4, 0, 1.0), "d": (FILE, 5, 1, 1.0)})
+        self.assertEqual(diff["files_created"], set(["/src/d"]))
+        self.assertEqual(diff["files_deleted"], set(["/src/a"]))
+        self.assertEqual(diff["dirs_created"], set(["/src/a"]))
+        self.assertEqual(diff["dirs_deleted"], set(["/src/d"]))
+
+    def test_random_changes(self):
+        rng = random.Random(1)
+        names = ["a", "b", "c", "d", "e", "f"]
+        paths = names + [x + "/" + y for x in names[:3] for y in names]
+        for trial in range(300):
+            inodes = iter(range(2, 1000))
+            before = {}
+            for path in rng.sample(paths, rng.randint(0, len(paths))):
+                before[path] = (rng.choice((FILE, DIR)), next(inodes), rng.randint(0, 2), float(rng.randint(0, 2)))
+            after = {}
+            reused = list(before.values())
+            rng.shuffle(reused)
+            for path in rng.sample(paths, rng.randint(0, len(paths))):
+                if reused and rng.random() < 0.6:
+                    mode, ino, size, mtime = reused.pop()
+                else:
+                    mode, ino = rng.choice((FILE, DIR)), next(inodes)
+                    size, mtime = rng.randint(0, 2), float(rng.randint(0, 2))
+                if rng.random() < 0.3:
+                    size, mtime = rng.randint(0, 2), mtime + 1.0
+                after[path] = (mode, ino, size, mtime)
+            self.diff(before, after)
+
+
+class TestMergeSnapshotDiffCompact(TestMergeSnapshotDiff):
+
+    ref_class = CompactDirectorySnapshot
+    snapshot_class = CompactDirectorySnapshot
+
+
+class TestMergeSnapshotDiffMixed(TestMergeSnapshotDiff):
+
+    ref_class = DiscriminatedDirectorySnapshot
+    snapshot_class = CompactDirectorySnapshot
+
+
+class TestMergeSnapshotDiffByPath(unittest.TestCase):
+    """
+    Compares snapshots of a tree whose device and inode numbers changed.
+    """
+
+    def diff(self, before, after):
+        ref = CompactDirectorySnapshot.from_stat_info(stat_info(before, dev=1))
+        snapshot = DiscriminatedDirectorySnapshot.from_stat_info(stat_info(after, dev=2))
+        return normalize(MergeSnapshotDiff(ref, snapshot, by_path=True))
+
+    def test_unchanged(self):
+        self.assertFalse(any(self.diff({"a": (FILE, 2, 1, 1.0), "d": (DIR, 3, 0, 1.0)},
+                                       {"a": (FILE, 7, 1, 1.0), "d": (DIR, 8, 0, 1.0)}).values()))
+
+    def test_modified(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0), "b": (FILE, 3, 1, 1.0)},
+                         {"a": (FILE, 2, 1, 2.0), "b": (FILE, 3, 2, 1.0)})
+        self.assertEqual(diff["files_modified"], set(["/src/a", "/src/b"]))
+        self.assertFalse(diff["files_created"] or diff["files_deleted"])
+
+    def test_moves_are_deletions_and_creations(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0)}, {"b": (FILE, 2, 1, 1.0)})
+        self.assertEqual(diff["files_deleted"], set(["/src/a"]))
+        self.assertEqual(diff["files_created"], set(["/src/b"]))
+        self.assertFalse(diff["files_moved"])
+
+    def test_type_changed(self):
+        diff = self.diff({"a": (FILE, 2, 1, 1.0)}, {"a": (DIR, 2, 0, 1.0)})
+        self.assertEqual(diff["files_deleted"], set(["/src/a"]))
+        self.assertEqual(diff["dirs_created"], set(["/src/a"]))
+
+
+class TestSnapshotSubtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ("a", "b"):
+            with open(os.path.join(self.root, name), "w") as f:
+                f.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_standard_snapshots_are_merged(self):
+        before = DiscriminatedDirectorySnapshot(self.root)
+        os.rename(os.path.join(self.root, "a"), os.path.join(self.root, "c"))
+        after = DiscriminatedDirectorySnapshot(self.root)
+        diff = after - before
+        self.assertIsInstance(diff, MergeSnapshotDiff)
+        self.assertEqual(diff.files_moved, [(os.path.join(self.root, "a"), os.path.join(self.root, "c"))])
+        self.assertEqual(normalize(diff), normalize(DirectorySnapshotDiff(before, after), True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+# Copyright (c) 2015 Sean Quinn
+#
+# Licensed under the MIT License (http://opensource.org/licenses/MIT)
+#
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT
+# OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from ronin import Ronin
+from ronin.utils.compactsnapshot import CompactDirectorySnapshot
+from ronin.utils.dirsnapshot import DiscriminatedDirectorySnapshot, StatInfo
+from ronin.utils.snapshotindex import SnapshotIndex
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def stat_info(snapshot):
+    return dict((path, (st.st_ino, st.st_dev, st.st_mode, st.st_size, st.st_mtime))
+                for path, st in snapshot.entries())
+
+
+class TestSnapshotIndex(unittest.TestCase):
+
+    snapshot_class = DiscriminatedDirectorySnapshot
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "src")
+        os.makedirs(os.path.join(self.source, "d", "e"))
+        for name in ("a", "d/b", "d/e/c", "d/with space"):
+            with open(os.path.join(self.source, name), "w") as f:
+                f.write(name)
+        self.index = SnapshotIndex(os.path.join(self.root, "state", "src.idx"), self.source)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        snapshot = self.snapshot_class(self.source)
+        self.index.save(snapshot, 1234.5)
+        loaded, last_full_sync = self.index.load(self.snapshot_class)
+        self.assertIsInstance(loaded, self.snapshot_class)
+        self.assertEqual(stat_info(loaded), stat_info(snapshot))
+        self.assertEqual(last_full_sync, 1234.5)
+
+    def test_round_trip_without_full_sync(self):
+        self.index.save(self.snapshot_class(self.source))
+        loaded, last_full_sync = self.index.load(self.snapshot_class)
+        self.assertIsNone(last_full_sync)
+
+    def test_loaded_snapshot_diffs_against_new_snapshot(self):
+        self.index.save(self.snapshot_class(self.source))
+        loaded, last_full_sync = self.index.load(self.snapshot_class)
+        os.remove(os.path.join(self.source, "a"))
+        diff = self.snapshot_class(self.source) - loaded
+        self.assertEqual(list(diff.files_deleted), [os.path.join(self.source, "a")])
+        self.assertEqual(list(diff.files_created), [])
+        self.assertEqual(list(diff.files_modified), [])
+
+    def test_missing_index(self):
+        self.assertIsNone(self.index.load(self.snapshot_class))
+
+    def test_truncated_index(self):
+        self.index.save(self.snapshot_class(self.source))
+        with open(self.index.filename, "rb") as f:
+            data = f.read()
+        with open(self.index.filename, "wb") as f:
+            f.write(data[:len(data) // 2])
+        self.assertIsNone(self.index.load(self.snapshot_class))
+
+    def test_index_of_another_directory(self):
+        self.index.save(self.snapshot_class(self.source))
+        other = SnapshotIndex(self.index.filename, os.path.join(self.source, "d"))
+        self.assertIsNone(other.load(self.snapshot_class))
+
+
+class TestCompactSnapshotIndex(TestSnapshotIndex):
+
+    snapshot_class = CompactDirectorySnapshot
+
+
+class TestCatchUp(unittest.TestCase):
+    """
+    Synchronizes the changes made while ronin was not running.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "src")
+        self.target = os.path.join(self.root, "dst")
+        os.mkdir(self.source)
+        with open(os.path.join(self.source, "ronin.json"), "w") as f:
+            json.dump({"type": "native", "path": self.target, "exclude": [], "delete": True,
+                       "incremental": True}, f)
+        self.write("a.txt", "old")
+        self.write("b.txt", "b")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, data):
+        with open(os.path.join(self.source, name), "w") as f:
+            f.write(data)
+
+    def read(self, name):
+        with open(os.path.join(self.target, name)) as f:
+            return f.read()
+
+    def catch_up(self):
+        ronin = Ronin(self.source, statedir=os.path.join(self.root, "state"))
+        try:
+            ronin.catch_up(ronin.snapshot_index)
+        finally:
+            ronin.strategy.close()
+
+    def test_first_run_synchronizes_everything(self):
+        self.catch_up()
+        self.assertEqual(self.read("a.txt"), "old")
+        self.assertEqual(self.read("b.txt"), "b")
+
+    def test_changes_since_the_last_run(self):
+        self.catch_up()
+        self.write("a.txt", "changed")
+        os.remove(os.path.join(self.source, "b.txt"))
+        self.catch_up()
+        self.assertEqual(self.read("a.txt"), "changed")
+        self.assertFalse(os.path.exists(os.path.join(self.target, "b.txt")))
+
+    def test_file_replaced_by_rename(self):
+        self.catch_up()
+        self.write(".a.txt.tmp", "new")
+        os.rename(os.path.join(self.source, ".a.txt.tmp"), os.path.join(self.source, "a.txt"))
+        self.catch_up()
+        self.assertEqual(self.read("a.txt"), "new")
+
+    def test_file_replaced_by_renaming_an_existing_file(self):
+        self.write(".a.txt.tmp", "new")
+        self.catch_up()
+        os.rename(os.path.join(self.source, ".a.txt.tmp"), os.path.join(self.source, "a.txt"))
+        self.catch_up()
+        self.assertEqual(self.read("a.txt"), "new")
+        self.assertFalse(os.path.exists(os.path.join(self.target, ".a.txt.tmp")))
+
+    def test_source_on_a_new_device(self):
+        # Rewrite the index as if it had been saved before the source was
+        # mounted again with new device and inode numbers.
+        self.catch_up()
+        ronin = Ronin(self.source, statedir=os.path.join(self.root, "state"))
+        try:
+            index = ronin.snapshot_index
+            snapshot, last_full_sync = index.load(ronin.strategy.manifest.snapshot_class)
+            remounted = dict((path, StatInfo(st.st_mode, st.st_ino + 1000, st.st_dev + 1,
+                                             st.st_size, st.st_mtime))
+                             for path, st in snapshot.entries())
+            index.save(DiscriminatedDirectorySnapshot.from_stat_info(remounted), last_full_sync)
+            synchronized = []
+            ronin.invoke = lambda changes=None: synchronized.append(changes) or 0
+            ronin.catch_up(index)
+            self.assertEqual(synchronized, [])
+            self.write("a.txt", "changed")
+            index.save(DiscriminatedDirectorySnapshot.from_stat_info(remounted), last_full_sync)
+            ronin.catch_up(index)
+            self.assertEqual(len(synchronized), 1)
+            self.assertEqual(synchronized[0].modified, set([os.path.join(self.source, "a.txt")]))
+            self.assertFalse(synchronized[0].created or synchronized[0].deleted)
+        finally:
+            ronin.strategy.close()
+
+
+if __name__ == "__main__":
+    unittest.main()